@@ -1,7 +1,6 @@
 import argparse
 import pickle
 from typing import List, Dict, Any, Tuple
-import bm25s
 
 """
 To test:
@@ -14,6 +13,11 @@ python BM25S_retrieval.py \
 
 class BM25Retriever:
     def __init__(self, index_path: str, store_path: str):
+        # bm25s (and numpy/scipy behind it) is only imported once an index is loaded
+        import bm25s
+
+        self._tokenize = bm25s.tokenize
+
         print(f"[INFO] Loading BM25 index from {index_path}...")
         self.retriever = bm25s.BM25.load(index_path, load_corpus=False)
         
@@ -26,7 +30,7 @@ class BM25Retriever:
 
     def retrieve(self, query: str, top_k: int = 5) -> Tuple[List[Dict[str, Any]], List[float]]:
         # Tokenizes query using the same tokenizer used for indexing
-        query_tokens = bm25s.tokenize(query)
+        query_tokens = self._tokenize(query)
 
         # Gets doc IDs + scores
         doc_ids, scores = self.retriever.retrieve(query_tokens, k=top_k)
@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import List, Dict, Any, Optional
+
+from bench_retrieval import percentile
+from data_utils import load_hotpot_examples
+from reranking import RERANKER_BACKENDS
+from voting import normalize_answer
+
+"""
+End-to-end pipeline benchmark: throughput, per-stage latency, LLM usage and
+memory on a fixed dev slice
+
+To run against a local fake LLM (no network, reproducible):
+python bench_pipeline.py \
+  --dev hotpot_dev_distractor_v1.json \
+  --limit 200 \
+  --concurrency 16 \
+  --fake-llm --fake-latency lognormal:0.4,0.5 \
+  --out bench_pipeline.json
+
+Without --fake-llm the real API is used (MISTRAL_API_KEY, MISTRAL_SERVER_URL).
+Pipeline flags (--distractor, --cascade, --reranker, --combined-rewrites,
+--compress, --dense-index, --top-k) select the same components as
+predict_full.py. The slice is always the first --limit examples; --warmup
+questions taken after the slice run first and are not counted.
+
+The report has questions/second, p50/p95/p99 per pipeline stage (from
+QuestionResult.timings, in ms), LLM calls, retries and tokens per question
+(LLMClient.stats, plus the fake server's own accounting), answer EM and
+peak RSS. With --baseline, the run is compared with an earlier report and
+exits with code 1 if throughput or any stage's p95 is worse by more than
+--max-slowdown, or LLM calls / tokens per question grew by more than that.
+"""
+
+STAGE_PERCENTILES = (50, 95, 99)
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _make_pipeline(args: argparse.Namespace) -> Any:
+    if args.distractor:
+        from distractor import DistractorPipeline
+
+        return DistractorPipeline.from_config(
+            top_k_for_answer=args.top_k,
+            rerank_batch=args.rerank_batch,
+            reranker_backend=args.reranker,
+            compress_contexts=args.compress,
+        )
+
+    from cascade import CascadePolicy
+    from rag_pipeline import RAGPipeline
+
+    return RAGPipeline.from_config(
+        index_path=args.index,
+        store_path=args.store,
+        top_k_for_answer=args.top_k,
+        combined_rewrites=args.combined_rewrites,
+        rerank_batch=args.rerank_batch,
+        reranker_backend=args.reranker,
+        dense_index_path=args.dense_index,
+        compress_contexts=args.compress,
+        cascade=CascadePolicy() if args.cascade else None,
+    )
+
+
+def _llm_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, int]:
+    keys = ("calls", "retries", "failures", "prompt_tokens", "completion_tokens")
+    return {k: after.get(k, 0) - before.get(k, 0) for k in keys}
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    server = None
+    if args.fake_llm:
+        from fake_llm_server import start_in_background
+
+        server, url = start_in_background(
+            latency=args.fake_latency,
+            error_rate=args.fake_error_rate,
+            rate_limit_rate=args.fake_rate_limit_rate,
+            retry_after_s=0.1,
+        )
+        # Read by the default LLMClient, which the pipeline creates below
+        os.environ["MISTRAL_SERVER_URL"] = url
+        os.environ.setdefault("MISTRAL_API_KEY", "fake")
+        print(f"[INFO] Fake LLM server at {url} (latency {args.fake_latency})")
+    if os.environ.get("LLM_CACHE_PATH"):
+        print("[WARNING] LLM_CACHE_PATH is set: cached responses skip the LLM and flatter the numbers")
+
+    try:
+        report = _measure(args, server)
+        if server is not None:
+            report["fake_server"] = server.RequestHandlerClass.state.stats()
+        return report
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+def _measure(args: argparse.Namespace, server: Optional[Any]) -> Dict[str, Any]:
+    from llm_client import get_default_client
+
+    data = load_hotpot_examples(args.dev)
+    samples = list(islice(data, args.limit))
+    warmup = list(islice(data, args.limit, args.limit + args.warmup)) if args.warmup else []
+
+    t0 = time.perf_counter()
+    pipeline = _make_pipeline(args)
+    setup_s = time.perf_counter() - t0
+
+    client = get_default_client()
+    if warmup:
+        for _ in pipeline.run_batch(warmup, concurrency=args.concurrency):
+            pass
+    if server is not None:
+        server.RequestHandlerClass.state.reset()
+
+    llm_before = client.stats()
+    stage_ms: Dict[str, List[float]] = {}
+    errors = 0
+    exact = 0
+    t0 = time.perf_counter()
+    for sample, result in zip(samples, pipeline.run_batch(samples, concurrency=args.concurrency)):
+        if result.error is not None:
+            errors += 1
+            print(f"[WARNING] Failed on {result.id}: {result.error!r}")
+            continue
+        exact += int(normalize_answer(result.answer) == normalize_answer(sample.get("answer", "")))
+        for stage, secs in result.timings.items():
+            stage_ms.setdefault(stage, []).append(secs * 1000)
+    wall_s = time.perf_counter() - t0
+    pipeline.close()
+    llm = _llm_delta(llm_before, client.stats())
+
+    n = len(samples)
+    answered = max(1, n - errors)
+    report: Dict[str, Any] = {
+        "config": {
+            "dev": args.dev,
+            "questions": n,
+            "concurrency": args.concurrency,
+            "distractor": args.distractor,
+            "cascade": args.cascade,
+            "reranker": args.reranker,
+            "combined_rewrites": args.combined_rewrites,
+            "compress": args.compress,
+            "dense_index": args.dense_index,
+            "top_k": args.top_k,
+            "fake_llm": args.fake_latency if args.fake_llm else None,
+        },
+        "setup_s": setup_s,
+        "wall_s": wall_s,
+        "throughput_qps": n / wall_s if wall_s > 0 else 0.0,
+        "errors": errors,
+        "em": exact / answered,
+        "stages_ms": {
+            stage: {f"p{p}": percentile(values, p) for p in STAGE_PERCENTILES}
+            for stage, values in stage_ms.items()
+        },
+        "llm": dict(llm, **{f"{k}_per_question": llm[k] / max(1, n) for k in ("calls", "prompt_tokens", "completion_tokens")}),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return report
+
+
+def check_regressions(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    max_slowdown: float = 0.1,
+    min_delta_ms: float = 5.0,
+) -> List[str]:
+    """
+    Human-readable regressions of `report` against `baseline` (empty if none)
+
+    Stage p95s only count when they are also `min_delta_ms` slower, so
+    sub-millisecond stages do not fail on noise.
+    """
+    failures: List[str] = []
+
+    floor = baseline["throughput_qps"] * (1 - max_slowdown)
+    if report["throughput_qps"] < floor:
+        failures.append(
+            f"throughput {report['throughput_qps']:.2f} q/s < {floor:.2f} "
+            f"(baseline {baseline['throughput_qps']:.2f})"
+        )
+
+    for stage, base in baseline.get("stages_ms", {}).items():
+        cur = report["stages_ms"].get(stage)
+        if cur is None:
+            continue
+        if cur["p95"] > base["p95"] * (1 + max_slowdown) and cur["p95"] - base["p95"] > min_delta_ms:
+            failures.append(f"{stage} p95 {cur['p95']:.1f} ms > baseline {base['p95']:.1f} ms")
+
+    for key in ("calls_per_question", "prompt_tokens_per_question"):
+        cur, base = report["llm"].get(key, 0.0), baseline.get("llm", {}).get(key, 0.0)
+        if base and cur > base * (1 + max_slowdown):
+            failures.append(f"LLM {key.replace('_', ' ')} {cur:.1f} > baseline {base:.1f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the end-to-end RAG pipeline on a dev slice")
+    parser.add_argument("--dev", type=str, default="hotpot_dev_distractor_v1.json")
+    parser.add_argument("--index", type=str, default="data/index/bm25s_index")
+    parser.add_argument("--store", type=str, default="data/index/bm25_store.pkl")
+    parser.add_argument("--limit", type=int, default=100, help="Size of the benchmark slice")
+    parser.add_argument("--warmup", type=int, default=0, help="Uncounted questions run first")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rerank-batch", type=int, default=48)
+    parser.add_argument("--reranker", type=str, default="llm", choices=RERANKER_BACKENDS)
+    parser.add_argument("--dense-index", type=str, default=None)
+    parser.add_argument("--distractor", action="store_true")
+    parser.add_argument("--cascade", action="store_true")
+    parser.add_argument("--combined-rewrites", action="store_true")
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--fake-llm", action="store_true", help="Run against an in-process fake_llm_server")
+    parser.add_argument("--fake-latency", type=str, default="const:0.2", help="See fake_llm_server.py --latency")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--out", type=str, default=None, help="Write the report as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="Earlier report to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=0.1, help="Allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore stage p95 changes smaller than this")
+
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+
+    print(
+        f"Questions: {report['config']['questions']} in {report['wall_s']:.1f}s "
+        f"({report['throughput_qps']:.2f} q/s, setup {report['setup_s']:.1f}s), "
+        f"errors {report['errors']}, EM {report['em']:.3f}"
+    )
+    for stage, lat in report["stages_ms"].items():
+        print(f"{stage:<9} p50={lat['p50']:8.1f}ms p95={lat['p95']:8.1f}ms p99={lat['p99']:8.1f}ms")
+    llm = report["llm"]
+    print(
+        f"LLM: {llm['calls_per_question']:.1f} calls/question ({llm['retries']} retries, {llm['failures']} failures), "
+        f"{llm['prompt_tokens_per_question']:.0f} prompt + {llm['completion_tokens_per_question']:.0f} completion tokens/question"
+    )
+    if report["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {report['peak_rss_mb']:.0f} MB")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[DONE] Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = check_regressions(report, baseline, args.max_slowdown, args.min_delta_ms)
+        for failure in failures:
+            print(f"[ERROR] {failure}")
+        if failures:
+            raise SystemExit(1)
+        print(f"[INFO] No regression against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
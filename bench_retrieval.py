@@ -0,0 +1,149 @@
+import argparse
+import json
+import time
+from itertools import islice
+from typing import List, Dict, Any, Optional
+
+from data_utils import load_hotpot_examples
+
+"""
+Retrieval benchmark: recall@k of BM25-only vs dense vs hybrid on HotpotQA dev
+
+To run:
+python bench_retrieval.py \
+  --dev hotpot_dev_distractor_v1.json \
+  --index data/index/bm25s_index \
+  --store data/index/bm25_store.pkl \
+  --dense-index data/index/dense_index \
+  --limit 1000 \
+  --k 5 10 20
+
+Recall@k for one question is the fraction of its gold supporting-fact titles
+found among the titles of the top-k retrieved chunks, averaged over questions.
+Only the original question is used as the query (no LLM rewrites), which is
+the case dense retrieval is meant to help with. Latencies are per query, and
+"dense lookup" times the IVF search alone (query already encoded).
+"""
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _gold_titles(sample: Dict[str, Any]) -> List[str]:
+    return sorted({title for title, _ in sample.get("supporting_facts", [])})
+
+
+def _title_recall(results: List[Dict[str, Any]], gold: List[str], k: int) -> float:
+    titles = {r["meta"].get("title") for r in results[:k]}
+    return sum(1 for t in gold if t in titles) / len(gold)
+
+
+def run_benchmark(
+    dev_json_path: str,
+    index_path: str,
+    store_path: str,
+    dense_index_path: Optional[str],
+    ks: List[int],
+    limit: Optional[int] = 1000,
+    n_probe: int = 16,
+    fusion: str = "rrf",
+    alpha: float = 0.5,
+) -> Dict[str, Any]:
+    from BM25S_retrieval import BM25Retriever
+
+    bm25 = BM25Retriever(index_path=index_path, store_path=store_path)
+    retrievers: Dict[str, Any] = {"bm25": bm25}
+    dense = None
+    if dense_index_path:
+        from dense_index import DenseRetriever
+        from hybrid_retrieval import HybridRetriever
+
+        dense = DenseRetriever(dense_index_path, store=bm25.store, n_probe=n_probe)
+        retrievers["dense"] = dense
+        retrievers["hybrid"] = HybridRetriever(bm25, dense, fusion=fusion, alpha=alpha)
+
+    max_k = max(ks)
+    recall_sums = {name: {k: 0.0 for k in ks} for name in retrievers}
+    latencies: Dict[str, List[float]] = {name: [] for name in retrievers}
+    lookup_ms: List[float] = []
+    n_questions = 0
+
+    for sample in islice(load_hotpot_examples(dev_json_path), limit):
+        gold = _gold_titles(sample)
+        question = sample.get("question", "")
+        if not gold or not question:
+            continue
+        n_questions += 1
+
+        for name, retriever in retrievers.items():
+            t0 = time.perf_counter()
+            results, _ = retriever.retrieve(question, top_k=max_k)
+            latencies[name].append((time.perf_counter() - t0) * 1000)
+            for k in ks:
+                recall_sums[name][k] += _title_recall(results, gold, k)
+
+        if dense is not None:
+            query_vec = dense.encode(question)
+            t0 = time.perf_counter()
+            dense.index.search(query_vec, top_k=max_k)
+            lookup_ms.append((time.perf_counter() - t0) * 1000)
+
+    report: Dict[str, Any] = {"questions": n_questions, "n_probe": n_probe, "fusion": fusion, "retrievers": {}}
+    for name in retrievers:
+        report["retrievers"][name] = {
+            "recall": {f"@{k}": recall_sums[name][k] / max(n_questions, 1) for k in ks},
+            "latency_ms": {"p50": percentile(latencies[name], 50), "p95": percentile(latencies[name], 95)},
+        }
+    if lookup_ms:
+        report["dense_lookup_ms"] = {"p50": percentile(lookup_ms, 50), "p95": percentile(lookup_ms, 95)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks recall@k of BM25 vs dense vs hybrid retrieval")
+    parser.add_argument("--dev", type=str, default="hotpot_dev_distractor_v1.json")
+    parser.add_argument("--index", type=str, default="data/index/bm25s_index")
+    parser.add_argument("--store", type=str, default="data/index/bm25_store.pkl")
+    parser.add_argument("--dense-index", type=str, default=None, help="Dense index dir (BM25 only if omitted)")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--n-probe", type=int, default=16)
+    parser.add_argument("--fusion", type=str, default="rrf", choices=["rrf", "linear"])
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--out", type=str, default=None, help="Also writes the report as JSON")
+
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        dev_json_path=args.dev,
+        index_path=args.index,
+        store_path=args.store,
+        dense_index_path=args.dense_index,
+        ks=args.k,
+        limit=args.limit,
+        n_probe=args.n_probe,
+        fusion=args.fusion,
+        alpha=args.alpha,
+    )
+
+    print(f"Questions: {report['questions']}")
+    for name, stats in report["retrievers"].items():
+        recall = "  ".join(f"R{k}={v:.3f}" for k, v in stats["recall"].items())
+        lat = stats["latency_ms"]
+        print(f"{name:<7} {recall}  p50={lat['p50']:.1f}ms p95={lat['p95']:.1f}ms")
+    if "dense_lookup_ms" in report:
+        lat = report["dense_lookup_ms"]
+        print(f"dense lookup (IVF search only): p50={lat['p50']:.2f}ms p95={lat['p95']:.2f}ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
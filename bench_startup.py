@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, Any, List, Optional
+
+"""
+Startup-time benchmark for the entry points
+
+To run:
+python bench_startup.py \
+  --repeat 5 \
+  --index data/index/bm25s_index \
+  --store data/index/bm25_store.pkl \
+  --out bench_startup.json
+
+Each import is timed in a fresh interpreter. The benchmark also records which
+heavy dependencies an import pulled in. With --max-import-ms or --forbid-heavy,
+it exits with code 1 on a regression.
+"""
+
+ENTRY_POINTS = [
+    "predict_full",
+    "predict_sample",
+    "BM25S_retrieval",
+    "build_BM25_index",
+    "multi_BM25_retrieval",
+    "question_reformulating",
+    "llm_pipeline",
+    "llm_query_utils",
+    "data_utils",
+    "evaluation",
+]
+
+# Dependencies that should only be imported on the code paths that need them
+HEAVY_MODULES = ["torch", "numpy", "scipy", "sentence_transformers", "mistralai", "bm25s", "httpx"]
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+_INDEX_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+from BM25S_retrieval import BM25Retriever
+BM25Retriever({index!r}, {store!r})
+print(json.dumps({{"seconds": time.perf_counter() - t0}}))
+"""
+
+
+def _run_snippet(code: str) -> Optional[Dict[str, Any]]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=here,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        err = proc.stderr.strip().splitlines()
+        return {"error": err[-1] if err else f"exit code {proc.returncode}"}
+    # The last line is our JSON; anything before it is the module's own output
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_imports(modules: List[str], repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for module in modules:
+        times: List[float] = []
+        heavy: List[str] = []
+        error = None
+        for _ in range(repeat):
+            res = _run_snippet(_IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES))
+            if "error" in res:
+                error = res["error"]
+                break
+            times.append(res["seconds"])
+            heavy = res["heavy"]
+
+        if error:
+            results[module] = {"error": error}
+            print(f"[WARNING] import {module} failed: {error}")
+            continue
+
+        results[module] = {
+            "import_ms_min": min(times) * 1000,
+            "import_ms_median": statistics.median(times) * 1000,
+            "heavy_modules": heavy,
+        }
+        print(
+            f"[INFO] import {module:24s} min {min(times) * 1000:8.1f} ms   "
+            f"median {statistics.median(times) * 1000:8.1f} ms   heavy={heavy}"
+        )
+    return results
+
+
+def bench_index_load(index_path: str, store_path: str) -> Dict[str, Any]:
+    res = _run_snippet(_INDEX_SNIPPET.format(index=index_path, store=store_path))
+    if "error" in res:
+        print(f"[WARNING] Index load failed: {res['error']}")
+        return res
+    print(f"[INFO] BM25 index + store load: {res['seconds']:.2f} s")
+    return {"index_load_s": res["seconds"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks import and index-load time per entry point")
+    parser.add_argument("--modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--index", type=str, default=None)
+    parser.add_argument("--store", type=str, default=None)
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Fail if any median import is slower")
+    parser.add_argument(
+        "--forbid-heavy",
+        action="store_true",
+        help="Fail if importing an entry point pulls in a heavy dependency",
+    )
+
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {"imports": bench_imports(args.modules, repeat=args.repeat)}
+    if args.index and args.store:
+        results["index"] = bench_index_load(args.index, args.store)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[DONE] Results written to {args.out}")
+
+    failures = []
+    for module, res in results["imports"].items():
+        if "error" in res:
+            continue
+        if args.max_import_ms is not None and res["import_ms_median"] > args.max_import_ms:
+            failures.append(f"{module}: {res['import_ms_median']:.1f} ms > {args.max_import_ms} ms")
+        if args.forbid_heavy and res["heavy_modules"]:
+            failures.append(f"{module}: imports {', '.join(res['heavy_modules'])}")
+
+    for failure in failures:
+        print(f"[ERROR] {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 import argparse
 import pickle
-import bm25s
 from data_utils import load_chunks_jsonl
 
 """
 To run:
 python build_BM25_index.py \
-  --chunks data/processed/chunks.jsonl \
+  --chunks data/processed/splits \
   --out-index data/index/bm25s_index \
   --out-store data/index/bm25_store.pkl
+
+--chunks accepts a merged JSONL file, a directory of chunks_part_*.jsonl
+parts, or a glob of parts. Parts are parsed in parallel worker processes.
 """
 
 def build_bm25s_index(
@@ -16,9 +18,16 @@ def build_bm25s_index(
     out_index_path: str,
     out_store_path: str,
     max_docs: int | None = None,
+    workers: int | None = None,
+    method: str = "lucene",
+    k1: float = 1.5,
+    b: float = 0.75,
+    stopwords: str = "en",
 ) -> None:
+    import bm25s
+
     print(f"[INFO] Loading chunks from {chunks_path}")
-    texts, meta = load_chunks_jsonl(chunks_path, max_docs=max_docs)
+    texts, meta = load_chunks_jsonl(chunks_path, max_docs=max_docs, workers=workers)
     print(f"[INFO] Loaded {len(texts)} chunks")
 
     if not texts:
@@ -27,10 +36,10 @@ def build_bm25s_index(
 
     # Tokenize with BM25S tokenizer (handles stopwords etc.)
     print("[INFO] Tokenizing corpus with bm25s.tokenize()")
-    corpus_tokens = bm25s.tokenize(texts, stopwords="en")
+    corpus_tokens = bm25s.tokenize(texts, stopwords=stopwords)
 
-    print("[INFO] Building BM25S index (Using Lucene style BM25)")
-    retriever = bm25s.BM25(corpus=texts, method="lucene")
+    print(f"[INFO] Building BM25S index (method={method}, k1={k1}, b={b})")
+    retriever = bm25s.BM25(corpus=texts, method=method, k1=k1, b=b)
     retriever.index(corpus_tokens)
     print("[INFO] BM25S index built")
 
@@ -46,10 +55,20 @@ def build_bm25s_index(
 
 def main():
     parser = argparse.ArgumentParser(description="Builds BM25S index over wiki chunks")
-    parser.add_argument("--chunks", type=str, required=True)
+    parser.add_argument(
+        "--chunks",
+        type=str,
+        required=True,
+        help="Chunks JSONL file, directory of chunks_part_*.jsonl files, or glob of parts",
+    )
     parser.add_argument("--out-index", type=str, default="data/index/bm25s_index")
     parser.add_argument("--out-store", type=str, default="data/index/bm25_store.pkl")
     parser.add_argument("--max-docs", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for parsing parts")
+    parser.add_argument("--method", type=str, default="lucene", help="BM25 variant (lucene, robertson, atire, bm25l, bm25+)")
+    parser.add_argument("--k1", type=float, default=1.5)
+    parser.add_argument("--b", type=float, default=0.75)
+    parser.add_argument("--stopwords", type=str, default="en")
 
     args = parser.parse_args()
 
@@ -58,6 +77,11 @@ def main():
         out_index_path=args.out_index,
         out_store_path=args.out_store,
         max_docs=args.max_docs,
+        workers=args.workers,
+        method=args.method,
+        k1=args.k1,
+        b=args.b,
+        stopwords=args.stopwords,
     )
 
 
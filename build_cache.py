@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from typing import Dict, Any, List
+
+import data_utils
+from data_utils import resolve_chunk_paths, load_split_manifest, DEFAULT_CHUNK_PREFIX
+
+"""
+Content-addressed cache for build artifacts (BM25 index + store), used by deploy.sh
+
+To compute the key for the current inputs:
+python build_cache.py key \
+  --chunks data/processed/splits \
+  --param method=lucene --param stopwords=en
+
+To restore artifacts for a key (exit code 1 if not cached):
+python build_cache.py restore --key <key> \
+  --artifact data/index/bm25s_index --artifact data/index/bm25_store.pkl
+
+To save freshly built artifacts under a key:
+python build_cache.py save --key <key> \
+  --artifact data/index/bm25s_index --artifact data/index/bm25_store.pkl
+"""
+
+DEFAULT_CACHE_DIR = ".build_cache"
+
+# Source files whose contents change what the index build produces
+BUILD_SOURCES = ["build_BM25_index.py"]
+# The chunk-loading code in data_utils.py the build uses; the rest of that
+# module (dataset caches, helpers for predictions) does not affect the index
+BUILD_FUNCTIONS = [
+    "resolve_chunk_paths",
+    "split_manifest_path",
+    "load_split_manifest",
+    "_parse_chunk_lines",
+    "_load_chunk_part",
+    "load_chunks_jsonl",
+]
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_fingerprints(chunks: str, prefix: str = DEFAULT_CHUNK_PREFIX) -> Dict[str, str]:
+    """
+    sha256 per chunk part. Taken from the split manifest when there is one
+    (deploy.sh verifies the parts against it), otherwise hashed from disk.
+    """
+    manifest = load_split_manifest(chunks, prefix) if os.path.isdir(chunks) else None
+    if manifest:
+        return {p["file"]: p["sha256"] for p in manifest["parts"]}
+    return {os.path.basename(p): _file_sha256(p) for p in resolve_chunk_paths(chunks, prefix)}
+
+
+def compute_key(chunks: str, params: Dict[str, str], prefix: str = DEFAULT_CHUNK_PREFIX) -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    inputs: Dict[str, Any] = {
+        "chunks": chunk_fingerprints(chunks, prefix),
+        "sources": {name: _file_sha256(os.path.join(here, name)) for name in BUILD_SOURCES},
+        "functions": {
+            name: hashlib.sha256(inspect.getsource(getattr(data_utils, name)).encode("utf-8")).hexdigest()
+            for name in BUILD_FUNCTIONS
+        },
+        "chunk_prefix": DEFAULT_CHUNK_PREFIX,
+        "params": dict(sorted(params.items())),
+    }
+    blob = json.dumps(inputs, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def _replace_with_copy(src: str, dst: str) -> None:
+    """
+    Replaces dst with a copy of src (file or directory)
+    Copies rather than hard-links so rebuilding in place can't corrupt the cache
+    """
+    if os.path.isdir(dst):
+        shutil.rmtree(dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+
+    if os.path.isdir(src):
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+
+def restore(key: str, artifacts: List[str], cache_dir: str = DEFAULT_CACHE_DIR) -> bool:
+    entry = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(entry, "COMPLETE")):
+        return False
+
+    for artifact in artifacts:
+        src = os.path.join(entry, os.path.basename(artifact))
+        if not os.path.exists(src):
+            return False
+
+    for artifact in artifacts:
+        _replace_with_copy(os.path.join(entry, os.path.basename(artifact)), artifact)
+    print(f"[INFO] Restored {len(artifacts)} artifact(s) from {entry}")
+    return True
+
+
+def save(key: str, artifacts: List[str], cache_dir: str = DEFAULT_CACHE_DIR) -> None:
+    entry = os.path.join(cache_dir, key)
+    tmp_entry = f"{entry}.tmp"
+    if os.path.exists(tmp_entry):
+        shutil.rmtree(tmp_entry)
+    os.makedirs(tmp_entry)
+
+    for artifact in artifacts:
+        _replace_with_copy(artifact, os.path.join(tmp_entry, os.path.basename(artifact)))
+
+    # Marker so a half-written entry is never restored
+    with open(os.path.join(tmp_entry, "COMPLETE"), "w", encoding="utf-8") as f:
+        f.write(key + "\n")
+
+    if os.path.exists(entry):
+        shutil.rmtree(entry)
+    os.replace(tmp_entry, entry)
+    print(f"[INFO] Saved {len(artifacts)} artifact(s) to {entry}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed build artifact cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    key_p = sub.add_parser("key", help="Print the cache key for the build inputs")
+    key_p.add_argument("--chunks", type=str, required=True)
+    key_p.add_argument("--prefix", type=str, default=DEFAULT_CHUNK_PREFIX)
+    key_p.add_argument("--param", action="append", default=[], help="Build parameter as name=value")
+
+    for name in ("restore", "save"):
+        p = sub.add_parser(name)
+        p.add_argument("--key", type=str, required=True)
+        p.add_argument("--artifact", action="append", required=True)
+        p.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == "key":
+        params = dict(p.split("=", 1) for p in args.param)
+        print(compute_key(args.chunks, params, prefix=args.prefix))
+    elif args.command == "restore":
+        raise SystemExit(0 if restore(args.key, args.artifact, args.cache_dir) else 1)
+    else:
+        save(args.key, args.artifact, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+from voting import is_fallback_answer
+
+"""
+Cheap-first cascade for predict_full.py
+
+The "original" trajectory (the question as-is: retrieve -> rerank -> answer)
+runs first. The rewrite / decomp / entity trajectories only run when
+CascadePolicy.escalation_reason() finds the first answer untrustworthy:
+
+  - "fallback":    the answer is the "cannot answer" fallback (or empty)
+  - "bm25_margin": the top BM25 hit does not stand out:
+                   (top1 - top2) / top1 < min_bm25_margin
+                   (with hybrid retrieval this uses the raw BM25 scores the
+                   fusion keeps as "bm25_score", not the fused RRF scores)
+  - "rerank":      the best reranker score among the candidates < min_rerank_score
+  - "confidence":  the answer's confidence (one scoring call) < min_answer_conf
+
+Any threshold set to 0 disables that check; min_answer_conf = 0 also skips
+the scoring call. Checks run in the order above and stop at the first
+failing one, so the scoring call is only made when everything cheaper passed.
+
+stats() counts questions, escalations and escalations per reason.
+"""
+
+
+class CascadePolicy:
+    def __init__(
+        self,
+        min_bm25_margin: float = 0.1,
+        min_rerank_score: float = 0.5,
+        min_answer_conf: float = 0.7,
+    ):
+        self.min_bm25_margin = min_bm25_margin
+        self.min_rerank_score = min_rerank_score
+        self.min_answer_conf = min_answer_conf
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {"questions": 0, "escalated": 0, "reasons": {}}
+
+    @staticmethod
+    def bm25_margin(docs: List[Dict[str, Any]]) -> float:
+        """
+        Relative gap between the two best BM25 scores (1.0 with a single hit)
+
+        Hybrid results carry the raw BM25 score as "bm25_score" ("score" is
+        the fused rank score there); dense-only hits have none and are skipped.
+        """
+        raw = (d["bm25_score"] if "bm25_score" in d else d["score"] for d in docs)
+        scores = sorted((s for s in raw if s is not None), reverse=True)
+        if not scores or scores[0] <= 0:
+            return 0.0
+        if len(scores) == 1:
+            return 1.0
+        return (scores[0] - scores[1]) / scores[0]
+
+    def escalation_reason(
+        self,
+        answer: Optional[str],
+        docs: List[Dict[str, Any]],
+        rerank_scores: Optional[List[float]] = None,
+        answer_conf_fn: Optional[Callable[[], float]] = None,
+    ) -> Optional[str]:
+        """
+        Why the first-stage answer should be escalated, or None to accept it
+
+        `answer_conf_fn` is only called if every cheaper check passed.
+        """
+        if is_fallback_answer(answer):
+            reason = "fallback"
+        elif self.min_bm25_margin > 0 and self.bm25_margin(docs) < self.min_bm25_margin:
+            reason = "bm25_margin"
+        elif self.min_rerank_score > 0 and rerank_scores is not None and max(rerank_scores, default=0.0) < self.min_rerank_score:
+            reason = "rerank"
+        elif self.min_answer_conf > 0 and answer_conf_fn is not None and answer_conf_fn() < self.min_answer_conf:
+            reason = "confidence"
+        else:
+            reason = None
+
+        self._record(reason)
+        return reason
+
+    def _record(self, reason: Optional[str]) -> None:
+        with self._lock:
+            self._stats["questions"] += 1
+            if reason is not None:
+                self._stats["escalated"] += 1
+                self._stats["reasons"][reason] = self._stats["reasons"].get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self._stats, "reasons": dict(self._stats["reasons"])}
+        stats["escalation_rate"] = stats["escalated"] / stats["questions"] if stats["questions"] else 0.0
+        return stats
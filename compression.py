@@ -0,0 +1,171 @@
+import math
+import re
+from typing import List, Dict, Optional, Any, Iterable
+
+"""
+Extractive, local compression of retrieved chunks before answer generation
+
+Chunks are up to 200 words, but usually only a sentence or two matters. The
+SentenceCompressor splits each chunk into sentences, scores every sentence
+against the question (and the trajectory's sub-queries) by the summed IDF of
+the query terms it contains, and keeps the best few, in their original order,
+under the chunk's title:
+
+    compressor = SentenceCompressor(IDFTable.from_bm25(bm25_retriever.retriever))
+    passages = compressor.compress(question, texts, titles=titles, queries=sub_queries)
+
+The IDF values come from the BM25 index's own document frequencies, so no
+model and no LLM call is involved. IDFTable.from_texts() builds a local table
+when no index is at hand.
+"""
+
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+# Splits after . ! ? when the next sentence starts with a capital, digit or quote
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by did do does for from had has have he her his how in is it its "
+    "of on or she that the their they this to was were what when where which who whom whose why "
+    "will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s.strip()]
+
+
+class IDFTable:
+    """
+    Inverse document frequency per token (Lucene BM25 formula)
+
+    Tokens missing from the table are treated as rare and get `unknown_idf`
+    (the highest IDF in the corpus by default).
+    """
+
+    def __init__(self, doc_freq: Any, n_docs: int, vocab: Optional[Dict[str, int]] = None):
+        # doc_freq is either {token: df} (vocab None) or a callable id -> df
+        self._doc_freq = doc_freq
+        self._vocab = vocab
+        self.n_docs = max(1, n_docs)
+        self.unknown_idf = self._idf_from_df(1)
+        self._cache: Dict[str, float] = {}
+
+    def _idf_from_df(self, df: int) -> float:
+        return math.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def from_bm25(cls, bm25: Any) -> "IDFTable":
+        """
+        Uses the document frequencies stored in a loaded bm25s.BM25 index
+
+        The index keeps one column of scores per token, so a token's document
+        frequency is the length of its column (indptr[t + 1] - indptr[t]).
+        """
+        indptr = bm25.scores["indptr"]
+        n_docs = int(bm25.scores["num_docs"])
+        return cls(lambda t: int(indptr[t + 1] - indptr[t]), n_docs, vocab=bm25.vocab_dict)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "IDFTable":
+        doc_freq: Dict[str, int] = {}
+        n_docs = 0
+        for text in texts:
+            n_docs += 1
+            for token in set(tokenize(text)):
+                doc_freq[token] = doc_freq.get(token, 0) + 1
+        return cls(doc_freq, n_docs)
+
+    def idf(self, token: str) -> float:
+        cached = self._cache.get(token)
+        if cached is not None:
+            return cached
+
+        if self._vocab is not None:
+            token_id = self._vocab.get(token)
+            df = self._doc_freq(token_id) if token_id is not None else 0
+        else:
+            df = self._doc_freq.get(token, 0)
+        value = self._idf_from_df(df) if df else self.unknown_idf
+
+        # Bounded memo: the query vocabulary of one run is small
+        if len(self._cache) < 100_000:
+            self._cache[token] = value
+        return value
+
+
+class SentenceCompressor:
+    """
+    Keeps the top `per_chunk` sentences of each chunk and at most
+    `max_sentences` sentences overall. Chunks with no query term at all are
+    dropped (unless that would drop everything).
+    """
+
+    def __init__(
+        self,
+        idf: Optional[IDFTable] = None,
+        per_chunk: int = 2,
+        max_sentences: int = 8,
+        sub_query_weight: float = 0.5,
+    ):
+        self.idf = idf
+        self.per_chunk = per_chunk
+        self.max_sentences = max_sentences
+        self.sub_query_weight = sub_query_weight
+
+    def _query_weights(self, question: str, queries: Optional[List[str]], idf: IDFTable) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for q in queries or []:
+            for token in tokenize(q):
+                weights[token] = self.sub_query_weight * idf.idf(token)
+        # Question terms take precedence over sub-query terms
+        for token in tokenize(question):
+            weights[token] = idf.idf(token)
+        return weights
+
+    def compress(
+        self,
+        question: str,
+        contexts: List[str],
+        titles: Optional[List[Optional[str]]] = None,
+        queries: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Returns one compressed passage per kept chunk, in the chunks' order:
+        "<title>: <sentence> <sentence>"
+        """
+        if not contexts:
+            return []
+
+        idf = self.idf or IDFTable.from_texts(contexts)
+        weights = self._query_weights(question, queries, idf)
+
+        # (chunk index, sentence index, score) of each chunk's best sentences
+        scored: List[tuple] = []
+        sentences: List[List[str]] = []
+        for ci, ctx in enumerate(contexts):
+            sents = split_sentences(ctx)
+            sentences.append(sents)
+            ranked = sorted(
+                ((ci, si, sum(weights.get(t, 0.0) for t in set(tokenize(s)))) for si, s in enumerate(sents)),
+                key=lambda x: x[2],
+                reverse=True,
+            )
+            scored.extend(ranked[: self.per_chunk])
+
+        candidates = [x for x in scored if x[2] > 0] or scored
+        best = sorted(candidates, key=lambda x: x[2], reverse=True)[: self.max_sentences]
+
+        keep: Dict[int, List[int]] = {}
+        for ci, si, _ in best:
+            keep.setdefault(ci, []).append(si)
+
+        passages: List[str] = []
+        for ci in sorted(keep):
+            body = " ".join(sentences[ci][si] for si in sorted(keep[ci]))
+            title = titles[ci] if titles and ci < len(titles) else None
+            passages.append(f"{title}: {body}" if title else body)
+        return passages
@@ -0,0 +1,113 @@
+import argparse
+import inspect
+import math
+import os
+import threading
+from typing import List, Optional, Any
+
+"""
+Local CPU reranker: a small sentence-transformers cross-encoder with the same
+score() / rerank() interface as ContextReranker, so no network call is needed
+
+To test:
+python cross_encoder_reranker.py \
+  --question "Were Scott Derrickson and Ed Wood of the same nationality?" \
+  --context "Scott Derrickson is an American director." \
+  --context "Ed Wood was an American filmmaker." \
+  --context "Paris is the capital of France."
+
+Passages are sorted by length before batching, so each batch is padded only to
+its own longest passage (dynamic padding). The original order is restored
+afterwards. The number of torch CPU threads can be set with num_threads or
+the RERANKER_THREADS environment variable.
+
+Scores are the sigmoid of the model's raw logit, applied exactly once:
+predict() is called with an identity activation, because sentence-transformers
+otherwise applies its own Sigmoid to single-label models. The mapping is
+fixed, so scores from different batches (and CascadePolicy's
+min_rerank_score) stay comparable.
+"""
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def _sigmoid(values: Any) -> List[float]:
+    # Written to avoid overflow in exp for large magnitudes
+    scores = [float(v) for v in values]
+    return [1.0 / (1.0 + math.exp(-s)) if s >= 0 else math.exp(s) / (1.0 + math.exp(s)) for s in scores]
+
+
+class CrossEncoderReranker:
+    # Batches are already run as one forward pass each; no point in threads
+    parallel_batches = False
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_CROSS_ENCODER,
+        batch_size: int = 32,
+        max_length: int = 256,
+        num_threads: Optional[int] = None,
+        device: str = "cpu",
+    ):
+        # torch / sentence-transformers are only imported when this backend is used
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        num_threads = num_threads or int(os.environ.get("RERANKER_THREADS", 0)) or None
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        print(f"[INFO] Loading cross-encoder {model_name} on {device}...")
+        self.model = CrossEncoder(model_name, max_length=max_length, device=device)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        # The activation argument was renamed in sentence-transformers 4
+        predict_params = inspect.signature(self.model.predict).parameters
+        activation_arg = "activation_fn" if "activation_fn" in predict_params else "activation_fct"
+        self._predict_kwargs = {activation_arg: torch.nn.Identity()}
+        # One forward pass at a time: concurrent questions would only fight over CPU threads
+        self._lock = threading.Lock()
+
+    def score(self, question: str, contexts: List[str]) -> List[float]:
+        """
+        Returns a list of floats in [0, 1], one per context
+        """
+        if not contexts:
+            return []
+
+        order = sorted(range(len(contexts)), key=lambda i: len(contexts[i]))
+        pairs = [(question, contexts[i]) for i in order]
+
+        with self._lock:
+            logits = self.model.predict(
+                pairs, batch_size=self.batch_size, show_progress_bar=False, **self._predict_kwargs
+            )
+
+        sorted_scores = _sigmoid(logits)
+        scores = [0.0] * len(contexts)
+        for pos, i in enumerate(order):
+            scores[i] = sorted_scores[pos]
+        return scores
+
+    def rerank(self, question: str, contexts: List[str]) -> List[int]:
+        scores = self.score(question, contexts)
+        return sorted(range(len(contexts)), key=lambda i: scores[i], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scores passages with a local cross-encoder")
+    parser.add_argument("--question", type=str, required=True)
+    parser.add_argument("--context", type=str, action="append", required=True)
+    parser.add_argument("--model", type=str, default=DEFAULT_CROSS_ENCODER)
+    parser.add_argument("--threads", type=int, default=None)
+
+    args = parser.parse_args()
+
+    reranker = CrossEncoderReranker(args.model, num_threads=args.threads)
+    scores = reranker.score(args.question, args.context)
+    for i in reranker.rerank(args.question, args.context):
+        print(f"{scores[i]:.3f}  {args.context[i][:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
 from typing import List, Dict
+import glob
 import json
+import os
+import pickle
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+
+DEFAULT_CHUNK_PREFIX = "chunks_part"
 
 def load_hotpot_json(path: str | Path) -> List[Dict]:
     """
@@ -12,6 +21,186 @@ def load_hotpot_json(path: str | Path) -> List[Dict]:
         return json.load(f)
 
 
+def iter_hotpot_json(path: str | Path, buffer_size: int = 1 << 20) -> Iterator[Dict]:
+    """
+    Streams examples from a HotpotQA JSON file (a top-level array) one at a time
+
+    Only one buffer of text is held in memory, so the first question is
+    available straight away even for the ~500MB train set.
+    """
+    decoder = json.JSONDecoder()
+    path = Path(path)
+
+    with path.open("r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        started = False
+        eof = False
+
+        while True:
+            # Skips whitespace / separators, reading more when the buffer runs out
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f"Unexpected end of file in {path}")
+                buf = f.read(buffer_size)
+                pos = 0
+                eof = not buf
+                continue
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"Expected a JSON array in {path}")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(buffer_size)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+
+            yield obj
+            pos = end
+
+
+class HotpotStore:
+    """
+    Binary cache of a HotpotQA JSON file: one pickled record per question in
+    SQLite, in the original order, with random access by `_id`
+
+    The cache is built once (streaming the JSON) and rebuilt automatically if
+    the source file changes. Later runs open it almost instantly. Several
+    processes starting on a cold cache (e.g. shard workers) build it once:
+    the build holds a lock file, and each build writes its own temp file
+    before moving it into place.
+    """
+
+    CACHE_VERSION = "1"
+
+    def __init__(self, json_path: str | Path, cache_path: str | Path | None = None, rebuild: bool = False):
+        self.json_path = Path(json_path)
+        self.cache_path = Path(cache_path) if cache_path else Path(f"{self.json_path}.cache.sqlite")
+
+        if rebuild or not self._is_fresh():
+            with self._build_lock():
+                # Another process may have finished the build while we waited
+                if rebuild or not self._is_fresh():
+                    self._build()
+
+        self.conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self._len = self.conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+
+    def _source_signature(self) -> str:
+        st = self.json_path.stat()
+        return f"{self.CACHE_VERSION}:{st.st_size}:{st.st_mtime_ns}"
+
+    def _is_fresh(self) -> bool:
+        if not self.cache_path.exists():
+            return False
+        try:
+            conn = sqlite3.connect(str(self.cache_path))
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] == self._source_signature()
+
+    @contextmanager
+    def _build_lock(self) -> Iterator[None]:
+        """
+        Exclusive lock on <cache>.lock (a no-op where fcntl is unavailable)
+        """
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+
+        with open(f"{self.cache_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _build(self) -> None:
+        print(f"[INFO] Building HotpotQA cache {self.cache_path} from {self.json_path}")
+        fd, tmp_name = tempfile.mkstemp(
+            dir=str(self.cache_path.parent), prefix=f"{self.cache_path.name}.", suffix=".tmp"
+        )
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        try:
+            n = self._write_cache(tmp_path)
+            os.replace(tmp_path, self.cache_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        print(f"[INFO] Cached {n} examples")
+
+    def _write_cache(self, tmp_path: Path) -> int:
+        conn = sqlite3.connect(str(tmp_path))
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE examples (idx INTEGER PRIMARY KEY, id TEXT, record BLOB)")
+
+        batch = []
+        n = 0
+        for n, sample in enumerate(iter_hotpot_json(self.json_path), start=1):
+            example_id = sample.get("_id") or sample.get("id")
+            batch.append((n - 1, example_id, pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL)))
+            if len(batch) >= 1000:
+                conn.executemany("INSERT INTO examples VALUES (?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.executemany("INSERT INTO examples VALUES (?, ?, ?)", batch)
+
+        conn.execute("CREATE INDEX examples_id ON examples (id)")
+        conn.execute("INSERT INTO meta VALUES ('source', ?)", (self._source_signature(),))
+        conn.commit()
+        conn.close()
+        return n
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Dict]:
+        for (record,) in self.conn.execute("SELECT record FROM examples ORDER BY idx"):
+            yield pickle.loads(record)
+
+    def get(self, example_id: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT record FROM examples WHERE id = ?", (example_id,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def ids(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT id FROM examples ORDER BY idx")]
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def load_hotpot_examples(path: str | Path, use_cache: bool = True):
+    """
+    Returns the HotpotQA examples as an iterable with len(): the binary
+    HotpotStore cache by default, or a plain list when use_cache=False.
+    """
+    if use_cache:
+        return HotpotStore(path)
+    return load_hotpot_json(path)
+
+
 def extract_context_paragraphs(sample: Dict, include_titles: bool = True) -> List[str]:
     """
     Turn the 'context' field of one HotpotQA sample into a list of paragraphs.
@@ -26,43 +215,161 @@ def extract_context_paragraphs(sample: Dict, include_titles: bool = True) -> Lis
             contexts.append(paragraph)
     return contexts
 
+def resolve_chunk_paths(path: str, prefix: str = DEFAULT_CHUNK_PREFIX) -> List[str]:
+    """
+    Resolves `path` to the ordered list of chunk JSONL files it refers to.
+
+    Accepts:
+        - a single JSONL file (e.g. data/processed/chunks.jsonl)
+        - a directory of split parts (e.g. data/processed/splits)
+        - a glob pattern (e.g. "data/processed/splits/chunks_part_*.jsonl")
+    """
+    if os.path.isdir(path):
+        pattern = os.path.join(path, f"{prefix}_*.jsonl")
+        paths = sorted(glob.glob(pattern))
+        if not paths:
+            raise FileNotFoundError(f"No files matching {pattern}")
+        return paths
+
+    if any(ch in path for ch in "*?["):
+        paths = sorted(glob.glob(path))
+        if not paths:
+            raise FileNotFoundError(f"No files matching {path}")
+        return paths
+
+    return [path]
+
+
+def split_manifest_path(split_dir: str, prefix: str = DEFAULT_CHUNK_PREFIX) -> str:
+    return os.path.join(split_dir, f"{prefix}_manifest.json")
+
+
+def load_split_manifest(split_dir: str, prefix: str = DEFAULT_CHUNK_PREFIX) -> Optional[Dict[str, Any]]:
+    """
+    Loads the manifest written by split_JSONL.py, or None if there isn't one
+
+    The manifest has one entry per part with its file name, line count,
+    global starting line number, byte size and sha256 checksum.
+    """
+    path = split_manifest_path(split_dir, prefix)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _parse_chunk_lines(
+    lines: List[bytes],
+    texts: List[str],
+    meta: List[Dict[str, Any]],
+) -> None:
+    """
+    Parses raw JSONL lines into `texts` and `meta` (appends in place)
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        obj = json.loads(line)
+        text = obj.get("text", "")
+        if not text:
+            continue
+
+        texts.append(text)
+        meta.append(
+            {
+                "chunk_id": obj.get("chunk_id"),
+                "doc_id": obj.get("doc_id"),
+                "title": obj.get("title"),
+                "url": obj.get("url"),
+                "metadata": obj.get("metadata", {}),
+            }
+        )
+
+
+def _load_chunk_part(
+    path: str,
+    max_lines: Optional[int] = None,
+) -> Tuple[List[str], List[Dict[str, Any]], int]:
+    """
+    Loads one JSONL part. Runs inside worker processes for multi-part loads.
+
+    Returns (texts, meta, number of raw lines read)
+    """
+    with open(path, "rb") as f:
+        if max_lines is None:
+            lines = f.read().splitlines()
+        else:
+            # Only the budgeted lines are read, not the whole part
+            lines = list(islice(f, max_lines))
+
+    texts: List[str] = []
+    meta: List[Dict[str, Any]] = []
+    _parse_chunk_lines(lines, texts, meta)
+    return texts, meta, len(lines)
+
+
 def load_chunks_jsonl(
     path: str,
     max_docs: Optional[int] = None,
+    workers: Optional[int] = None,
 ) -> Tuple[List[str], List[Dict[str, Any]]]:
     """
-    Loads chunks from the JSONL file
+    Loads chunks from a JSONL file, a directory of split parts, or a glob of parts
+
+    Multiple parts are read and parsed concurrently in worker processes and
+    concatenated in part order, so the result is identical to loading the
+    merged file. `max_docs` limits the number of raw lines read in total;
+    when the parts directory has a split manifest, each worker gets its own
+    line budget from the manifest so this stays parallel too.
 
     Returns the:
         texts: raw text per chunk
         meta: metadata dict per chunk (chunk_id, doc_id, title, url, metadata)
     """
+    paths = resolve_chunk_paths(path)
+
     texts: List[str] = []
     meta: List[Dict[str, Any]] = []
 
-    with open(path, "r", encoding="utf-8") as f:
-        for i, line in enumerate(f):
-            if max_docs is not None and i >= max_docs:
+    # Per-part line budgets from the manifest (start_line tells us how many
+    # lines come before each part without scanning the earlier parts)
+    budgets: List[Optional[int]] = [None] * len(paths)
+    if max_docs is not None and os.path.isdir(path):
+        manifest = load_split_manifest(path)
+        parts_by_file = {p["file"]: p for p in manifest["parts"]} if manifest else {}
+        if all(os.path.basename(p) in parts_by_file for p in paths):
+            budgets = [
+                max(0, max_docs - parts_by_file[os.path.basename(p)]["start_line"])
+                for p in paths
+            ]
+
+    # Without a manifest, a line budget only works sequentially
+    sequential = max_docs is not None and any(b is None for b in budgets)
+    if len(paths) == 1 or workers == 1 or sequential:
+        remaining = max_docs
+        for part in paths:
+            if remaining is not None and remaining <= 0:
                 break
+            part_texts, part_meta, n_lines = _load_chunk_part(part, max_lines=remaining)
+            texts.extend(part_texts)
+            meta.extend(part_meta)
+            if remaining is not None:
+                remaining -= n_lines
+        return texts, meta
 
-            line = line.strip()
-            if not line:
-                continue
+    # multiprocessing is only imported when parts are actually loaded in parallel
+    from concurrent.futures import ProcessPoolExecutor
 
-            obj = json.loads(line)
-            text = obj.get("text", "")
-            if not text:
-                continue
+    jobs = [(p, b) for p, b in zip(paths, budgets) if b is None or b > 0]
+    if not jobs:
+        return texts, meta
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields results in submission order, so chunk order is preserved
+        for part_texts, part_meta, _ in pool.map(_load_chunk_part, *zip(*jobs)):
+            texts.extend(part_texts)
+            meta.extend(part_meta)
 
-            texts.append(text)
-            meta.append(
-                {
-                    "chunk_id": obj.get("chunk_id"),
-                    "doc_id": obj.get("doc_id"),
-                    "title": obj.get("title"),
-                    "url": obj.get("url"),
-                    "metadata": obj.get("metadata", {}),
-                }
-            )
-
-    return texts, meta
\ No newline at end of file
+    return texts, meta
@@ -0,0 +1,370 @@
+import argparse
+import json
+import os
+import pickle
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+"""
+Dense (embedding) index over the same chunks as the BM25 index
+
+To build (after build_BM25_index.py, so doc ids line up with the BM25 store):
+python dense_index.py build \
+  --store data/index/bm25_store.pkl \
+  --out data/index/dense_index
+
+To test:
+python dense_index.py search \
+  --index data/index/dense_index \
+  --store data/index/bm25_store.pkl \
+  --query "What is machine learning?" \
+  --top-k 10
+
+Layout of the index directory (all numpy .npy files, opened memory-mapped):
+  vectors.npy    (n, dim) int8 or float16 embeddings, grouped by IVF list
+  scales.npy     (n,) float32 per-row dequantisation scales (int8 only)
+  ids.npy        (n,) int32 BM25 doc id of each row
+  offsets.npy    (n_lists + 1,) int64 start row of each IVF list
+  centroids.npy  (n_lists, dim) float32 k-means centroids
+  dense_meta.json  model name, dtype, sizes
+
+Search is IVF: the query is compared to the centroids, and only the rows of
+the `n_probe` closest lists are scanned. Rows of a list are contiguous on
+disk, so each probe is one sequential read. Embeddings are L2-normalised, so
+dot product = cosine similarity.
+
+Building keeps memory bounded whatever the corpus size: the number of lists
+defaults to 4 * sqrt(n) capped at MAX_LISTS, k-means trains on at most
+KMEANS_SAMPLE_SIZE rows (about 150 MB at dim 384), and rows are assigned to
+lists in blocks whose (rows x lists) float32 score matrix stays under
+ASSIGN_BLOCK_BYTES. Peak memory is roughly sample + one score block + one
+65536-row block of vectors, a few hundred MB.
+"""
+
+DEFAULT_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DENSE_META_FILE = "dense_meta.json"
+MAX_LISTS = 4096
+KMEANS_SAMPLE_SIZE = 100_000
+ASSIGN_BLOCK_BYTES = 128 * 1024 * 1024
+
+
+def _quantize_int8(block: Any) -> Tuple[Any, Any]:
+    """
+    Symmetric per-row int8 quantisation: row ~= q * scale
+    """
+    import numpy as np
+
+    max_abs = np.abs(block).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    q = np.clip(np.rint(block / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales
+
+
+def assign_to_centroids(vectors: Any, centroids: Any) -> Any:
+    """
+    Index of the closest centroid for each row of `vectors`
+
+    Scores are computed in row blocks so the (rows x lists) matrix stays
+    under ASSIGN_BLOCK_BYTES.
+    """
+    import numpy as np
+
+    block_rows = max(1, ASSIGN_BLOCK_BYTES // (4 * len(centroids)))
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start : start + block_rows], dtype=np.float32)
+        assign[start : start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return assign
+
+
+def train_kmeans(
+    vectors: Any,
+    n_lists: int,
+    n_iter: int = 20,
+    sample_size: int = KMEANS_SAMPLE_SIZE,
+    seed: int = 0,
+) -> Any:
+    """
+    Spherical k-means on a random sample of the (normalised) vectors
+
+    Returns (n_lists, dim) float32 unit-length centroids
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample_idx = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+    sample = np.asarray(vectors[sample_idx], dtype=np.float32)
+
+    n_lists = min(n_lists, len(sample))
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = assign_to_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=n_lists)
+
+        # Empty lists are re-seeded with random sample points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+
+    return centroids.astype(np.float32)
+
+
+def build_dense_index(
+    store_path: str,
+    out_dir: str,
+    model_name: str = DEFAULT_EMBED_MODEL,
+    batch_size: int = 256,
+    dtype: str = "int8",
+    n_lists: Optional[int] = None,
+    kmeans_iter: int = 20,
+    device: str = "cpu",
+) -> None:
+    """
+    Embeds every chunk of the BM25 store and writes an IVF index to `out_dir`
+
+    Row i of the store is BM25 doc id i, and the dense index reports the same
+    ids, so the two retrievers can be fused directly.
+    """
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    if dtype not in ("int8", "float16"):
+        raise ValueError(f"dtype must be int8 or float16, got {dtype!r}")
+
+    print(f"[INFO] Loading BM25 store from {store_path}")
+    with open(store_path, "rb") as f:
+        texts: List[str] = pickle.load(f)["texts"]
+    n = len(texts)
+    if not n:
+        print("[WARNING] Store is empty. Aborting process")
+        return
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    print(f"[INFO] Loading embedding model {model_name} on {device}")
+    model = SentenceTransformer(model_name, device=device)
+    dim = model.get_sentence_embedding_dimension()
+
+    # 1) Embeds in batches into a float16 scratch matrix on disk (store order)
+    raw_path = os.path.join(out_dir, "raw_vectors.f16.npy")
+    raw = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.float16, shape=(n, dim))
+    t0 = time.perf_counter()
+    for start in range(0, n, batch_size):
+        batch = texts[start : start + batch_size]
+        emb = model.encode(batch, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False)
+        raw[start : start + len(batch)] = emb.astype(np.float16)
+        done = start + len(batch)
+        if (done // batch_size) % 100 == 0 or done == n:
+            rate = done / max(time.perf_counter() - t0, 1e-9)
+            print(f"[INFO] Embedded {done} / {n} chunks ({rate:.0f} chunks/s)")
+    raw.flush()
+
+    # 2) Trains the coarse quantiser (IVF centroids)
+    n_lists = min(n_lists or max(1, int(4 * np.sqrt(n))), MAX_LISTS)
+    print(f"[INFO] Training k-means with {n_lists} lists")
+    centroids = train_kmeans(raw, n_lists, n_iter=kmeans_iter)
+    n_lists = len(centroids)
+
+    # 3) Assigns every row to its closest centroid
+    assign = assign_to_centroids(raw, centroids)
+
+    order = np.argsort(assign, kind="stable").astype(np.int32)
+    counts = np.bincount(assign, minlength=n_lists)
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # 4) Writes rows grouped by list (quantised)
+    vec_dtype = np.int8 if dtype == "int8" else np.float16
+    vectors = np.lib.format.open_memmap(
+        os.path.join(out_dir, "vectors.npy"), mode="w+", dtype=vec_dtype, shape=(n, dim)
+    )
+    scales = np.ones(n, dtype=np.float32)
+    for start in range(0, n, 65536):
+        rows = order[start : start + 65536]
+        block = np.asarray(raw[np.sort(rows)], dtype=np.float32)
+        # Restores the grouped order after the sorted (sequential) read
+        block = block[np.argsort(np.argsort(rows))]
+        if dtype == "int8":
+            q, s = _quantize_int8(block)
+            vectors[start : start + len(rows)] = q
+            scales[start : start + len(rows)] = s
+        else:
+            vectors[start : start + len(rows)] = block.astype(np.float16)
+    vectors.flush()
+    del vectors, raw
+    os.remove(raw_path)
+
+    np.save(os.path.join(out_dir, "scales.npy"), scales)
+    np.save(os.path.join(out_dir, "ids.npy"), order)
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "centroids.npy"), centroids)
+
+    with open(os.path.join(out_dir, DENSE_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"model": model_name, "dtype": dtype, "n": n, "dim": dim, "n_lists": n_lists},
+            f,
+            indent=2,
+        )
+
+    print(f"[DONE] Dense index ({n} x {dim} {dtype}, {n_lists} lists) saved to {out_dir}")
+
+
+class DenseIndex:
+    """
+    Memory-mapped IVF index written by build_dense_index()
+    """
+
+    def __init__(self, index_dir: str, n_probe: int = 16):
+        import numpy as np
+
+        self._np = np
+        with open(os.path.join(index_dir, DENSE_META_FILE), "r", encoding="utf-8") as f:
+            self.info: Dict[str, Any] = json.load(f)
+
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(index_dir, "scales.npy"))
+        self.ids = np.load(os.path.join(index_dir, "ids.npy"))
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.n_probe = n_probe
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def search(self, query_vec: Any, top_k: int = 10, n_probe: Optional[int] = None) -> Tuple[List[int], List[float]]:
+        """
+        Approximate top-k by cosine similarity for one normalised query vector
+
+        Returns (doc_ids, scores), best first
+        """
+        np = self._np
+        q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+
+        centroid_scores = self.centroids @ q
+        lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        rows_parts = []
+        score_parts = []
+        for lst in lists:
+            start, end = int(self.offsets[lst]), int(self.offsets[lst + 1])
+            if start == end:
+                continue
+            block = self.vectors[start:end]
+            scores = block.astype(np.float32) @ q
+            if block.dtype == np.int8:
+                scores *= self.scales[start:end]
+            rows_parts.append(np.arange(start, end))
+            score_parts.append(scores)
+
+        if not score_parts:
+            return [], []
+
+        rows = np.concatenate(rows_parts)
+        scores = np.concatenate(score_parts)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [int(i) for i in self.ids[rows[top]]], [float(s) for s in scores[top]]
+
+
+class DenseRetriever:
+    """
+    Same retrieve() interface and result format as BM25Retriever
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        store_path: Optional[str] = None,
+        store: Optional[Dict[str, Any]] = None,
+        n_probe: int = 16,
+        device: str = "cpu",
+    ):
+        from sentence_transformers import SentenceTransformer
+
+        print(f"[INFO] Loading dense index from {index_path}...")
+        self.index = DenseIndex(index_path, n_probe=n_probe)
+
+        # The BM25 retriever's store can be shared instead of loading it twice
+        if store is None:
+            print(f"[INFO] Loading store from {store_path}...")
+            with open(store_path, "rb") as f:
+                store = pickle.load(f)
+        self.texts: List[str] = store["texts"]
+        self.meta: List[Dict[str, Any]] = store["meta"]
+
+        model_name = self.index.info["model"]
+        print(f"[INFO] Loading embedding model {model_name}...")
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def encode(self, query: str) -> Any:
+        return self.model.encode([query], normalize_embeddings=True, show_progress_bar=False)[0]
+
+    def retrieve(self, query: str, top_k: int = 5) -> Tuple[List[Dict[str, Any]], List[float]]:
+        doc_ids, scores = self.index.search(self.encode(query), top_k=top_k)
+
+        results: List[Dict[str, Any]] = [
+            {"doc_id": i, "score": s, "text": self.texts[i], "meta": self.meta[i]}
+            for i, s in zip(doc_ids, scores)
+        ]
+        return results, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds or searches the dense chunk index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Embeds the BM25 store's chunks and writes the IVF index")
+    p_build.add_argument("--store", type=str, default="data/index/bm25_store.pkl")
+    p_build.add_argument("--out", type=str, default="data/index/dense_index")
+    p_build.add_argument("--model", type=str, default=DEFAULT_EMBED_MODEL)
+    p_build.add_argument("--batch-size", type=int, default=256)
+    p_build.add_argument("--dtype", type=str, default="int8", choices=["int8", "float16"])
+    p_build.add_argument("--n-lists", type=int, default=None, help=f"IVF lists (default 4 * sqrt(n), at most {MAX_LISTS})")
+    p_build.add_argument("--kmeans-iter", type=int, default=20)
+    p_build.add_argument("--device", type=str, default="cpu")
+
+    p_search = sub.add_parser("search", help="Searches the dense index")
+    p_search.add_argument("--index", type=str, default="data/index/dense_index")
+    p_search.add_argument("--store", type=str, default="data/index/bm25_store.pkl")
+    p_search.add_argument("--query", type=str, required=True)
+    p_search.add_argument("--top-k", type=int, default=5)
+    p_search.add_argument("--n-probe", type=int, default=16)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_dense_index(
+            store_path=args.store,
+            out_dir=args.out,
+            model_name=args.model,
+            batch_size=args.batch_size,
+            dtype=args.dtype,
+            n_lists=args.n_lists,
+            kmeans_iter=args.kmeans_iter,
+            device=args.device,
+        )
+        return
+
+    retriever = DenseRetriever(args.index, args.store, n_probe=args.n_probe)
+    t0 = time.perf_counter()
+    results, _ = retriever.retrieve(args.query, top_k=args.top_k)
+    print(f"[INFO] Search took {(time.perf_counter() - t0) * 1000:.1f} ms (including query encoding)")
+
+    for r in results:
+        print("=" * 80)
+        print(f"Score: {r['score']:.4f}")
+        print("Title:", r["meta"].get("title"))
+        print("Text :", r["text"][:300])
+
+
+if __name__ == "__main__":
+    main()
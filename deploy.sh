@@ -13,84 +13,182 @@ DATA_REPO_TMP_DIR=".tmp_data_repo"
 # Python executable (change to python if needed)
 PYTHON=${PYTHON:-python3}
 
+# BM25 build parameters (part of the build cache key)
+BM25_METHOD=${BM25_METHOD:-lucene}
+BM25_K1=${BM25_K1:-1.5}
+BM25_B=${BM25_B:-0.75}
+BM25_STOPWORDS=${BM25_STOPWORDS:-en}
+
+# Content-addressed cache of built indexes (see build_cache.py)
+BUILD_CACHE_DIR=${BUILD_CACHE_DIR:-.build_cache}
+
+# Set FORCE_REBUILD=1 to ignore all caches below
+FORCE_REBUILD=${FORCE_REBUILD:-0}
+
 ########################################
 # 1. Install Python dependencies
 ########################################
 
-echo "[1/7] Installing Python dependencies from requirements.txt..."
-pip install --upgrade pip
-pip install -r requirements.txt
+# Skipped when requirements.txt and the Python version match the last
+# successful install (the marker is written only after the spaCy model too)
+DEPS_MARKER=".deps.sha256"
+DEPS_KEY=$($PYTHON -c "import hashlib, sys; print(hashlib.sha256(open('requirements.txt', 'rb').read() + sys.version.encode()).hexdigest())")
+
+echo "[1/6] Installing Python dependencies from requirements.txt..."
+if [ "$FORCE_REBUILD" != "1" ] && [ "$(cat "$DEPS_MARKER" 2>/dev/null || true)" = "$DEPS_KEY" ]; then
+  echo "Dependencies already installed for this requirements.txt, skipping."
+  DEPS_UP_TO_DATE=1
+else
+  rm -f "$DEPS_MARKER"
+  pip install --upgrade pip
+  pip install -r requirements.txt
+  DEPS_UP_TO_DATE=0
+fi
 
 ########################################
 # 2. Download data/processed/splits from GitHub
 ########################################
 
-echo "[2/7] Downloading data/processed/splits from GitHub..."
+echo "[2/6] Downloading data/processed/splits from GitHub..."
 
-rm -rf "$DATA_REPO_TMP_DIR"
-git clone --depth 1 --branch "$DATA_REPO_BRANCH" "$DATA_REPO_URL" "$DATA_REPO_TMP_DIR"
+SPLITS_COMMIT_FILE="data/processed/splits.commit"
+REMOTE_COMMIT=$(git ls-remote "$DATA_REPO_URL" "refs/heads/$DATA_REPO_BRANCH" | cut -f1 || true)
+LOCAL_COMMIT=$(cat "$SPLITS_COMMIT_FILE" 2>/dev/null || true)
 
-mkdir -p data/processed
-rm -rf data/processed/splits
-cp -r "$DATA_REPO_TMP_DIR/data/processed/splits" data/processed/
+if [ "$FORCE_REBUILD" != "1" ] && [ -n "$REMOTE_COMMIT" ] && [ "$REMOTE_COMMIT" = "$LOCAL_COMMIT" ] \
+  && [ -d data/processed/splits ]; then
+  echo "Splits are already at $REMOTE_COMMIT, skipping clone."
+else
+  rm -rf "$DATA_REPO_TMP_DIR"
+  git clone --depth 1 --branch "$DATA_REPO_BRANCH" "$DATA_REPO_URL" "$DATA_REPO_TMP_DIR"
 
-rm -rf "$DATA_REPO_TMP_DIR"
+  mkdir -p data/processed
+  rm -rf data/processed/splits
+  cp -r "$DATA_REPO_TMP_DIR/data/processed/splits" data/processed/
+  git -C "$DATA_REPO_TMP_DIR" rev-parse HEAD > "$SPLITS_COMMIT_FILE"
+
+  rm -rf "$DATA_REPO_TMP_DIR"
+
+  if [ -f data/processed/splits/chunks_part_manifest.json ]; then
+    echo "Verifying chunk parts against their manifest..."
+    $PYTHON split_JSONL.py --verify data/processed/splits --prefix chunks_part
+  fi
+fi
 
 ########################################
 # 3. Download Hotpot dev-distractor + GloVe + SpaCy model
 ########################################
 
-echo "[3/7] Downloading Hotpot dev-distractor dataset into project root..."
-# This will end up in the same directory as deploy.sh
-wget http://curtis.ml.cmu.edu/datasets/hotpot/hotpot_dev_distractor_v1.json \
-  -O hotpot_dev_distractor_v1.json
+echo "[3/6] Downloading Hotpot dev-distractor dataset into project root..."
+# This will end up in the same directory as deploy.sh. The download goes to a
+# .part file and is moved into place only once it parses, so an interrupted
+# download is never mistaken for the dataset.
+hotpot_json_ok() {
+  $PYTHON -c "import json, sys; json.load(open(sys.argv[1], encoding='utf-8'))" "$1" 2>/dev/null
+}
+
+if [ "$FORCE_REBUILD" != "1" ] && [ -s hotpot_dev_distractor_v1.json ] && hotpot_json_ok hotpot_dev_distractor_v1.json; then
+  echo "hotpot_dev_distractor_v1.json already present, skipping download."
+else
+  wget http://curtis.ml.cmu.edu/datasets/hotpot/hotpot_dev_distractor_v1.json \
+    -O hotpot_dev_distractor_v1.json.part
+  if ! hotpot_json_ok hotpot_dev_distractor_v1.json.part; then
+    echo "Downloaded hotpot_dev_distractor_v1.json is not valid JSON (truncated?)" >&2
+    rm -f hotpot_dev_distractor_v1.json.part
+    exit 1
+  fi
+  mv hotpot_dev_distractor_v1.json.part hotpot_dev_distractor_v1.json
+fi
 
 echo "Downloading GloVe embeddings into project root..."
 GLOVE_DIR=./
 mkdir -p "$GLOVE_DIR"
-wget http://nlp.stanford.edu/data/glove.840B.300d.zip -O "$GLOVE_DIR/glove.840B.300d.zip"
-unzip -o "$GLOVE_DIR/glove.840B.300d.zip" -d "$GLOVE_DIR"
+# The .ok marker is written only after the archive passed its CRC check and
+# was extracted, so a truncated download or extraction is redone
+GLOVE_TXT="$GLOVE_DIR/glove.840B.300d.txt"
+if [ "$FORCE_REBUILD" != "1" ] && [ -s "$GLOVE_TXT" ] && [ -f "$GLOVE_TXT.ok" ]; then
+  echo "GloVe embeddings already present, skipping download."
+else
+  rm -f "$GLOVE_TXT.ok"
+  # -c resumes a partial zip instead of starting the 2GB download over
+  wget -c http://nlp.stanford.edu/data/glove.840B.300d.zip -O "$GLOVE_DIR/glove.840B.300d.zip"
+  if ! unzip -tq "$GLOVE_DIR/glove.840B.300d.zip"; then
+    echo "glove.840B.300d.zip is corrupt or incomplete; removing it, rerun to download again" >&2
+    rm -f "$GLOVE_DIR/glove.840B.300d.zip"
+    exit 1
+  fi
+  GLOVE_TMP=$(mktemp -d "$GLOVE_DIR/.glove.XXXXXX")
+  unzip -o "$GLOVE_DIR/glove.840B.300d.zip" -d "$GLOVE_TMP"
+  mv "$GLOVE_TMP/glove.840B.300d.txt" "$GLOVE_TXT"
+  rm -rf "$GLOVE_TMP"
+  touch "$GLOVE_TXT.ok"
+fi
 
 echo "Downloading SpaCy English model..."
-$PYTHON -m spacy download en
-
-########################################
-# 4. Merge JSONL chunks
-########################################
-
-echo "[4/7] Running merge_jsonl.py..."
-$PYTHON merge_jsonl.py \
-  --in-dir data/processed/splits \
-  --out data/processed/chunks.jsonl \
-  --prefix chunks_part
+if [ "$DEPS_UP_TO_DATE" = "1" ]; then
+  echo "SpaCy model already installed with these dependencies, skipping."
+else
+  $PYTHON -m spacy download en
+  echo "$DEPS_KEY" > "$DEPS_MARKER"
+fi
 
 ########################################
-# 5. Build BM25 index
+# 4. Build BM25 index
 ########################################
 
-echo "[5/7] Building BM25 index..."
+# The index builder reads data/processed/splits/chunks_part_*.jsonl directly
+# (in parallel), so there is no merge step. Use merge_JSONL.py if a single
+# chunks.jsonl file is needed for something else.
+#
+# The build is cached by a hash of the chunk parts, the build scripts and the
+# BM25 parameters, so an unchanged corpus reuses the previous index.
+echo "[4/6] Building BM25 index..."
 mkdir -p data/index
-$PYTHON build_BM25_index.py \
-  --chunks data/processed/chunks.jsonl \
-  --out-index data/index/bm25s_index \
-  --out-store data/index/bm25_store.pkl
-
-########################################
-# 6. Run predict_sample.py
-########################################
-
-echo "[6/7] Running predict_sample.py..."
+BUILD_KEY=$($PYTHON build_cache.py key \
+  --chunks data/processed/splits \
+  --param "method=$BM25_METHOD" \
+  --param "k1=$BM25_K1" \
+  --param "b=$BM25_B" \
+  --param "stopwords=$BM25_STOPWORDS")
+INDEX_ARTIFACTS=(--artifact data/index/bm25s_index --artifact data/index/bm25_store.pkl)
+
+# The key file alone is not enough: the artifacts it describes must still exist
+if [ "$FORCE_REBUILD" != "1" ] && [ "$(cat data/index/build.key 2>/dev/null || true)" = "$BUILD_KEY" ] \
+  && [ -d data/index/bm25s_index ] && [ -f data/index/bm25_store.pkl ]; then
+  echo "BM25 index is up to date (key $BUILD_KEY)."
+elif [ "$FORCE_REBUILD" != "1" ] && $PYTHON build_cache.py restore --key "$BUILD_KEY" \
+  --cache-dir "$BUILD_CACHE_DIR" "${INDEX_ARTIFACTS[@]}"; then
+  echo "$BUILD_KEY" > data/index/build.key
+else
+  rm -rf data/index/bm25s_index data/index/bm25_store.pkl data/index/build.key
+  $PYTHON build_BM25_index.py \
+    --chunks data/processed/splits \
+    --out-index data/index/bm25s_index \
+    --out-store data/index/bm25_store.pkl \
+    --method "$BM25_METHOD" \
+    --k1 "$BM25_K1" \
+    --b "$BM25_B" \
+    --stopwords "$BM25_STOPWORDS"
+  $PYTHON build_cache.py save --key "$BUILD_KEY" --cache-dir "$BUILD_CACHE_DIR" "${INDEX_ARTIFACTS[@]}"
+  echo "$BUILD_KEY" > data/index/build.key
+fi
+
+########################################
+# 5. Run predict_sample.py
+########################################
+
+echo "[5/6] Running predict_sample.py..."
 $PYTHON predict_sample.py
 
 echo "deploy.sh appears to have succeeded. Running predict_full.py in 5 seconds..."
 
 ########################################
-# 7. Wait a bit, then run predict_full.py
+# 6. Wait a bit, then run predict_full.py
 ########################################
 
 sleep 5
 
-echo "[7/7] Running predict_full.py..."
+echo "[6/6] Running predict_full.py..."
 $PYTHON predict_full.py
 
 echo "deploy.sh finished successfully."
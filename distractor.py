@@ -0,0 +1,175 @@
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+from compression import IDFTable, SentenceCompressor, tokenize
+from data_utils import extract_context_paragraphs
+from llm_pipeline import AnswerGenerator
+from rag_pipeline import RAGPipeline, QuestionResult
+from reranking import UnionReranker, make_reranker
+from supporting_facts import predict_supporting_facts
+
+"""
+Fast path for the dev-distractor split: every question ships with its own 10
+candidate paragraphs, so there is no need to search Wikipedia or rewrite the
+question
+
+    pipeline = DistractorPipeline.from_config(reranker_backend="llm")
+    for result in pipeline.run_batch(samples, concurrency=16):
+        print(result.id, result.answer, result.sp)
+
+Per question:
+  retrieve  in-memory BM25 over the sample's paragraphs (ParagraphBM25)
+  rerank    the same reranker as the full pipeline (one call for 10 paragraphs)
+  select    top-k paragraphs (optionally sentence-compressed)
+  generate  one answer from the original question
+  support   sentence-level supporting facts from the top paragraphs (local)
+
+No index is loaded and there are no rewrite, vote or scoring calls, so a
+question costs two LLM calls (one with --reranker none or cross-encoder).
+
+To run:
+python predict_full.py --distractor --dev hotpot_dev_distractor_v1.json --out predictions_dev.json
+"""
+
+
+class ParagraphBM25:
+    """
+    Okapi BM25 over one sample's context paragraphs
+
+    Documents have the same shape as BM25Retriever results; meta also
+    carries the paragraph's title and sentences so supporting facts can be
+    given as (title, sentence index).
+    """
+
+    def __init__(self, docs: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self._tokens = [tokenize(d["text"]) for d in docs]
+        self._avg_len = sum(len(t) for t in self._tokens) / max(1, len(docs))
+        self.idf = IDFTable.from_texts(d["text"] for d in docs)
+
+    @classmethod
+    def from_sample(cls, sample: Dict[str, Any]) -> "ParagraphBM25":
+        example_id = sample.get("_id") or sample.get("id")
+        texts = extract_context_paragraphs(sample, include_titles=True)
+        docs = [
+            {
+                "doc_id": i,
+                "score": 0.0,
+                "text": text,
+                "meta": {"chunk_id": f"{example_id}:{title}", "title": title, "sentences": sentences},
+            }
+            for i, (text, (title, sentences)) in enumerate(zip(texts, sample["context"]))
+        ]
+        return cls(docs)
+
+    def _score(self, query_terms: List[str], tokens: List[str]) -> float:
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / max(1e-9, self._avg_len))
+        score = 0.0
+        for term in query_terms:
+            tf = counts.get(term, 0)
+            if tf:
+                score += self.idf.idf(term) * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    def retrieve(self, query: str, top_k: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """
+        Paragraphs sorted by BM25 score (all of them unless top_k is given)
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        scores = [self._score(query_terms, tokens) for tokens in self._tokens]
+        order = sorted(range(len(self.docs)), key=lambda i: scores[i], reverse=True)[:top_k]
+        results = [dict(self.docs[i], score=scores[i]) for i in order]
+        return results, [scores[i] for i in order]
+
+
+class DistractorPipeline(RAGPipeline):
+    """
+    RAGPipeline over each sample's own paragraphs instead of the global index
+    """
+
+    def __init__(
+        self,
+        generator: AnswerGenerator,
+        reranker: Optional[UnionReranker] = None,
+        compressor: Optional[SentenceCompressor] = None,
+        top_k_for_answer: int = 4,
+        sp_paragraphs: int = 2,
+    ):
+        super().__init__(
+            retriever=None,
+            rewriter=None,
+            generator=generator,
+            reranker=reranker,
+            compressor=compressor,
+            top_k_for_answer=top_k_for_answer,
+        )
+        self.sp_paragraphs = sp_paragraphs
+
+    @classmethod
+    def from_config(
+        cls,
+        top_k_for_answer: int = 4,
+        rerank_batch: int = 48,
+        reranker_backend: str = "llm",
+        compress_contexts: bool = False,
+    ) -> "DistractorPipeline":
+        """
+        Builds the default components (what predict_full.py --distractor selects)
+        """
+        backend = make_reranker(reranker_backend)
+        return cls(
+            generator=AnswerGenerator(),
+            reranker=UnionReranker(backend, max_batch=rerank_batch) if backend is not None else None,
+            # IDF from the selected paragraphs themselves
+            compressor=SentenceCompressor() if compress_contexts else None,
+            top_k_for_answer=top_k_for_answer,
+        )
+
+    def _answer(self, sample: Dict[str, Any], result: QuestionResult) -> None:
+        question = result.question
+        if not sample.get("context"):
+            return
+
+        t0 = time.perf_counter()
+        docs, _ = ParagraphBM25.from_sample(sample).retrieve(question)
+        t1 = time.perf_counter()
+        result.add_time("retrieve", t1 - t0)
+
+        # Ties in the reranker keep the BM25 order
+        if self.reranker is not None:
+            docs = self.reranker.rank(question, docs)
+        t2 = time.perf_counter()
+        result.add_time("rerank", t2 - t1)
+
+        selected = docs[: self.top_k_for_answer]
+        contexts = [d["text"] for d in selected]
+        if self.compressor is not None:
+            # The compressor adds the titles back itself
+            contexts = self.compressor.compress(
+                question,
+                [" ".join(d["meta"]["sentences"]) for d in selected],
+                titles=[d["meta"]["title"] for d in selected],
+            )
+        t3 = time.perf_counter()
+        result.add_time("select", t3 - t2)
+
+        ans = self.generator.generate_answer(question, contexts)
+        t4 = time.perf_counter()
+        result.add_time("generate", t4 - t3)
+
+        result.trajectories["distractor"] = {"queries": [question], "contexts": contexts, "answer": ans}
+        result.candidates = [("distractor", ans)]
+        result.answer, result.chosen = ans, "distractor"
+
+        result.sp = predict_supporting_facts(
+            question,
+            ans,
+            [(d["meta"]["title"], d["meta"]["sentences"]) for d in docs],
+            max_paragraphs=self.sp_paragraphs,
+        )
+        result.add_time("support", time.perf_counter() - t4)
@@ -5,6 +5,8 @@ import string
 from collections import Counter
 import pickle
 
+from data_utils import load_hotpot_examples
+
 def normalize_answer(s):
 
     def remove_articles(text):
@@ -83,8 +85,8 @@ def update_sp(metrics, prediction, gold):
 def eval(prediction_file, gold_file):
     with open(prediction_file) as f:
         prediction = json.load(f)
-    with open(gold_file) as f:
-        gold = json.load(f)
+    # Gold examples come from the binary cache instead of one big json.load
+    gold = load_hotpot_examples(gold_file)
 
     metrics = {'em': 0, 'f1': 0, 'prec': 0, 'recall': 0,
         'sp_em': 0, 'sp_f1': 0, 'sp_prec': 0, 'sp_recall': 0,
@@ -0,0 +1,394 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple
+
+from compression import tokenize
+
+"""
+Local stand-in for the Mistral chat-completions API, for load tests and
+offline benchmarks without spending API quota
+
+python fake_llm_server.py --port 8765 --latency lognormal:0.4,0.5 --rate-limit-rate 0.02
+
+then point the pipeline at it (any API key works):
+
+MISTRAL_SERVER_URL=http://127.0.0.1:8765 MISTRAL_API_KEY=fake \
+  python predict_full.py --dev hotpot_dev_distractor_v1.json --limit 200 --concurrency 16
+
+It serves POST /v1/chat/completions with the same request and response
+bodies as the API (so the Mistral SDK and LLMClient's retries work
+unchanged), plus GET /stats (token and request accounting) and
+POST /reset.
+
+Responses are derived from the prompt only, so a run is reproducible:
+  rerank    JSON confidences from question-term overlap with each context
+  score     JSON confidences: 1.0 if the answer appears in the contexts
+  answer    yes/no for yes/no questions, else the title of the best-matching passage
+  rewrites  the question itself (lines, entity lines or the combined JSON)
+
+Latency is drawn from --latency ("const:S", "uniform:A,B", "lognormal:MEDIAN,SIGMA",
+seconds) plus --latency-per-1k-tokens per thousand prompt tokens. --error-rate
+answers 500 and --rate-limit-rate 429 (with Retry-After); --rpm turns away
+requests beyond that many per minute with 429. Random draws are seeded by
+(--seed, prompt, attempt), so they do not depend on request interleaving.
+"""
+
+_YES_NO_RE = re.compile(r"^(is|are|was|were|do|does|did|can|could|has|have|had|will|would|should)\b", re.I)
+_ENTITY_RE = re.compile(r"\b[A-Z][\w'.-]*(?:\s+[A-Z][\w'.-]*)*")
+_QUESTION_WORDS = frozenset("what which who whom whose when where why how is are was were do does did in the".split())
+
+
+def count_tokens(text: str) -> int:
+    """
+    Rough token count (about 4 characters per token), as llm_client.estimate_tokens
+    """
+    return max(1, len(text) // 4)
+
+
+def parse_latency(spec: str) -> Tuple[str, List[float]]:
+    """
+    "lognormal:0.4,0.5" -> ("lognormal", [0.4, 0.5])
+    """
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x.strip()]
+    expected = {"const": 1, "uniform": 2, "lognormal": 2}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"Latency must be const:S, uniform:A,B or lognormal:MEDIAN,SIGMA, got {spec!r}")
+    return kind, params
+
+
+def _overlap(query_terms: set, text: str) -> float:
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+
+def _section(text: str, start: str, end: Optional[str] = None) -> str:
+    i = text.find(start)
+    if i == -1:
+        return ""
+    i += len(start)
+    j = text.find(end, i) if end else -1
+    return text[i:j] if j != -1 else text[i:]
+
+
+def _entities(question: str, limit: int = 3) -> List[str]:
+    found = []
+    for m in _ENTITY_RE.finditer(question):
+        words = m.group(0).split()
+        # The first word of the question is capitalised anyway
+        while words and words[0].lower() in _QUESTION_WORDS:
+            words.pop(0)
+        if words:
+            found.append(" ".join(words))
+    return list(dict.fromkeys(found))[:limit] or [question]
+
+
+def respond(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """
+    (kind, content) of the deterministic reply to a chat request
+    """
+    system = str(messages[0].get("content", "")) if messages else ""
+    user = str(messages[-1].get("content", "")) if messages else ""
+
+    if system == "Select contexts for QA":
+        question = _section(user, "Question:\n", "\n\nContexts:").strip()
+        terms = set(tokenize(question))
+        scores = []
+        for line in _section(user, "Contexts:\n", "\n\nJSON:").splitlines():
+            idx, sep, ctx = line.partition(": ")
+            if sep and idx.isdigit():
+                scores.append({"index": int(idx), "confidence": round(_overlap(terms, ctx), 3)})
+        return "rerank", json.dumps(scores)
+
+    if "Candidate answers:" in user:
+        contexts = _section(user, "Context passages:\n", "\n\nCandidate answers:").lower()
+        scores = []
+        for line in _section(user, "Candidate answers:\n", "\n\nJSON:").splitlines():
+            m = re.match(r"\[(\d+)\] (.*)", line)
+            if m:
+                answer = m.group(2).strip().lower()
+                conf = 1.0 if answer in ("yes", "no") or (answer and answer in contexts) else 0.3
+                scores.append({"index": int(m.group(1)), "confidence": conf})
+        return "score", json.dumps(scores)
+
+    if user.rstrip().endswith("Answer:"):
+        question = _section(user, "Question:\n", "\n\nContext passages:").strip()
+        if _YES_NO_RE.match(question):
+            return "answer", "yes"
+        terms = set(tokenize(question))
+        passages = _section(user, "Context passages:\n", "\n\nAnswer:").split("\n\n---\n\n")
+        passages = [p for p in passages if p.strip()]
+        if not passages:
+            return "answer", "I cannot answer from the given context."
+        best = max(passages, key=lambda p: _overlap(terms, p))
+        # Passages look like "Title: text"; answer with the title
+        title = best.split(":", 1)[0] if ":" in best[:120] else " ".join(best.split()[:3])
+        return "answer", title.strip()
+
+    question_match = re.search(r'"([^"]+)"\s*$', user.strip())
+    question = question_match.group(1) if question_match else user.strip().splitlines()[-1].strip()
+    entities = _entities(question)
+
+    if '"rewrite"' in user and '"entity"' in user:
+        return "rewrite", json.dumps({
+            "rewrite": [question],
+            "decomp": [f"What is known about {e}?" for e in entities],
+            "entity": entities,
+        })
+    if "<entity>: <entity-focused query>" in user:
+        return "rewrite", "\n".join(f"{e}: {e}" for e in entities)
+    return "rewrite", question
+
+
+class FakeLLMState:
+    """
+    Response settings and thread-safe accounting shared by all request handlers
+    """
+
+    def __init__(
+        self,
+        latency: str = "const:0",
+        latency_per_1k_tokens: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        rpm: Optional[float] = None,
+        retry_after_s: float = 1.0,
+        seed: int = 0,
+    ):
+        self.latency = parse_latency(latency)
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.retry_after_s = retry_after_s
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._attempts: Dict[str, int] = {}
+            self._window: List[float] = []
+            self._stats: Dict[str, Any] = {
+                "requests": 0,
+                "completions": 0,
+                "errors_injected": 0,
+                "rate_limited": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "in_flight": 0,
+                "max_in_flight": 0,
+                "by_kind": {},
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["by_kind"] = {k: dict(v) for k, v in self._stats["by_kind"].items()}
+            return stats
+
+    def _rng(self, body: bytes) -> random.Random:
+        key = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def _over_rpm(self) -> bool:
+        if not self.rpm:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 60.0]
+            if len(self._window) >= self.rpm:
+                return True
+            self._window.append(now)
+            return False
+
+    def _sample_latency(self, rng: random.Random, prompt_tokens: int) -> float:
+        kind, params = self.latency
+        if kind == "const":
+            base = params[0]
+        elif kind == "uniform":
+            base = rng.uniform(params[0], params[1])
+        else:
+            base = params[0] * math.exp(rng.gauss(0.0, params[1]))
+        return max(0.0, base + self.latency_per_1k_tokens * prompt_tokens / 1000.0)
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def handle(self, body: bytes) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        """
+        (status, extra headers, JSON body) for one chat completion request
+        """
+        self._count("requests")
+        try:
+            request = json.loads(body)
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError):
+            return 422, {}, {"object": "error", "message": "Invalid request body", "type": "invalid_request_error"}
+
+        rng = self._rng(body)
+        if self._over_rpm() or rng.random() < self.rate_limit_rate:
+            self._count("rate_limited")
+            return (
+                429,
+                {"Retry-After": f"{self.retry_after_s:g}"},
+                {"object": "error", "message": "Requests rate limit exceeded", "type": "rate_limited"},
+            )
+        if rng.random() < self.error_rate:
+            self._count("errors_injected")
+            return 500, {}, {"object": "error", "message": "Injected server error", "type": "internal_error"}
+
+        prompt_tokens = sum(count_tokens(str(m.get("content", ""))) for m in messages)
+        kind, content = respond(messages)
+        completion_tokens = count_tokens(content)
+
+        with self._lock:
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+        try:
+            time.sleep(self._sample_latency(rng, prompt_tokens))
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+                self._stats["completions"] += 1
+                self._stats["prompt_tokens"] += prompt_tokens
+                self._stats["completion_tokens"] += completion_tokens
+                per_kind = self._stats["by_kind"].setdefault(
+                    kind, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+                )
+                per_kind["calls"] += 1
+                per_kind["prompt_tokens"] += prompt_tokens
+                per_kind["completion_tokens"] += completion_tokens
+
+        return 200, {}, {
+            "id": "fake-" + hashlib.sha1(body).hexdigest()[:24],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, "tool_calls": None},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: FakeLLMState = None  # set per server by make_server
+
+    def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            status, headers, payload = self.state.handle(body)
+            self._send(status, payload, headers)
+        elif path == "/reset":
+            self.state.reset()
+            self._send(200, {"ok": True})
+        else:
+            self._send(404, {"object": "error", "message": f"No route {self.path}"})
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0].rstrip("/") == "/stats":
+            self._send(200, self.state.stats())
+        else:
+            self._send(404, {"object": "error", "message": f"No route {self.path}"})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # One line per request would swamp a load test
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, **options: Any) -> ThreadingHTTPServer:
+    """
+    A server with its own FakeLLMState (options as FakeLLMState); port 0 picks a free port
+    """
+    handler = type("FakeLLMHandler", (_Handler,), {"state": FakeLLMState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(host: str = "127.0.0.1", port: int = 0, **options: Any) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Starts a server on a daemon thread; returns (server, base URL for MISTRAL_SERVER_URL)
+
+    Stop it with server.shutdown().
+    """
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic local stand-in for the Mistral chat API")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=str, default="const:0", help="const:S, uniform:A,B or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--latency-per-1k-tokens", type=float, default=0.0, help="Extra seconds per 1000 prompt tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rpm", type=float, default=None, help="Answer 429 beyond this many requests per minute")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    try:
+        server = make_server(
+            args.host,
+            args.port,
+            latency=args.latency,
+            latency_per_1k_tokens=args.latency_per_1k_tokens,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            rpm=args.rpm,
+            retry_after_s=args.retry_after,
+            seed=args.seed,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    print(f"[INFO] Fake LLM server on http://{args.host}:{server.server_address[1]} (stats at /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[INFO] Final stats: {json.dumps(server.RequestHandlerClass.state.stats())}")
+
+
+if __name__ == "__main__":
+    main()
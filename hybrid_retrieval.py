@@ -0,0 +1,154 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+
+from BM25S_retrieval import BM25Retriever
+from dense_index import DenseRetriever
+
+"""
+Hybrid retrieval: fuses BM25 (lexical) and dense (embedding) results
+
+To test:
+python hybrid_retrieval.py \
+  --index data/index/bm25s_index \
+  --store data/index/bm25_store.pkl \
+  --dense-index data/index/dense_index \
+  --query "What is machine learning?" \
+  --top-k 10
+
+Both retrievers return the same doc ids (rows of the BM25 store). Each one
+fetches `candidate_k` results, and the two lists are fused:
+  - "rrf":    reciprocal rank fusion, sum of 1 / (rrf_k + rank)
+  - "linear": alpha * dense + (1 - alpha) * bm25, each min-max normalised
+              over its own candidates
+"""
+
+FUSION_METHODS = ("rrf", "linear")
+
+
+def fuse_scores(
+    bm25_results: List[Dict[str, Any]],
+    dense_results: List[Dict[str, Any]],
+    method: str = "rrf",
+    alpha: float = 0.5,
+    rrf_k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Merges two ranked result lists into one, best first
+
+    The fused score replaces "score"; the raw BM25 score is kept as
+    "bm25_score" (None for dense-only hits), e.g. for CascadePolicy's margin.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}, expected one of {FUSION_METHODS}")
+
+    def normalised(results: List[Dict[str, Any]]) -> Dict[int, float]:
+        if method == "rrf":
+            return {r["doc_id"]: 1.0 / (rrf_k + rank + 1) for rank, r in enumerate(results)}
+        if not results:
+            return {}
+        scores = [r["score"] for r in results]
+        lo, hi = min(scores), max(scores)
+        span = hi - lo
+        return {r["doc_id"]: (r["score"] - lo) / span if span > 0 else 1.0 for r in results}
+
+    bm25_norm = normalised(bm25_results)
+    dense_norm = normalised(dense_results)
+    weight_dense, weight_bm25 = (1.0, 1.0) if method == "rrf" else (alpha, 1.0 - alpha)
+
+    docs: Dict[int, Dict[str, Any]] = {}
+    for r in bm25_results + dense_results:
+        docs.setdefault(r["doc_id"], r)
+
+    bm25_raw = {r["doc_id"]: r["score"] for r in bm25_results}
+    fused = []
+    for doc_id, r in docs.items():
+        score = weight_bm25 * bm25_norm.get(doc_id, 0.0) + weight_dense * dense_norm.get(doc_id, 0.0)
+        fused.append({**r, "score": score, "bm25_score": bm25_raw.get(doc_id)})
+
+    fused.sort(key=lambda r: r["score"], reverse=True)
+    return fused
+
+
+class HybridRetriever:
+    """
+    Same retrieve() interface and result format as BM25Retriever
+    """
+
+    def __init__(
+        self,
+        bm25: BM25Retriever,
+        dense: DenseRetriever,
+        fusion: str = "rrf",
+        alpha: float = 0.5,
+        candidate_k: int = 50,
+    ):
+        self.bm25 = bm25
+        self.dense = dense
+        self.fusion = fusion
+        self.alpha = alpha
+        self.candidate_k = candidate_k
+        # The BM25 and dense lookups for one query run side by side
+        self._pool = ThreadPoolExecutor(max_workers=2)
+
+    @classmethod
+    def from_paths(
+        cls,
+        index_path: str,
+        store_path: str,
+        dense_index_path: str,
+        n_probe: int = 16,
+        **kwargs: Any,
+    ) -> "HybridRetriever":
+        bm25 = BM25Retriever(index_path=index_path, store_path=store_path)
+        dense = DenseRetriever(dense_index_path, store=bm25.store, n_probe=n_probe)
+        return cls(bm25, dense, **kwargs)
+
+    def retrieve(self, query: str, top_k: int = 5) -> Tuple[List[Dict[str, Any]], List[float]]:
+        k = max(top_k, self.candidate_k)
+        bm25_future = self._pool.submit(self.bm25.retrieve, query, k)
+        dense_results, _ = self.dense.retrieve(query, top_k=k)
+        bm25_results, _ = bm25_future.result()
+
+        fused = fuse_scores(bm25_results, dense_results, method=self.fusion, alpha=self.alpha)[:top_k]
+        return fused, [r["score"] for r in fused]
+
+    def close(self) -> None:
+        """
+        Stops the lookup thread pool (retrieve() cannot be used afterwards)
+        """
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "HybridRetriever":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Searches BM25 + dense indexes with score fusion")
+    parser.add_argument("--index", type=str, default="data/index/bm25s_index")
+    parser.add_argument("--store", type=str, default="data/index/bm25_store.pkl")
+    parser.add_argument("--dense-index", type=str, default="data/index/dense_index")
+    parser.add_argument("--query", type=str, required=True)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fusion", type=str, default="rrf", choices=FUSION_METHODS)
+    parser.add_argument("--alpha", type=float, default=0.5, help="Dense weight for linear fusion")
+
+    args = parser.parse_args()
+
+    with HybridRetriever.from_paths(
+        args.index, args.store, args.dense_index, fusion=args.fusion, alpha=args.alpha
+    ) as retriever:
+        results, _ = retriever.retrieve(args.query, top_k=args.top_k)
+
+    for r in results:
+        print("=" * 80)
+        print(f"Score: {r['score']:.4f}")
+        print("Title:", r["meta"].get("title"))
+        print("Text :", r["text"][:300])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import List, Dict, Optional, Any
+
+"""
+Persistent, content-addressed cache of LLM responses (SQLite)
+
+The key is a sha256 of the model, messages, temperature and any other
+request parameters, so an identical prompt is only ever paid for once.
+
+Modes:
+    readwrite  hits are served from the cache, misses are sent and stored
+    readonly   hits are served from the cache, misses are sent but not stored
+    replay     hits are served from the cache, misses raise CacheMissError
+
+Only readwrite opens the file for writing (and creates it); readonly and
+replay open an existing cache read-only. The cache is evicted
+least-recently-used first once it grows past max_bytes. The size is the sum
+of the stored entries' key and response bytes (not the file size), kept as
+a running total in a meta row that every write updates in its own
+transaction, so several processes sharing the file agree on it.
+
+LLMClient turns the cache on from the environment:
+    LLM_CACHE_PATH     path of the SQLite file (e.g. data/cache/llm_cache.sqlite)
+    LLM_CACHE_MODE     readwrite (default), readonly or replay
+    LLM_CACHE_MAX_MB   size limit before eviction (default: unlimited)
+
+To inspect a cache:
+python llm_cache.py --path data/cache/llm_cache.sqlite
+"""
+
+CACHE_MODES = ("readwrite", "readonly", "replay")
+
+
+class CacheMissError(KeyError):
+    """
+    Raised in replay mode when a request is not in the cache
+    """
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    params: Optional[Dict[str, Any]] = None,
+) -> str:
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "params": params or {},
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str, mode: str = "readwrite", max_bytes: Optional[int] = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        if mode != "readwrite":
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"LLM cache {path} does not exist ({mode} mode does not create it)")
+            uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            # WAL lets several processes (e.g. shards) share one cache file
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT, size INTEGER, created REAL, last_access REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            # Caches written before the meta row existed are summed once
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM responses"
+            )
+            self.conn.commit()
+
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMCache"]:
+        path = os.environ.get("LLM_CACHE_PATH")
+        if not path:
+            return None
+        max_mb = os.environ.get("LLM_CACHE_MAX_MB")
+        return cls(
+            path,
+            mode=os.environ.get("LLM_CACHE_MODE", "readwrite"),
+            max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached response for `key`, or None on a miss
+        Raises CacheMissError on a miss in replay mode
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+                if self.mode == "readwrite":
+                    self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self.conn.commit()
+
+        if row is None and self.mode == "replay":
+            raise CacheMissError(key)
+        return row[0] if row else None
+
+    def put(self, key: str, response: str) -> None:
+        if self.mode != "readwrite":
+            return
+
+        size = len(key) + len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            # Takes the write lock up front, so the old size, the new row and
+            # the running total change together across processes
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now),
+                )
+                self._add_bytes(size - (old[0] if old else 0))
+                self._stats["writes"] += 1
+                if self.max_bytes is not None:
+                    total = self._total_bytes()
+                    if total > self.max_bytes:
+                        self._evict(total)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def _add_bytes(self, delta: int) -> None:
+        self.conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+
+    def _total_bytes(self) -> int:
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()
+        except sqlite3.OperationalError:
+            # Read-only open of a cache written before the meta table existed
+            row = None
+        if row is None:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return row[0]
+
+    def _evict(self, total: int) -> None:
+        """
+        Drops least-recently-used entries until the cache is under 90% of max_bytes
+        (caller holds the lock, `total` is the current size)
+        """
+        target = int(self.max_bytes * 0.9)
+        start = total
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC")
+        to_delete = []
+        for key, size in rows:
+            if total <= target:
+                break
+            to_delete.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self._add_bytes(total - start)
+        self._stats["evictions"] += len(to_delete)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats["bytes"] = self._total_bytes()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows the size of an LLM response cache")
+    parser.add_argument("--path", type=str, required=True)
+    args = parser.parse_args()
+
+    cache = LLMCache(args.path, mode="readonly")
+    stats = cache.stats()
+    print(f"[INFO] {args.path}: {stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Dict, Optional, Any
+
+from llm_cache import LLMCache, make_cache_key
+
+"""
+Shared LLM transport used by every LLM helper (AnswerGenerator, ContextReranker,
+QueryRewriter, MistralCompleter).
+
+One LLMClient holds a single pooled HTTP connection pool, a token-bucket rate
+limiter (requests/min and tokens/min), per-call timeouts and retries with
+jittered exponential backoff. By default all helpers share one process-wide
+client from get_default_client(). Pass a client explicitly to use a different
+configuration.
+
+AsyncLLMClient is the asyncio counterpart (used by the Async* helpers). It
+has the same limiter, cache and retries, so one thread can keep hundreds of
+requests in flight.
+
+Configuration through the environment:
+    MISTRAL_API_KEY       API key (or put it in a local .env file)
+    MISTRAL_SERVER_URL    override the API base URL, e.g. fake_llm_server.py for offline load tests
+    MISTRAL_RPM           requests per minute limit
+    MISTRAL_TPM           tokens per minute limit
+    LLM_TIMEOUT_S         per-call timeout in seconds
+    LLM_MAX_RETRIES       retries for 429 / 5xx / timeouts
+    LLM_MAX_CONNECTIONS   size of the HTTP connection pool
+    LLM_CACHE_PATH        enable the persistent response cache (see llm_cache.py)
+"""
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _load_mistral_api_key() -> Optional[str]:
+    """
+    Fetch MISTRAL_API_KEY from env or a local .env file.
+    """
+    api_key = os.environ.get("MISTRAL_API_KEY")
+    if api_key:
+        return api_key
+
+    env_path = Path(".env")
+    if env_path.exists():
+        for line in env_path.read_text(encoding="utf-8").splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#") or "=" not in stripped:
+                continue
+            key, val = stripped.split("=", 1)
+            if key.strip() == "MISTRAL_API_KEY":
+                api_key = val.strip().strip('"').strip("'")
+                if api_key:
+                    os.environ["MISTRAL_API_KEY"] = api_key
+                    return api_key
+    return None
+
+
+def _env_float(name: str) -> Optional[float]:
+    val = os.environ.get(name)
+    return float(val) if val else None
+
+
+def extract_content(res: Any) -> str:
+    """
+    Pulls the text of the first choice out of a chat completion response.
+    Handles SDK objects and plain dicts, and list-of-blocks content.
+    """
+    content: Any = None
+    try:
+        choices = res.get("choices") if isinstance(res, dict) else res.choices
+        choice = choices[0]
+        if isinstance(choice, dict):
+            message = choice.get("message")
+        else:
+            message = getattr(choice, "message", None)
+        if isinstance(message, dict):
+            content = message.get("content")
+        elif message is not None:
+            content = getattr(message, "content", None)
+
+        if isinstance(content, list):
+            parts = []
+            for block in content:
+                if isinstance(block, dict):
+                    parts.append(block.get("text", ""))
+                else:
+                    text_val = getattr(block, "text", None)
+                    parts.append(text_val if text_val is not None else str(block))
+            content = "".join(parts)
+    except Exception:
+        content = None
+
+    if content is None:
+        return ""
+    if not isinstance(content, str):
+        content = str(content)
+    return content.strip()
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """
+    Rough token count for rate limiting (about 4 characters per token)
+    """
+    chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return chars // 4 + 4 * len(messages)
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests/min and tokens/min.
+
+    Callers reserve capacity up front and get back how long to wait before
+    sending. Buckets may go into debt, so concurrent callers queue up fairly
+    instead of all retrying at once. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._req_level = float(requests_per_minute or 0)
+        self._tok_level = float(tokens_per_minute or 0)
+        self._last = now
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._req_level = min(self.rpm, self._req_level + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tok_level = min(self.tpm, self._tok_level + elapsed * self.tpm / 60.0)
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Takes one request and `tokens` tokens from the buckets
+        Returns the number of seconds the caller must wait before sending
+        """
+        if not self.rpm and not self.tpm:
+            return 0.0
+
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = 0.0
+            if self.rpm:
+                self._req_level -= 1
+                if self._req_level < 0:
+                    wait = max(wait, -self._req_level * 60.0 / self.rpm)
+            if self.tpm:
+                self._tok_level -= tokens
+                if self._tok_level < 0:
+                    wait = max(wait, -self._tok_level * 60.0 / self.tpm)
+            return wait
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """
+        Corrects the token bucket once the real usage of a call is known
+        """
+        if not self.tpm:
+            return
+        with self._lock:
+            self._tok_level = min(self.tpm, self._tok_level + estimated - actual)
+
+    def acquire(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _BaseLLMClient(ABC):
+    """
+    Configuration, rate limiting, caching and stats shared by the sync and
+    async clients
+    """
+
+    default_max_connections = 32
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        server_url: Optional[str] = None,
+        timeout_s: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 30.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        cache: Optional[LLMCache] = None,
+    ):
+        self.cache = cache if cache is not None else LLMCache.from_env()
+
+        api_key = api_key or _load_mistral_api_key()
+        # Replaying from the cache never touches the API, so no key is needed
+        if not api_key and not (self.cache and self.cache.mode == "replay"):
+            raise RuntimeError("Please set MISTRAL_API_KEY in your environment.")
+
+        self.api_key = api_key
+        self.server_url = server_url or os.environ.get("MISTRAL_SERVER_URL") or None
+        self.timeout_s = timeout_s if timeout_s is not None else (_env_float("LLM_TIMEOUT_S") or 60.0)
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("LLM_MAX_RETRIES", 6))
+        self.max_connections = max_connections or int(
+            os.environ.get("LLM_MAX_CONNECTIONS", self.default_max_connections)
+        )
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.rate_limiter = rate_limiter or RateLimiter(
+            requests_per_minute=requests_per_minute or _env_float("MISTRAL_RPM"),
+            tokens_per_minute=tokens_per_minute or _env_float("MISTRAL_TPM"),
+        )
+
+        self._sdk = None
+        self._sdk_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    @abstractmethod
+    def _make_sdk(self) -> Any:
+        """
+        Builds the SDK client (sync or async flavour)
+        """
+
+    @property
+    def sdk(self) -> Any:
+        """
+        The underlying Mistral SDK client, created on first use with one
+        shared, pooled HTTP client (mistralai/httpx are imported lazily)
+        """
+        if self._sdk is None:
+            with self._sdk_lock:
+                if self._sdk is None:
+                    self._sdk = self._make_sdk()
+        return self._sdk
+
+    def _sdk_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"api_key": self.api_key}
+        if self.server_url:
+            kwargs["server_url"] = self.server_url
+        return kwargs
+
+    def _http_limits(self) -> Any:
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+
+    def _backoff_delay(self, attempt: int, exc: Exception) -> float:
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            return min(self.backoff_max_s, retry_after)
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        cap = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _record(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _record_usage(self, res: Any, estimated: int) -> None:
+        usage = getattr(res, "usage", None)
+        prompt = getattr(usage, "prompt_tokens", None) if usage is not None else None
+        completion = getattr(usage, "completion_tokens", None) if usage is not None else None
+        with self._stats_lock:
+            self._stats["prompt_tokens"] += prompt or 0
+            self._stats["completion_tokens"] += completion or 0
+        if prompt is not None:
+            self.rate_limiter.settle(estimated, prompt + (completion or 0))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def _cached(self, model: str, messages: List[Dict[str, Any]], temperature: float, params: Dict[str, Any]):
+        """
+        Returns (cache_key, cached response); both None when there is no cache
+        """
+        if self.cache is None:
+            return None, None
+        cache_key = make_cache_key(model, messages, temperature, params)
+        return cache_key, self.cache.get(cache_key)
+
+    def _on_success(self, res: Any, estimated: int, cache_key: Optional[str]) -> str:
+        self._record_usage(res, estimated)
+        content = extract_content(res)
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    def _on_failure(self, attempt: int, exc: Exception) -> float:
+        """
+        Re-raises `exc` if it should not be retried, otherwise returns the backoff delay
+        """
+        if attempt >= self.max_retries or not is_retryable(exc):
+            self._record("failures")
+            raise exc
+        delay = self._backoff_delay(attempt, exc)
+        self._record("retries")
+        print(f"[WARNING] LLM call failed ({type(exc).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+
+class LLMClient(_BaseLLMClient):
+    """
+    Pooled, rate-limited, retrying chat-completion client (Mistral API)
+    """
+
+    def _make_sdk(self) -> Any:
+        import httpx
+        from mistralai import Mistral
+
+        http_client = httpx.Client(limits=self._http_limits(), timeout=self.timeout_s)
+        return Mistral(client=http_client, **self._sdk_kwargs())
+
+    def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "mistral-small-latest",
+        temperature: float = 0.0,
+        **params: Any,
+    ) -> str:
+        """
+        Sends one chat completion and returns the text of the first choice
+        Retries 429 / 5xx / timeouts with jittered exponential backoff
+
+        Identical requests are answered from the response cache when one is set
+        """
+        cache_key, cached = self._cached(model, messages, temperature, params)
+        if cached is not None:
+            return cached
+
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(estimated)
+            try:
+                self._record("calls")
+                res = self.sdk.chat.complete(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout_ms=int(self.timeout_s * 1000),
+                    **params,
+                )
+            except Exception as exc:
+                time.sleep(self._on_failure(attempt, exc))
+                attempt += 1
+                continue
+
+            return self._on_success(res, estimated, cache_key)
+
+
+class AsyncLLMClient(_BaseLLMClient):
+    """
+    asyncio version of LLMClient (same limiter, cache, retries and stats)
+    """
+
+    default_max_connections = 256
+
+    def _make_sdk(self) -> Any:
+        import httpx
+        from mistralai import Mistral
+
+        http_client = httpx.AsyncClient(limits=self._http_limits(), timeout=self.timeout_s)
+        return Mistral(async_client=http_client, **self._sdk_kwargs())
+
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "mistral-small-latest",
+        temperature: float = 0.0,
+        **params: Any,
+    ) -> str:
+        cache_key, cached = self._cached(model, messages, temperature, params)
+        if cached is not None:
+            return cached
+
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.reserve(estimated)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                self._record("calls")
+                res = await self.sdk.chat.complete_async(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout_ms=int(self.timeout_s * 1000),
+                    **params,
+                )
+            except Exception as exc:
+                await asyncio.sleep(self._on_failure(attempt, exc))
+                attempt += 1
+                continue
+
+            return self._on_success(res, estimated, cache_key)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "raw_response", None) or getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "raw_response", None) or getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    True for rate limits, server errors, timeouts and dropped connections
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exc, httpx.TransportError)
+
+
+_default_client: Optional[LLMClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> LLMClient:
+    """
+    Process-wide shared LLMClient, created on first use from the environment
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = LLMClient()
+    return _default_client
+
+
+def set_default_client(client: Optional[LLMClient]) -> None:
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+_default_async_client: Optional[AsyncLLMClient] = None
+
+
+def get_default_async_client() -> AsyncLLMClient:
+    """
+    Process-wide shared AsyncLLMClient. It shares the rate limiter and cache
+    of the default sync client so both count against the same quota.
+    """
+    global _default_async_client
+    if _default_async_client is None:
+        sync_client = get_default_client()
+        with _default_client_lock:
+            if _default_async_client is None:
+                _default_async_client = AsyncLLMClient(
+                    api_key=sync_client.api_key,
+                    rate_limiter=sync_client.rate_limiter,
+                    cache=sync_client.cache,
+                )
+    return _default_async_client
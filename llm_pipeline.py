@@ -1,40 +1,23 @@
-import os
 import json
-from pathlib import Path
 from typing import List, Optional, Any
 
-from mistralai import Mistral
+from llm_client import LLMClient, AsyncLLMClient, get_default_client, get_default_async_client
+from prompt_budget import PromptAssembler, get_default_assembler
 
-
-def _load_mistral_api_key() -> Optional[str]:
-    """
-    Fetch MISTRAL_API_KEY from env or a local .env file.
-    """
-    api_key = os.environ.get("MISTRAL_API_KEY")
-    if api_key:
-        return api_key
-
-    env_path = Path(".env")
-    if env_path.exists():
-        for line in env_path.read_text(encoding="utf-8").splitlines():
-            stripped = line.strip()
-            if not stripped or stripped.startswith("#") or "=" not in stripped:
-                continue
-            key, val = stripped.split("=", 1)
-            if key.strip() == "MISTRAL_API_KEY":
-                api_key = val.strip().strip('"').strip("'")
-                if api_key:
-                    os.environ["MISTRAL_API_KEY"] = api_key
-                    return api_key
-    return None
+PASSAGE_SEPARATOR = "\n\n---\n\n"
 
 
 class AnswerGenerator:
-    def __init__(self, model: str = "mistral-small-latest", system_prompt: Optional[str] = None):
-        api_key = _load_mistral_api_key()
-        if not api_key:
-            raise RuntimeError("Please set MISTRAL_API_KEY in your environment.")
-        self.client = Mistral(api_key=api_key)
+    def __init__(
+        self,
+        model: str = "mistral-small-latest",
+        system_prompt: Optional[str] = None,
+        client: Optional[LLMClient] = None,
+        assembler: Optional[PromptAssembler] = None,
+    ):
+        self.client = client or get_default_client()
+        # Keeps the passages of each prompt within a token budget
+        self.assembler = assembler or get_default_assembler()
         self.model = model
         self.system_prompt = system_prompt or (
             "You are a QA model for the HotpotQA dataset.\n"
@@ -47,8 +30,8 @@ class AnswerGenerator:
             "  I cannot answer from the given context."
         )
 
-    def _build_prompt(self, question: str, contexts: List[str]) -> str:
-        context_block = "\n\n---\n\n".join(contexts)
+    @staticmethod
+    def _user_prompt(question: str, context_block: str) -> str:
         return (
             "You are given a HotpotQA question and some context passages.\n"
             "Return ONLY the final answer.\n"
@@ -58,6 +41,13 @@ class AnswerGenerator:
             "Answer:"
         )
 
+    def _build_prompt(self, question: str, contexts: List[str]) -> str:
+        # Everything around the passages counts against the budget (template and separators included)
+        separators = PASSAGE_SEPARATOR * max(0, len(contexts) - 1)
+        fixed_text = self.system_prompt + self._user_prompt(question, separators)
+        contexts, _ = self.assembler.fit("answer", contexts, fixed_text=fixed_text)
+        return self._user_prompt(question, PASSAGE_SEPARATOR.join(contexts))
+
     @staticmethod
     def _normalize_yes_no(answer: str) -> str:
         ans = answer.strip().lower()
@@ -67,46 +57,23 @@ class AnswerGenerator:
             return "no"
         return answer.strip()
 
-    def generate_answer(self, question: str, contexts: List[str], return_prompt: bool = False):
+    def _answer_messages(self, question: str, contexts: List[str]):
         prompt = self._build_prompt(question, contexts)
-
         messages = [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": prompt},
         ]
+        return messages, prompt
 
-        res = self.client.chat.complete(
+    def generate_answer(self, question: str, contexts: List[str], return_prompt: bool = False):
+        messages, prompt = self._answer_messages(question, contexts)
+
+        answer = self.client.complete(
             model=self.model,
             messages=messages,
             temperature=0.2,
         )
 
-        answer = ""
-        try:
-            choice = res.choices[0]
-            message = getattr(choice, "message", choice.get("message"))
-            content = getattr(message, "content", None) if message is not None else None
-            if content is None and isinstance(message, dict):
-                content = message.get("content")
-            if isinstance(content, list):
-                parts = []
-                for block in content:
-                    if isinstance(block, dict):
-                        parts.append(block.get("text", ""))
-                    else:
-                        text_val = getattr(block, "text", None)
-                        parts.append(text_val if text_val is not None else str(block))
-                content = "".join(parts)
-            if isinstance(content, str):
-                answer = content.strip()
-            if not answer and content is not None:
-                answer = str(content).strip()
-        except Exception:
-            try:
-                answer = str(res.choices[0].message.content).strip()
-            except Exception:
-                answer = ""
-
         answer = self._normalize_yes_no(answer)
 
         if return_prompt:
@@ -114,20 +81,7 @@ class AnswerGenerator:
         return answer
 
 
-    def score_candidate_answers(
-        self,
-        question: str,
-        contexts: list[str],
-        answers: list[str],
-    ) -> list[float]:
-        """
-        Given a question, a list of context passages, and candidate answers,
-        return confidence scores per answer in [0, 1], aligned with `answers`.
-        """
-        if not answers:
-            return []
-
-        context_block = "\n\n---\n\n".join(contexts)
+    def _score_messages(self, question: str, contexts: List[str], answers: List[str]) -> List[dict]:
         answers_block = "\n".join([f"[{i}] {ans}" for i, ans in enumerate(answers)])
 
         system_prompt = (
@@ -148,45 +102,25 @@ class AnswerGenerator:
             "where `index` is the answer index and `confidence` is a float in [0, 1]."
         )
 
-        user_content = (
-            f"Question:\n{question}\n\n"
-            f"Context passages:\n{context_block}\n\n"
-            f"Candidate answers:\n{answers_block}\n\n"
-            "JSON:"
-        )
+        def user_content(context_block: str) -> str:
+            return (
+                f"Question:\n{question}\n\n"
+                f"Context passages:\n{context_block}\n\n"
+                f"Candidate answers:\n{answers_block}\n\n"
+                "JSON:"
+            )
 
-        res = self.client.chat.complete(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0.1,
-        )
-
-        content = ""
-        try:
-            choice = res.choices[0]
-            message = getattr(choice, "message", None)
-            content = getattr(message, "content", None) if message is not None else None
-            if content is None and isinstance(message, dict):
-                content = message.get("content")
-            if isinstance(content, list):
-                parts = []
-                for block in content:
-                    if isinstance(block, dict):
-                        parts.append(block.get("text", ""))
-                    else:
-                        text_val = getattr(block, "text", None)
-                        parts.append(text_val if text_val is not None else str(block))
-                content = "".join(parts)
-        except Exception:
-            content = ""
+        separators = PASSAGE_SEPARATOR * max(0, len(contexts) - 1)
+        contexts, _ = self.assembler.fit("score", contexts, fixed_text=system_prompt + user_content(separators))
 
-        if not isinstance(content, str):
-            content = str(content)
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content(PASSAGE_SEPARATOR.join(contexts))},
+        ]
 
-        scores = [0.0] * len(answers)
+    @staticmethod
+    def _parse_answer_scores(content: str, n_answers: int) -> List[float]:
+        scores = [0.0] * n_answers
 
         parsed = None
         try:
@@ -207,51 +141,46 @@ class AnswerGenerator:
             try:
                 idx = int(entry.get("index"))
                 conf = float(entry.get("confidence", 0))
-                if 0 <= idx < len(answers):
+                if 0 <= idx < n_answers:
                     scores[idx] = max(0.0, min(1.0, conf))
             except Exception:
                 continue
 
         return scores
 
+    def score_candidate_answers(
+        self,
+        question: str,
+        contexts: list[str],
+        answers: list[str],
+    ) -> list[float]:
+        """
+        Given a question, a list of context passages, and candidate answers,
+        return confidence scores per answer in [0, 1], aligned with `answers`.
+        """
+        if not answers:
+            return []
+
+        content = self.client.complete(
+            model=self.model,
+            messages=self._score_messages(question, contexts, answers),
+            temperature=0.1,
+        )
+        return self._parse_answer_scores(content, len(answers))
+
 
 class QueryRewriter:
     """
     Optional helper to rewrite a question into retrieval-friendly queries.
     """
 
-    def __init__(self, model: str = "mistral-small-latest"):
-        api_key = _load_mistral_api_key()
-        if not api_key:
-            raise RuntimeError("Please set MISTRAL_API_KEY in your environment.")
-        self.client = Mistral(api_key=api_key)
+    def __init__(self, model: str = "mistral-small-latest", client: Optional[LLMClient] = None):
+        self.client = client or get_default_client()
         self.model = model
 
-    def _extract_content(self, res: Any) -> str:
-        content = ""
-        try:
-            choice = res.choices[0]
-            message = getattr(choice, "message", None)
-            content = getattr(message, "content", None) if message is not None else None
-            if content is None and isinstance(message, dict):
-                content = message.get("content")
-            if isinstance(content, list):
-                parts = []
-                for block in content:
-                    if isinstance(block, dict):
-                        parts.append(block.get("text", ""))
-                    else:
-                        text_val = getattr(block, "text", None)
-                        parts.append(text_val if text_val is not None else str(block))
-                content = "".join(parts)
-        except Exception:
-            content = ""
-        if not isinstance(content, str):
-            content = str(content)
-        return content.strip()
-
-    def rewrite(self, question: str) -> str:
-        messages = [
+    @staticmethod
+    def _rewrite_messages(question: str) -> List[dict]:
+        return [
             {
                 "role": "system",
                 "content": (
@@ -263,19 +192,9 @@ class QueryRewriter:
             {"role": "user", "content": question},
         ]
 
-        res = self.client.chat.complete(
-            model=self.model,
-            messages=messages,
-            temperature=0,
-        )
-
-        return self._extract_content(res) or question
-
-    def rewrite_entity_focused(self, question: str) -> str:
-        """
-        Generate an entity-focused query variant from the original question.
-        """
-        messages = [
+    @staticmethod
+    def _entity_messages(question: str) -> List[dict]:
+        return [
             {
                 "role": "system",
                 "content": (
@@ -288,21 +207,37 @@ class QueryRewriter:
             {"role": "user", "content": question},
         ]
 
-        res = self.client.chat.complete(
+    def rewrite(self, question: str) -> str:
+        content = self.client.complete(
             model=self.model,
-            messages=messages,
+            messages=self._rewrite_messages(question),
             temperature=0,
         )
 
-        return self._extract_content(res) or question
+        return content or question
+
+    def rewrite_entity_focused(self, question: str) -> str:
+        """
+        Generate an entity-focused query variant from the original question.
+        """
+        content = self.client.complete(
+            model=self.model,
+            messages=self._entity_messages(question),
+            temperature=0,
+        )
+
+        return content or question
 
 
 class ContextReranker:
-    def __init__(self, model: str = "mistral-small-latest"):
-        api_key = _load_mistral_api_key()
-        if not api_key:
-            raise RuntimeError("Please set MISTRAL_API_KEY in your environment.")
-        self.client = Mistral(api_key=api_key)
+    def __init__(
+        self,
+        model: str = "mistral-small-latest",
+        client: Optional[LLMClient] = None,
+        assembler: Optional[PromptAssembler] = None,
+    ):
+        self.client = client or get_default_client()
+        self.assembler = assembler or get_default_assembler()
         self.model = model
 
     @staticmethod
@@ -321,14 +256,8 @@ class ContextReranker:
                 return None
         return None
 
-    def score(self, question: str, contexts: List[str]) -> List[float]:
-        """
-        Use an LLM to assign a confidence score to each context.
-        Returns a list of floats in [0, 1], one per context.
-        """
-        if not contexts:
-            return []
-
+    @staticmethod
+    def _score_messages(question: str, contexts: List[str]) -> List[dict]:
         numbered_contexts = "\n".join(
             [f"{idx}: {ctx}" for idx, ctx in enumerate(contexts)]
         )
@@ -344,46 +273,152 @@ class ContextReranker:
             "JSON:"
         )
 
-        res = self.client.chat.complete(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "Select contexts for QA"},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-        )
-
-        choice = res.choices[0]
-        message = getattr(choice, "message", None)
-        content = getattr(message, "content", None) if message is not None else None
-
-        if isinstance(content, list):
-            parts = []
-            for block in content:
-                if isinstance(block, dict):
-                    parts.append(block.get("text", ""))
-                else:
-                    text_val = getattr(block, "text", None)
-                    parts.append(text_val if text_val is not None else str(block))
-            content = "".join(parts)
-
-        if not isinstance(content, str):
-            content = str(content)
+        return [
+            {"role": "system", "content": "Select contexts for QA"},
+            {"role": "user", "content": prompt},
+        ]
 
-        parsed = self._extract_json_block(content) or []
+    @classmethod
+    def _parse_scores(cls, content: str, n_contexts: int) -> List[float]:
+        parsed = cls._extract_json_block(content) or []
 
-        scores = [0.0] * len(contexts)
+        scores = [0.0] * n_contexts
         for entry in parsed:
             try:
                 idx = int(entry.get("index"))
                 conf = float(entry.get("confidence", 0))
-                if 0 <= idx < len(contexts):
+                if 0 <= idx < n_contexts:
                     scores[idx] = max(0.0, min(1.0, conf))
             except Exception:
                 continue
 
         return scores
 
+    @staticmethod
+    def _map_scores(kept_scores: List[float], positions: List[Optional[int]]) -> List[float]:
+        """
+        Scores for the original contexts: duplicates share a score, dropped ones get 0
+        """
+        return [kept_scores[p] if p is not None else 0.0 for p in positions]
+
+    def score(self, question: str, contexts: List[str]) -> List[float]:
+        """
+        Use an LLM to assign a confidence score to each context.
+        Returns a list of floats in [0, 1], one per context.
+        """
+        if not contexts:
+            return []
+
+        # Every passage should be scored, so the budget truncates rather than drops
+        kept, positions = self.assembler.fit("rerank", contexts, fixed_text=question, spread=True)
+        content = self.client.complete(
+            model=self.model,
+            messages=self._score_messages(question, kept),
+            temperature=0,
+        )
+        return self._map_scores(self._parse_scores(content, len(kept)), positions)
+
     def rerank(self, question: str, contexts: List[str]) -> List[int]:
         scores = self.score(question, contexts)
         return sorted(range(len(contexts)), key=lambda i: scores[i], reverse=True)
+
+
+class AsyncAnswerGenerator(AnswerGenerator):
+    """
+    asyncio version of AnswerGenerator (same prompts and parsing)
+    """
+
+    def __init__(
+        self,
+        model: str = "mistral-small-latest",
+        system_prompt: Optional[str] = None,
+        client: Optional[AsyncLLMClient] = None,
+        assembler: Optional[PromptAssembler] = None,
+    ):
+        super().__init__(model, system_prompt, client=client or get_default_async_client(), assembler=assembler)
+
+    async def generate_answer(self, question: str, contexts: List[str], return_prompt: bool = False):
+        messages, prompt = self._answer_messages(question, contexts)
+
+        answer = await self.client.complete(
+            model=self.model,
+            messages=messages,
+            temperature=0.2,
+        )
+
+        answer = self._normalize_yes_no(answer)
+
+        if return_prompt:
+            return answer, prompt
+        return answer
+
+    async def score_candidate_answers(
+        self,
+        question: str,
+        contexts: list[str],
+        answers: list[str],
+    ) -> list[float]:
+        if not answers:
+            return []
+
+        content = await self.client.complete(
+            model=self.model,
+            messages=self._score_messages(question, contexts, answers),
+            temperature=0.1,
+        )
+        return self._parse_answer_scores(content, len(answers))
+
+
+class AsyncQueryRewriter(QueryRewriter):
+    """
+    asyncio version of QueryRewriter
+    """
+
+    def __init__(self, model: str = "mistral-small-latest", client: Optional[AsyncLLMClient] = None):
+        super().__init__(model, client=client or get_default_async_client())
+
+    async def rewrite(self, question: str) -> str:
+        content = await self.client.complete(
+            model=self.model,
+            messages=self._rewrite_messages(question),
+            temperature=0,
+        )
+        return content or question
+
+    async def rewrite_entity_focused(self, question: str) -> str:
+        content = await self.client.complete(
+            model=self.model,
+            messages=self._entity_messages(question),
+            temperature=0,
+        )
+        return content or question
+
+
+class AsyncContextReranker(ContextReranker):
+    """
+    asyncio version of ContextReranker
+    """
+
+    def __init__(
+        self,
+        model: str = "mistral-small-latest",
+        client: Optional[AsyncLLMClient] = None,
+        assembler: Optional[PromptAssembler] = None,
+    ):
+        super().__init__(model, client=client or get_default_async_client(), assembler=assembler)
+
+    async def score(self, question: str, contexts: List[str]) -> List[float]:
+        if not contexts:
+            return []
+
+        kept, positions = self.assembler.fit("rerank", contexts, fixed_text=question, spread=True)
+        content = await self.client.complete(
+            model=self.model,
+            messages=self._score_messages(question, kept),
+            temperature=0,
+        )
+        return self._map_scores(self._parse_scores(content, len(kept)), positions)
+
+    async def rerank(self, question: str, contexts: List[str]) -> List[int]:
+        scores = await self.score(question, contexts)
+        return sorted(range(len(contexts)), key=lambda i: scores[i], reverse=True)
@@ -1,6 +1,5 @@
 from typing import Optional
-from mistralai import Mistral
-from llm_pipeline import _load_mistral_api_key
+from llm_client import LLMClient, AsyncLLMClient, get_default_client, get_default_async_client
 
 
 class MistralCompleter:
@@ -8,41 +7,46 @@ class MistralCompleter:
     Small helper for generic prompts (question rewrites, decompositions, entity-focused queries).
     """
 
-    def __init__(self, model: str = "mistral-small-latest", system_prompt: Optional[str] = None):
-        api_key = _load_mistral_api_key()
-        if not api_key:
-            raise RuntimeError("No API key found")
-        self.client = Mistral(api_key=api_key)
+    def __init__(
+        self,
+        model: str = "mistral-small-latest",
+        system_prompt: Optional[str] = None,
+        client: Optional[LLMClient] = None,
+    ):
+        self.client = client or get_default_client()
         self.model = model
         self.system_prompt = system_prompt or "You are a helpful assistant for query reformulation for a RAG system using BM25S retriever."
 
-    def complete(self, user_prompt: str, temperature: float = 0.2) -> str:
-        messages = [
+    def _messages(self, user_prompt: str) -> list:
+        return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": user_prompt},
         ]
 
-        res = self.client.chat.complete(
+    def complete(self, user_prompt: str, temperature: float = 0.2) -> str:
+        return self.client.complete(
             model=self.model,
-            messages=messages,
+            messages=self._messages(user_prompt),
             temperature=temperature,
         )
 
-        choice = res.choices[0]
-        message = getattr(choice, "message", None)
-        content = getattr(message, "content", None) if message is not None else None
 
-        if isinstance(content, list):
-            parts = []
-            for block in content:
-                if isinstance(block, dict):
-                    parts.append(block.get("text", ""))
-                else:
-                    text_val = getattr(block, "text", None)
-                    parts.append(text_val if text_val is not None else str(block))
-            content = "".join(parts)
+class AsyncMistralCompleter(MistralCompleter):
+    """
+    asyncio version of MistralCompleter
+    """
 
-        if not isinstance(content, str):
-            content = str(content)
+    def __init__(
+        self,
+        model: str = "mistral-small-latest",
+        system_prompt: Optional[str] = None,
+        client: Optional[AsyncLLMClient] = None,
+    ):
+        super().__init__(model, system_prompt, client=client or get_default_async_client())
 
-        return content.strip()
+    async def complete(self, user_prompt: str, temperature: float = 0.2) -> str:
+        return await self.client.complete(
+            model=self.model,
+            messages=self._messages(user_prompt),
+            temperature=temperature,
+        )
@@ -1,6 +1,7 @@
 import os
 import argparse
 import glob
+import shutil
 
 """
 To run:
@@ -8,8 +9,56 @@ python merge_jsonl.py \
   --in-dir data/processed/splits \
   --out data/processed/chunks.jsonl \
   --prefix chunks_part
+
+Note: build_BM25_index.py can read the parts directly (--chunks data/processed/splits),
+so merging is only needed when a single file is wanted.
 """
 
+COPY_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def _copy_file_bytes(in_f, out_f) -> int:
+    """
+    Appends all bytes of in_f to out_f without decoding them
+    Uses copy_file_range / sendfile (in-kernel copies) when the platform allows it
+    and falls back to a buffered copy otherwise
+
+    Returns the number of bytes copied
+    """
+    in_fd = in_f.fileno()
+    out_fd = out_f.fileno()
+    size = os.fstat(in_fd).st_size
+    copied = 0
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(in_fd, out_fd, min(COPY_BLOCK_BYTES, size - copied))
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError:
+            # e.g. unsupported filesystem; carry on from where it stopped
+            pass
+
+    if hasattr(os, "sendfile"):
+        try:
+            while copied < size:
+                n = os.sendfile(out_fd, in_fd, copied, min(COPY_BLOCK_BYTES, size - copied))
+                if n == 0:
+                    break
+                copied += n
+            out_f.seek(0, os.SEEK_END)
+            return copied
+        except OSError:
+            pass
+
+    in_f.seek(copied)
+    out_f.seek(0, os.SEEK_END)
+    shutil.copyfileobj(in_f, out_f, COPY_BLOCK_BYTES)
+    return size
+
 def merge_jsonl_parts(
     in_dir: str,
     out_path: str,
@@ -18,6 +67,8 @@ def merge_jsonl_parts(
     """
     Merges multiple JSONL part files into a single JSONL file
     Should be identical to the original JSONL chunks file
+
+    Parts are concatenated byte-for-byte, lines are never decoded
     """
 
     pattern = os.path.join(in_dir, f"{prefix}_*.jsonl")
@@ -27,22 +78,20 @@ def merge_jsonl_parts(
         print(f"[ERROR] No files matching {pattern}")
         return
 
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
 
     print(f"[INFO] Found {len(part_files)} part file(s).")
     print(f"[INFO] Writing merged JSONL out to {out_path}")
 
-    total_lines = 0
-    with open(out_path, "w", encoding="utf-8") as out_f:
+    total_bytes = 0
+    with open(out_path, "wb") as out_f:
         for part in part_files:
             print(f"[INFO] Merging {part}")
-            with open(part, "r", encoding="utf-8") as in_f:
-                for line in in_f:
-                    out_f.write(line)
-                    total_lines += 1
+            with open(part, "rb") as in_f:
+                total_bytes += _copy_file_bytes(in_f, out_f)
 
     print(f"[DONE] Merged {len(part_files)} files into {out_path}")
-    print(f"[DONE] Total lines written: {total_lines}")
+    print(f"[DONE] Total bytes written: {total_bytes}")
 
 
 def main():
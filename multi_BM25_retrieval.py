@@ -1,9 +1,12 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
 from concurrent.futures import ThreadPoolExecutor
 from BM25S_retrieval import BM25Retriever
 from question_reformulating import QuestionRewriter
 
 
+TRAJECTORY_ORDER = ["original", "rewrite", "decomp", "entity"]
+
+
 class MultiTrajectoryBM25Retriever:
     """
     Runs BM25S retrieval for multiple trajectories:
@@ -11,6 +14,9 @@ class MultiTrajectoryBM25Retriever:
       - 'rewrite' : simple rewrites
       - 'decomp'  : semantic decompositions
       - 'entity'  : entity-focused queries
+
+    If `dense_index_path` is given, each query is answered by the hybrid
+    (BM25 + dense) retriever instead of BM25 alone.
     """
 
     def __init__(
@@ -18,15 +24,36 @@ class MultiTrajectoryBM25Retriever:
         index_path: str = "data/index/bm25s_index",
         store_path: str = "data/index/bm25_store.pkl",
         max_workers: int = 4,
+        dense_index_path: Optional[str] = None,
     ):
         self.bm25 = BM25Retriever(index_path=index_path, store_path=store_path)
+        self.retriever: Any = self.bm25
+        if dense_index_path:
+            from dense_index import DenseRetriever
+            from hybrid_retrieval import HybridRetriever
+
+            dense = DenseRetriever(dense_index_path, store=self.bm25.store)
+            self.retriever = HybridRetriever(self.bm25, dense)
         self.max_workers = max_workers
 
+    def close(self) -> None:
+        """
+        Releases the hybrid retriever's thread pool (nothing to do for BM25 alone)
+        """
+        if self.retriever is not self.bm25:
+            self.retriever.close()
+
+    def __enter__(self) -> "MultiTrajectoryBM25Retriever":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
     def _retrieve_for_queries(
         self, queries: List[str], top_k_per_query: int
     ) -> List[Dict[str, Any]]:
         """
-        Runs BM25 for each query in `queries` and merges the results
+        Runs retrieval for each query in `queries` and merges the results
         If a document appears for multiple queries it will keep the highest score
         """
         doc_best: Dict[int, Dict[str, Any]] = {}
@@ -35,7 +62,7 @@ class MultiTrajectoryBM25Retriever:
             q = q.strip()
             if not q:
                 continue
-            results, _ = self.bm25.retrieve(q, top_k=top_k_per_query)
+            results, _ = self.retriever.retrieve(q, top_k=top_k_per_query)
             for r in results:
                 doc_id = r["doc_id"]
                 score = r["score"]
@@ -44,6 +71,96 @@ class MultiTrajectoryBM25Retriever:
 
         return sorted(doc_best.values(), key=lambda d: d["score"], reverse=True)
 
+    def _trajectory_queries(
+        self, name: str, question: str, rewriter: QuestionRewriter
+    ) -> List[str]:
+        if name == "original":
+            return [question]
+        if name == "rewrite":
+            return rewriter.simple_rewrites(question, n=3)
+        if name == "decomp":
+            return rewriter.semantic_decomposition(question, max_steps=3)
+        if name == "entity":
+            return rewriter.entity_focused(question, max_entities=3)
+        raise ValueError(f"Unknown trajectory: {name}")
+
+    def run_trajectories(
+        self,
+        question: str,
+        rewriter: QuestionRewriter,
+        top_k_per_query: int = 8,
+        process_fn: Optional[Callable[[str, List[str], List[Dict[str, Any]]], Any]] = None,
+        barrier_fn: Optional[Callable[[Dict[str, Dict[str, Any]]], Any]] = None,
+        trajectories: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Runs each trajectory as its own chain, all chains concurrently:
+
+            original:  retrieve -> process_fn
+            rewrite:   rewrite call -> retrieve -> process_fn
+            decomp:    decomposition call -> retrieve -> process_fn
+            entity:    entity call -> retrieve -> process_fn
+
+        The original question starts retrieving straight away, and each chain
+        moves on to its own downstream work (e.g. rerank + answer in process_fn)
+        as soon as its queries are ready, so wall time is close to the longest
+        chain rather than the sum of every call.
+
+        If the rewriter is in combined mode, the three rewrite calls are replaced
+        by one shared call and the rewrite/decomp/entity chains wait on it.
+
+        If barrier_fn is given, it runs once on all retrieved trajectories
+        before any process_fn (e.g. to rerank the union of candidates in one
+        go), and the process_fn calls then run concurrently after it.
+
+        `trajectories` restricts the run to a subset of TRAJECTORY_ORDER (e.g.
+        just "original" first, the rest only if needed).
+
+        Returns the trajectories in TRAJECTORY_ORDER (skipping ones with no queries):
+        {
+          "original": {"queries": [question], "docs": [...], "result": process_fn(...)},
+          ...
+        }
+        """
+
+        names = [name for name in TRAJECTORY_ORDER if trajectories is None or name in trajectories]
+        combined_future = None
+
+        def chain(name: str) -> Dict[str, Any]:
+            if name != "original" and combined_future is not None:
+                queries = combined_future.result()[name]
+            else:
+                queries = self._trajectory_queries(name, question, rewriter)
+            if not queries:
+                return {"queries": queries, "docs": [], "skip": True}
+            docs = self._retrieve_for_queries(queries, top_k_per_query)
+            info: Dict[str, Any] = {"queries": queries, "docs": docs}
+            if process_fn is not None and barrier_fn is None:
+                info["result"] = process_fn(name, queries, docs)
+            return info
+
+        # One extra worker for the shared combined rewrite call
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, len(TRAJECTORY_ORDER)) + 1) as pool:
+            if getattr(rewriter, "combined", False) and any(name != "original" for name in names):
+                combined_future = pool.submit(
+                    rewriter.all_query_sets, question, n_rewrites=3, max_steps=3, max_entities=3
+                )
+            futures = {name: pool.submit(chain, name) for name in names}
+            results = {name: fut.result() for name, fut in futures.items()}
+            results = {name: info for name, info in results.items() if not info.get("skip")}
+
+            if barrier_fn is not None:
+                barrier_fn(results)
+                if process_fn is not None:
+                    post = {
+                        name: pool.submit(process_fn, name, info["queries"], info["docs"])
+                        for name, info in results.items()
+                    }
+                    for name, fut in post.items():
+                        results[name]["result"] = fut.result()
+
+        return results
+
     def multi_trajectory_retrieve(
         self,
         question: str,
@@ -58,32 +175,7 @@ class MultiTrajectoryBM25Retriever:
           "decomp":   {"queries": [subq1, ...],       "docs": [...]},
           "entity":   {"queries": [entity_q1, ...],   "docs": [...]},
         }
-        """
-        # Builds query sets
-        original_queries = [question]
-        rewrite_queries  = rewriter.simple_rewrites(question, n=3)
-        decomp_queries   = rewriter.semantic_decomposition(question, max_steps=3)
-        entity_queries   = rewriter.entity_focused(question, max_entities=3)
-
-        trajectories: Dict[str, List[str]] = {
-            "original": original_queries,
-            "rewrite":  rewrite_queries,
-            "decomp":   decomp_queries,
-            "entity":   entity_queries,
-        }
-
-        results: Dict[str, Dict[str, Any]] = {}
 
-        # Dispatches retrieval in parallel
-        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
-            future_to_name = {
-                pool.submit(self._retrieve_for_queries, qlist, top_k_per_query): name
-                for name, qlist in trajectories.items()
-                if qlist
-            }
-
-            for fut, name in [(f, n) for f, n in future_to_name.items()]:
-                docs = fut.result()
-                results[name] = {"queries": trajectories[name], "docs": docs}
-
-        return results
+        The rewrite calls and the retrievals run concurrently (see run_trajectories)
+        """
+        return self.run_trajectories(question, rewriter, top_k_per_query=top_k_per_query)
@@ -1,162 +1,279 @@
-import json
-from typing import Dict, List
+import argparse
+import os
+import time
+from itertools import islice
+from typing import Dict, Optional, Tuple
+
+from data_utils import load_hotpot_examples
+from llm_client import LLMClient, set_default_client
+from cascade import CascadePolicy
+from prediction_log import PredictionLog, read_prediction_log, finalize_predictions
+from prompt_budget import PromptAssembler, get_default_assembler, set_default_assembler
+from rag_pipeline import RAGPipeline
+from distractor import DistractorPipeline
+from sharding import parse_shard, shard_of, shard_suffix
+from reranking import RERANKER_BACKENDS
+
+"""
+To run:
+python predict_full.py \
+  --dev hotpot_dev_distractor_v1.json \
+  --out predictions_dev.json \
+  --concurrency 16 \
+  --rpm 300 \
+  --evaluate
+
+--concurrency is the number of questions in flight at once; --rpm / --tpm cap
+the requests / tokens per minute across all of them. Predictions are written
+in dev-set order whatever order questions finish in, with sentence-level
+supporting facts, so --evaluate (evaluation.py) reports the official answer,
+sp and joint metrics from the one run.
+
+--distractor answers from each question's own 10 context paragraphs instead
+of the Wikipedia index (no index load, no rewrites, see distractor.py).
+
+A crashed or interrupted run continues where it stopped with --resume (the
+per-question log predictions_dev.jsonl is kept next to --out).
+"""
+
+def _example_id(sample: Dict) -> Optional[str]:
+    return sample.get("_id") or sample.get("id")
 
-from data_utils import load_hotpot_json
-from llm_pipeline import AnswerGenerator, ContextReranker
-from llm_query_utils import MistralCompleter
-from question_reformulating import QuestionRewriter
-from multi_BM25_retrieval import MultiTrajectoryBM25Retriever
 
 def run_full_dev(
     dev_json_path: str,
     output_path: str = "predictions_dev.json",
     top_k_for_answer: int = 10,
+    concurrency: int = 8,
+    limit: Optional[int] = None,
+    combined_rewrites: bool = False,
+    rerank_batch: int = 48,
+    reranker_backend: str = "llm",
+    dense_index_path: Optional[str] = None,
+    compress_contexts: bool = False,
+    cascade: Optional[CascadePolicy] = None,
+    log_path: Optional[str] = None,
+    resume: bool = False,
+    shard: Optional[Tuple[int, int]] = None,
+    distractor: bool = False,
 ) -> None:
     """
     Run the RAG pipeline on the entire HotpotQA dev set and write predictions to a JSON file.
 
-    Output format:
+    Output format (official HotpotQA prediction file):
         {
-            "<example_id>": "<predicted_answer>",
-            ...
+            "answer": {"<example_id>": "<predicted_answer>", ...},
+            "sp": {"<example_id>": [[title, sent_id], ...], ...}
         }
     where <example_id> is `_id` (or `id` if `_id` is missing) from the dev examples.
+
+    Each result is first appended to a JSONL log (`log_path`, by default the
+    output path with a .jsonl extension, see prediction_log.py), and the
+    output file is written from the log at the end. With `resume`, examples
+    already in the log are skipped.
+
+    `shard` = (i, N) only runs the examples whose id hashes to shard i of N
+    (see sharding.py for running and merging shards).
+
+    `distractor` uses distractor.DistractorPipeline: retrieval over the
+    sample's own context paragraphs, one answer per question, and
+    supporting facts; the index, rewrite and cascade options are ignored.
+
+    The per-question work is done by rag_pipeline.RAGPipeline.
+    Up to `concurrency` questions are processed at once (see scheduler.run_ordered).
+    `limit` stops after that many examples (e.g. for a quick smoke test).
+    `combined_rewrites` requests all three query reformulations in one LLM call.
+    `rerank_batch` is the most passages sent in one reranker call.
+    `reranker_backend` is "llm" (remote LLM scores), "cross-encoder" (local CPU model) or "none".
+    `dense_index_path` switches retrieval to hybrid BM25 + dense (see dense_index.py).
+    `compress_contexts` keeps only the best-matching sentences of each chunk (see compression.py).
+    `cascade` answers from the original question first and runs the other
+    trajectories only when the policy escalates (see cascade.py).
     """
-    # 1) Loads dev data
-    data = load_hotpot_json(dev_json_path)
+    # 1) Loads dev data (from the binary cache, built on first use)
+    data = load_hotpot_examples(dev_json_path)
 
     # 2) Initialise components once
-    completer = MistralCompleter()
-    rewriter = QuestionRewriter(completer)
-    multi_ret = MultiTrajectoryBM25Retriever(
-        index_path="data/index/bm25s_index",
-        store_path="data/index/bm25_store.pkl",
-    )
-
-    answer_gen = AnswerGenerator()
-    reranker = ContextReranker()
-
-    predictions: Dict[str, str] = {}
+    if distractor:
+        cascade = None
+        pipeline = DistractorPipeline.from_config(
+            top_k_for_answer=top_k_for_answer,
+            rerank_batch=rerank_batch,
+            reranker_backend=reranker_backend,
+            compress_contexts=compress_contexts,
+        )
+    else:
+        pipeline = RAGPipeline.from_config(
+            index_path="data/index/bm25s_index",
+            store_path="data/index/bm25_store.pkl",
+            top_k_for_answer=top_k_for_answer,
+            combined_rewrites=combined_rewrites,
+            rerank_batch=rerank_batch,
+            reranker_backend=reranker_backend,
+            dense_index_path=dense_index_path,
+            compress_contexts=compress_contexts,
+            cascade=cascade,
+        )
 
-    # 3) Loops over all dev examples
-    for idx, sample in enumerate(data):
-        if idx >= 10:
-            break
-        question = sample.get("question", "")
-        example_id = sample.get("_id") or sample.get("id")
+    # Every finished question is appended to the log straight away
+    log_path = log_path or os.path.splitext(output_path)[0] + ".jsonl"
+    done = read_prediction_log(log_path) if resume else {}
+    if resume:
+        print(f"[INFO] Resuming: {len(done)} examples already in {log_path}")
+    elif os.path.exists(log_path) and os.path.getsize(log_path) > 0:
+        backup = f"{log_path}.{time.strftime('%Y%m%d-%H%M%S')}.bak"
+        os.replace(log_path, backup)
+        print(f"[WARNING] {log_path} already existed; moved it to {backup} (use --resume to continue a run)")
+
+    # 3) Runs all dev examples (of this shard), several questions in flight at once
+    n_examples = min(len(data), limit) if limit is not None else len(data)
+    total = n_examples
+
+    def wanted(sample: Dict) -> bool:
+        example_id = _example_id(sample)
         if not example_id:
-            continue
-
-        # Multi-trajectory retrieval
-        traj_results = multi_ret.multi_trajectory_retrieve(
-            question=question,
-            rewriter=rewriter,
-            top_k_per_query=8,
+            return False
+        return shard is None or shard_of(example_id, shard[1]) == shard[0]
+
+    if shard is not None:
+        total = sum(1 for sample in islice(data, n_examples) if wanted(sample))
+        print(f"[INFO] Shard {shard[0]}/{shard[1]}: {total} examples")
+    samples = (
+        sample for sample in islice(data, n_examples)
+        if wanted(sample) and _example_id(sample) not in done
+    )
+    try:
+        with PredictionLog(log_path) as log:
+            for idx, result in enumerate(pipeline.run_batch(samples, concurrency=concurrency), len(done)):
+                log.append(result.to_dict())
+                if result.error is not None:
+                    print(f"[WARNING] Failed on {result.id}: {result.error!r}")
+                    continue
+
+                # Optional progress print every 100 examples
+                if (idx + 1) % 100 == 0:
+                    print(f"Processed {idx + 1} / {total} examples")
+                    if cascade is not None:
+                        print(f"[INFO] Cascade escalation rate so far: {cascade.stats()['escalation_rate']:.1%}")
+    finally:
+        pipeline.close()
+
+    # 4) Writes the Hotpot-format predictions from the log
+    n_predictions = finalize_predictions(log_path, output_path)
+    print(f"Saved predictions for {n_predictions} examples to {output_path}")
+
+    if cascade is not None:
+        c = cascade.stats()
+        print(
+            f"[INFO] Cascade escalated {c['escalated']} / {c['questions']} questions "
+            f"({c['escalation_rate']:.1%}), reasons: {c['reasons']}"
         )
 
-        candidate_answers: List[str] = []
-        trajectory_contexts: List[List[str]] = []
-
-        # Processes each trajectory
-        for info in traj_results.values():
-            docs = info["docs"]
-            retrieved_ctxs = [d["text"] for d in docs]
-
-            if not retrieved_ctxs:
-                continue
-
-            # Rerank
-            if reranker is not None:
-                rerank_scores = reranker.score(question, retrieved_ctxs)
-                reranked_local = sorted(range(len(retrieved_ctxs)), key=lambda i: rerank_scores[i], reverse=True)
-                ranked_ctxs = [retrieved_ctxs[i] for i in reranked_local]
-            else:
-                ranked_ctxs = retrieved_ctxs
-
-            # Select top-k
-            k = min(top_k_for_answer, len(ranked_ctxs))
-            selected_ctxs = ranked_ctxs[:k]
-
-            trajectory_contexts.append(selected_ctxs)
-
-            ans = answer_gen.generate_answer(question, selected_ctxs)
-            candidate_answers.append(ans)
-
-        # Merge contexts across trajectories (deduplicate) for scoring
-        merged_contexts = []
-        seen = set()
-        for ctx_list in trajectory_contexts:
-            for ctx in ctx_list:
-                if ctx not in seen:
-                    seen.add(ctx)
-                    merged_contexts.append(ctx)
-
-        answer_scores = answer_gen.score_candidate_answers(
-            question=question,
-            contexts=merged_contexts,
-            answers=candidate_answers,
+    # Prompt sizes per call type (tokens include the passages and the question)
+    for kind, s in get_default_assembler().stats().items():
+        print(
+            f"[INFO] {kind} prompts: {s['calls']} calls, mean {s['mean_prompt_tokens']:.0f} tokens, "
+            f"max {s['max_prompt_tokens']}, passages kept {s['passages_kept']}/{s['passages_in']} "
+            f"({s['truncated']} truncated, {s['duplicates']} duplicates)"
         )
 
-        def norm_ans(ans: str) -> str:
-            return ans.strip().lower()
-
-        def is_non_empty(ans: str) -> bool:
-            return norm_ans(ans) and norm_ans(ans) != "i cannot answer from the given context."
-
-        candidates_idx = list(range(len(candidate_answers)))
-        non_empty_idxs = [i for i in candidates_idx if is_non_empty(candidate_answers[i])]
-
-        # Majority vote first
-        freq = {}
-        for idx_candidate in candidates_idx:
-            key = norm_ans(candidate_answers[idx_candidate])
-            freq[key] = freq.get(key, []) + [idx_candidate]
-
-        def best_by_frequency(indices: List[int]) -> int:
-            if not indices:
-                return -1
-            groups = {}
-            for i in indices:
-                key = norm_ans(candidate_answers[i])
-                groups.setdefault(key, []).append(i)
-
-            def group_key(item):
-                key, idxs = item
-                count = len(idxs)
-                conf = max((answer_scores[i] if i < len(answer_scores) else 0.0) for i in idxs) if answer_scores else 0.0
-                fallback_penalty = 0 if key and key != "i cannot answer from the given context." else -1
-                return (fallback_penalty, count, conf)
-
-            best_group_key, best_group_idxs = max(groups.items(), key=group_key)
-            if answer_scores:
-                return max(best_group_idxs, key=lambda i: answer_scores[i] if i < len(answer_scores) else 0.0)
-            return best_group_idxs[0]
-
-        pool = non_empty_idxs if non_empty_idxs else candidates_idx
-        best_idx = best_by_frequency(pool)
-
-        if best_idx == -1:
-            final_answer = candidate_answers[0] if candidate_answers else ""
-        else:
-            final_answer = candidate_answers[best_idx]
 
-        predictions[example_id] = final_answer
+def main():
+    parser = argparse.ArgumentParser(description="Runs the RAG pipeline over the HotpotQA dev set")
+    # Adjust the path if your dev JSON is somewhere else
+    parser.add_argument("--dev", type=str, default="hotpot_dev_distractor_v1.json")
+    parser.add_argument("--out", type=str, default="predictions_dev.json")
+    parser.add_argument("--log", type=str, default=None, help="Prediction log (default: --out with .jsonl)")
+    parser.add_argument("--evaluate", action="store_true", help="Score the predictions with evaluation.py when done")
+    parser.add_argument("--resume", action="store_true", help="Skip examples already in the prediction log")
+    parser.add_argument("--shard", type=str, default=None, help="Only run shard i of N, e.g. 0/4 (see sharding.py)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight at once")
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N examples")
+    parser.add_argument("--rpm", type=float, default=None, help="LLM requests per minute limit")
+    parser.add_argument("--tpm", type=float, default=None, help="LLM tokens per minute limit")
+    parser.add_argument(
+        "--combined-rewrites",
+        action="store_true",
+        help="Request rewrites, decompositions and entity queries in one LLM call",
+    )
 
-        # Optional progress print every 100 examples
-        if (idx + 1) % 100 == 0:
-            print(f"Processed {idx + 1} / {len(data)} examples")
+    parser.add_argument(
+        "--distractor",
+        action="store_true",
+        help="Use each question's own context paragraphs instead of the index (fast, predicts supporting facts)",
+    )
+    parser.add_argument("--rerank-batch", type=int, default=48, help="Max passages per reranker call")
+    parser.add_argument("--reranker", type=str, default="llm", choices=RERANKER_BACKENDS)
+    parser.add_argument("--dense-index", type=str, default=None, help="Dense index dir for hybrid retrieval")
+    parser.add_argument("--compress", action="store_true", help="Send only the best sentences of each chunk")
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Answer from the original question first; run the other trajectories only if needed",
+    )
+    parser.add_argument("--cascade-min-margin", type=float, default=0.1, help="Min relative top1/top2 retrieval score gap")
+    parser.add_argument("--cascade-min-rerank", type=float, default=0.5, help="Min best reranker score")
+    parser.add_argument("--cascade-min-conf", type=float, default=0.7, help="Min answer confidence (0 skips the scoring call)")
+    parser.add_argument("--answer-budget", type=int, default=None, help="Token budget of an answer prompt")
+    parser.add_argument("--rerank-budget", type=int, default=None, help="Token budget of a rerank prompt")
+    parser.add_argument("--score-budget", type=int, default=None, help="Token budget of an answer-scoring prompt")
+
+    args = parser.parse_args()
+
+    if args.rpm or args.tpm:
+        set_default_client(LLMClient(requests_per_minute=args.rpm, tokens_per_minute=args.tpm))
+
+    budgets = {"answer": args.answer_budget, "rerank": args.rerank_budget, "score": args.score_budget}
+    budgets = {kind: n for kind, n in budgets.items() if n is not None}
+    if budgets:
+        set_default_assembler(PromptAssembler(budgets=budgets))
+
+    shard = None
+    output_path = args.out
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as exc:
+            parser.error(str(exc))
+        root, ext = os.path.splitext(args.out)
+        output_path = root + shard_suffix(*shard) + ext
+
+    cascade = None
+    if args.cascade:
+        cascade = CascadePolicy(
+            min_bm25_margin=args.cascade_min_margin,
+            min_rerank_score=args.cascade_min_rerank,
+            min_answer_conf=args.cascade_min_conf,
+        )
+
+    run_full_dev(
+        dev_json_path=args.dev,
+        output_path=output_path,
+        top_k_for_answer=args.top_k,
+        concurrency=args.concurrency,
+        limit=args.limit,
+        combined_rewrites=args.combined_rewrites,
+        rerank_batch=args.rerank_batch,
+        reranker_backend=args.reranker,
+        dense_index_path=args.dense_index,
+        compress_contexts=args.compress,
+        cascade=cascade,
+        log_path=args.log,
+        resume=args.resume,
+        shard=shard,
+        distractor=args.distractor,
+    )
 
-    # 4) Write predictions to JSON
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(predictions, f, ensure_ascii=False, indent=2)
+    # A shard only covers part of the dev set; evaluate after sharding.py merge
+    if args.evaluate:
+        if shard is not None:
+            print("[WARNING] --evaluate is skipped for a shard (use sharding.py merge --evaluate)")
+        else:
+            from evaluation import eval as evaluate
 
-    print(f"Saved predictions for {len(predictions)} examples to {output_path}")
+            evaluate(output_path, args.dev)
 
 
 if __name__ == "__main__":
-    # Adjust the path if your dev JSON is somewhere else
-    run_full_dev(
-        dev_json_path="hotpot_dev_distractor_v1.json",
-        output_path="predictions_dev.json",
-        top_k_for_answer=5,
-    )
+    main()
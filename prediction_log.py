@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Dict, Any
+
+"""
+Append-only JSONL log of per-question predictions, so a long dev run survives
+crashes and can be resumed
+
+    with PredictionLog("predictions_dev.jsonl") as log:
+        log.append({"id": ..., "answer": ..., ...})
+
+    done = read_prediction_log("predictions_dev.jsonl")   # {id: record}
+    finalize_predictions("predictions_dev.jsonl", "predictions_dev.json")
+
+Every record is flushed to the OS as soon as it is written, so a crashed
+process loses nothing. fsync is batched (every `fsync_every` records or
+`fsync_interval_s` seconds), so a machine crash loses at most one batch.
+A torn last line from a crash is skipped when reading.
+
+Records with an "error" key mark failed questions; they are not counted as
+done, so a resumed run retries them. When an id appears more than once the
+last record wins.
+
+To finalize by hand:
+python prediction_log.py --log predictions_dev.jsonl --out predictions_dev.json
+"""
+
+
+class PredictionLog:
+    def __init__(self, path: str, fsync_every: int = 32, fsync_interval_s: float = 2.0):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval_s = fsync_interval_s
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+        # A torn last line from a crash must not swallow the next record
+        if self._f.tell() > 0:
+            with open(path, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    self._f.write("\n")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval_s:
+                self._sync_locked()
+
+    def _sync_locked(self) -> None:
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            self._sync_locked()
+            self._f.close()
+
+    def __enter__(self) -> "PredictionLog":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def read_prediction_log(path: str, include_errors: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    {id: last record} from a prediction log (empty if the file does not exist)
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return records
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[WARNING] Skipping unreadable line {line_no} of {path} (torn write?)")
+                continue
+            if record.get("error") is not None and not include_errors:
+                continue
+            records[record["id"]] = record
+    return records
+
+
+def to_hotpot_predictions(records: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Official HotpotQA prediction format: {"answer": {id: str}, "sp": {id: [[title, sent_id], ...]}}
+    """
+    return {
+        "answer": {example_id: r.get("answer", "") for example_id, r in records.items()},
+        "sp": {example_id: r.get("sp", []) for example_id, r in records.items()},
+    }
+
+
+def write_json_atomic(obj: Any, path: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def finalize_predictions(log_path: str, output_path: str) -> int:
+    """
+    Writes the Hotpot-format prediction JSON from the log; returns the number of predictions
+    """
+    records = read_prediction_log(log_path)
+    write_json_atomic(to_hotpot_predictions(records), output_path)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turns a prediction log into a HotpotQA prediction file")
+    parser.add_argument("--log", type=str, default="predictions_dev.jsonl")
+    parser.add_argument("--out", type=str, default="predictions_dev.json")
+
+    args = parser.parse_args()
+
+    n = finalize_predictions(args.log, args.out)
+    print(f"Saved predictions for {n} examples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import os
+import re
+import threading
+from typing import List, Dict, Optional, Any, Tuple
+
+"""
+Token-budgeted assembly of the context passages that go into a prompt
+
+Every LLM helper that pastes passages into a prompt (AnswerGenerator,
+ContextReranker, score_candidate_answers) runs them through a PromptAssembler
+first:
+
+    kept, positions = assembler.fit("answer", contexts, fixed_text=question)
+
+fit() drops duplicate passages, cuts any passage longer than
+`max_passage_tokens`, then keeps passages in the given (ranked) order until
+the per-kind budget is used up. The last passage that only partly fits is
+truncated, and everything after it is dropped. With spread=True (used by the
+reranker, which must see every passage) the budget is split evenly across
+passages first, so long lists are truncated rather than cut off.
+
+`positions[i]` is the index in `kept` of original passage i, or None if it
+was dropped. Duplicates point at their first copy, so per-passage scores can
+be mapped back.
+
+Tokens are counted with a local tokenizer when PROMPT_TOKENIZER names one (a
+Hugging Face tokenizer id or a tokenizer.json path, loaded with the
+`tokenizers` package), otherwise with the same ~4 characters per token
+estimate the rate limiter uses.
+
+assembler.stats() reports prompt sizes per kind (calls, mean/max tokens,
+passages in/kept/truncated/dropped). The first time a budget truncates or
+drops passages of a kind, a warning is printed.
+"""
+
+DEFAULT_MAX_PASSAGE_TOKENS = 320
+# Tokens per call for everything that is not the passages' own template text.
+# Reranker prompts have no default budget: their size is already bounded by
+# the reranker batch size x DEFAULT_MAX_PASSAGE_TOKENS, and a budget below
+# that would truncate every passage (--rerank-budget sets one explicitly).
+DEFAULT_BUDGETS: Dict[str, Optional[int]] = {"answer": 2000, "rerank": None, "score": 3000}
+# A passage truncated to fewer tokens than this is dropped instead
+MIN_PASSAGE_TOKENS = 24
+
+_WS_RE = re.compile(r"\s+")
+
+
+class TokenCounter:
+    """
+    count(text) and truncate(text, n_tokens) with a local tokenizer or a char estimate
+    """
+
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self.tokenizer_name = tokenizer_name or os.environ.get("PROMPT_TOKENIZER") or None
+        self._tokenizer: Any = None
+        if self.tokenizer_name:
+            try:
+                from tokenizers import Tokenizer
+
+                if os.path.isfile(self.tokenizer_name):
+                    self._tokenizer = Tokenizer.from_file(self.tokenizer_name)
+                else:
+                    self._tokenizer = Tokenizer.from_pretrained(self.tokenizer_name)
+            except Exception as exc:
+                print(f"[WARNING] Could not load tokenizer {self.tokenizer_name!r} ({exc!r}); estimating tokens")
+                self._tokenizer = None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, n_tokens: int) -> str:
+        """
+        The longest prefix of `text` with at most `n_tokens` tokens, cut at a word boundary
+        """
+        if n_tokens <= 0:
+            return ""
+        if self._tokenizer is not None:
+            enc = self._tokenizer.encode(text, add_special_tokens=False)
+            if len(enc.ids) <= n_tokens:
+                return text
+            cut = enc.offsets[n_tokens][0]
+        else:
+            if len(text) <= 4 * n_tokens:
+                return text
+            cut = 4 * n_tokens
+
+        head = text[:cut]
+        space = head.rfind(" ")
+        if space > cut // 2:
+            head = head[:space]
+        return head.rstrip() + " ..."
+
+
+class PromptAssembler:
+    """
+    Fits passages to a per-call token budget and keeps prompt size stats. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, Optional[int]]] = None,
+        max_passage_tokens: Optional[int] = DEFAULT_MAX_PASSAGE_TOKENS,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.budgets: Dict[str, Optional[int]] = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.max_passage_tokens = max_passage_tokens
+        self.counter = counter or TokenCounter()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._warned: set = set()
+
+    def fit(
+        self,
+        kind: str,
+        contexts: List[str],
+        fixed_text: str = "",
+        spread: bool = False,
+    ) -> Tuple[List[str], List[Optional[int]]]:
+        """
+        Returns (kept passages, position in `kept` of each original passage or None)
+
+        `fixed_text` is the rest of the prompt (system prompt, question, ...),
+        which is counted against the budget too.
+        """
+        budget = self.budgets.get(kind)
+        fixed_tokens = self.counter.count(fixed_text)
+
+        # 1) Dedupe (whitespace-insensitive); duplicates share their first copy
+        unique: List[str] = []
+        first_of: Dict[str, int] = {}
+        unique_idx: List[int] = []
+        for ctx in contexts:
+            key = _WS_RE.sub(" ", ctx).strip()
+            if key not in first_of:
+                first_of[key] = len(unique)
+                unique.append(ctx)
+            unique_idx.append(first_of[key])
+
+        # 2) Per-passage cap (an even share of the budget when spreading)
+        cap = self.max_passage_tokens
+        if budget is not None and spread and unique:
+            share = max(MIN_PASSAGE_TOKENS, (budget - fixed_tokens) // len(unique))
+            cap = min(cap, share) if cap else share
+
+        truncated = 0
+        sized: List[Tuple[str, int]] = []
+        for ctx in unique:
+            n = self.counter.count(ctx)
+            if cap and n > cap:
+                ctx = self.counter.truncate(ctx, cap)
+                n = self.counter.count(ctx)
+                truncated += 1
+            sized.append((ctx, n))
+
+        # 3) Keeps passages in rank order while they fit
+        kept: List[str] = []
+        remaining = None if budget is None else budget - fixed_tokens
+        for ctx, n in sized:
+            if remaining is not None and n > remaining:
+                if remaining >= MIN_PASSAGE_TOKENS:
+                    kept.append(self.counter.truncate(ctx, remaining))
+                    truncated += 1
+                    remaining = 0
+                break
+            kept.append(ctx)
+            if remaining is not None:
+                remaining -= n
+
+        positions = [u if u < len(kept) else None for u in unique_idx]
+
+        # The max_passage_tokens cap alone is expected; anything below it is the budget
+        if budget is not None and (len(kept) < len(unique) or (cap or 0) < (self.max_passage_tokens or 0)):
+            self._warn_once(kind, budget, cap, len(unique) - len(kept))
+
+        prompt_tokens = fixed_tokens + sum(self.counter.count(c) for c in kept)
+        self._record(
+            kind,
+            prompt_tokens=prompt_tokens,
+            passages_in=len(contexts),
+            passages_kept=len(kept),
+            duplicates=len(contexts) - len(unique),
+            truncated=truncated,
+        )
+        return kept, positions
+
+    def _warn_once(self, kind: str, budget: int, cap: Optional[int], dropped: int) -> None:
+        with self._lock:
+            if kind in self._warned:
+                return
+            self._warned.add(kind)
+        print(
+            f"[WARNING] The {kind} prompt budget ({budget} tokens) cuts passages "
+            f"(cap {cap} tokens per passage, {dropped} dropped in this call); "
+            f"raise the {kind!r} budget if this is not intended "
+            f"(PromptAssembler(budgets=...), --{kind}-budget in predict_full.py)"
+        )
+
+    def _record(self, kind: str, prompt_tokens: int, **counts: int) -> None:
+        with self._lock:
+            s = self._stats.setdefault(
+                kind,
+                {"calls": 0, "prompt_tokens": 0, "max_prompt_tokens": 0,
+                 "passages_in": 0, "passages_kept": 0, "duplicates": 0, "truncated": 0},
+            )
+            s["calls"] += 1
+            s["prompt_tokens"] += prompt_tokens
+            s["max_prompt_tokens"] = max(s["max_prompt_tokens"], prompt_tokens)
+            for key, n in counts.items():
+                s[key] += n
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            stats = {kind: dict(s) for kind, s in self._stats.items()}
+        for s in stats.values():
+            s["mean_prompt_tokens"] = s["prompt_tokens"] / s["calls"] if s["calls"] else 0.0
+        return stats
+
+
+_default_assembler: Optional[PromptAssembler] = None
+_default_assembler_lock = threading.Lock()
+
+
+def get_default_assembler() -> PromptAssembler:
+    """
+    Process-wide shared PromptAssembler (shared stats), created on first use
+    """
+    global _default_assembler
+    if _default_assembler is None:
+        with _default_assembler_lock:
+            if _default_assembler is None:
+                _default_assembler = PromptAssembler()
+    return _default_assembler
+
+
+def set_default_assembler(assembler: Optional[PromptAssembler]) -> None:
+    global _default_assembler
+    with _default_assembler_lock:
+        _default_assembler = assembler
@@ -1,5 +1,7 @@
-from typing import List
-from llm_query_utils import MistralCompleter
+import asyncio
+import json
+from typing import List, Dict, Optional
+from llm_query_utils import MistralCompleter, AsyncMistralCompleter
 
 
 class QuestionRewriter:
@@ -11,14 +13,20 @@ class QuestionRewriter:
     - entity-focused queries
 
     All prompts are tuned for the BM25 retrieval.
+
+    With combined=True, all_query_sets() asks for the rewrites, decompositions
+    and entity queries in one JSON-structured call instead of three, and falls
+    back to the per-type prompt for any set it cannot parse.
     """
 
-    def __init__(self, completer: MistralCompleter | None = None):
+    def __init__(self, completer: MistralCompleter | None = None, combined: bool = False):
         self.llm = completer or MistralCompleter()
+        self.combined = combined
 
     # 1) Simple lexical rewrites
-    def simple_rewrites(self, question: str, n: int = 2) -> List[str]:
-        prompt = f"""
+    @staticmethod
+    def _simple_rewrites_prompt(question: str, n: int) -> str:
+        return f"""
         Your job is to create lexical rewrites of the following question {n} different ways, keeping the meaning exactly
         the same. The rewrites will be used for lexical (BM25) search.
 
@@ -32,13 +40,20 @@ class QuestionRewriter:
         Question:
         "{question}"
         """
-        resp = self.llm.complete(prompt)
-        rewrites = [ln.strip("- ").strip() for ln in resp.splitlines() if ln.strip()]
-        return rewrites[:n]
+
+    @staticmethod
+    def _parse_lines(resp: str, limit: int) -> List[str]:
+        lines = [ln.strip("- ").strip() for ln in resp.splitlines() if ln.strip()]
+        return lines[:limit]
+
+    def simple_rewrites(self, question: str, n: int = 2) -> List[str]:
+        resp = self.llm.complete(self._simple_rewrites_prompt(question, n))
+        return self._parse_lines(resp, n)
 
     # 2) Semantic decomposition
-    def semantic_decomposition(self, question: str, max_steps: int = 3) -> List[str]:
-        prompt = f"""
+    @staticmethod
+    def _decomposition_prompt(question: str, max_steps: int) -> str:
+        return f"""
         You are decomposing complex questions for multi-hop question answering over Wikipedia.
 
         Your task is to split the original question into up to {max_steps} atomic subquestions
@@ -83,14 +98,14 @@ class QuestionRewriter:
         "{question}"
         """
 
-        resp = self.llm.complete(prompt)
-        subs = [ln.strip("- ").strip() for ln in resp.splitlines() if ln.strip()]
-        return subs[:max_steps]
+    def semantic_decomposition(self, question: str, max_steps: int = 3) -> List[str]:
+        resp = self.llm.complete(self._decomposition_prompt(question, max_steps))
+        return self._parse_lines(resp, max_steps)
 
     # 3) Entity-focused queries
-    def entity_focused(self, question: str, max_entities: int = 3) -> List[str]:
-        
-        prompt = f"""
+    @staticmethod
+    def _entity_prompt(question: str, max_entities: int) -> str:
+        return f"""
         Identify up to {max_entities} important entities (people, places, organizations,
         works, events, dates, objects etc.) mentioned in this question.
 
@@ -118,8 +133,8 @@ class QuestionRewriter:
         "{question}"
         """
 
-
-        resp = self.llm.complete(prompt)
+    @staticmethod
+    def _parse_entity_queries(resp: str, max_entities: int) -> List[str]:
         queries: List[str] = [  ]
         for ln in resp.splitlines():
             ln = ln.strip()
@@ -129,6 +144,156 @@ class QuestionRewriter:
             queries.append(q.strip())
         return queries[:max_entities]
 
+    def entity_focused(self, question: str, max_entities: int = 3) -> List[str]:
+        resp = self.llm.complete(self._entity_prompt(question, max_entities))
+        return self._parse_entity_queries(resp, max_entities)
+
+    # 4) All three query sets in a single call
+    @staticmethod
+    def _combined_prompt(question: str, n_rewrites: int, max_steps: int, max_entities: int) -> str:
+        return f"""
+        Create search queries for lexical (BM25) retrieval over Wikipedia for a multi-hop question.
+        Produce three sets:
+
+        "rewrite": {n_rewrites} lexical rewrites of the question with exactly the same meaning.
+        Keep all important names and nouns exactly as they appear and keep the sentence structure simple.
+
+        "decomp": up to {max_steps} atomic subquestions, one per reasoning step, in logical order.
+        Each must be self-contained, focus on ONE concrete fact, and must not just paraphrase the question.
+        Do NOT introduce new entity names; describe unknown entities instead (e.g. "the author of Harry Potter").
+
+        "entity": up to {max_entities} queries, each focused on one important entity (person, place,
+        organization, work, event, date, object) in the question, including the entity name exactly
+        and optionally a relevant relation from the question.
+
+        Guidelines for every query:
+        - No pronouns like "he", "she", "they", "it"; repeat entity names explicitly.
+        - Under 20 words.
+
+        Example:
+        Question: "Were Scott Derrickson and Ed Wood of the same nationality?"
+        Output:
+        {{"rewrite": ["Did Scott Derrickson and Ed Wood have the same nationality?"],
+         "decomp": ["What is the nationality of Scott Derrickson?", "What is the nationality of Ed Wood?"],
+         "entity": ["Scott Derrickson nationality", "Ed Wood nationality"]}}
+
+        Return ONLY a JSON object with the keys "rewrite", "decomp" and "entity",
+        each mapping to a list of strings.
+
+        Question:
+        "{question}"
+        """
+
+    @staticmethod
+    def _parse_combined(resp: str, limits: Dict[str, int]) -> Dict[str, Optional[List[str]]]:
+        """
+        Parses the combined JSON response
+        A set that is missing or malformed comes back as None (so it can be re-requested)
+        """
+        parsed = None
+        try:
+            parsed = json.loads(resp)
+        except Exception:
+            start = resp.find("{")
+            end = resp.rfind("}")
+            if start != -1 and end > start:
+                try:
+                    parsed = json.loads(resp[start : end + 1])
+                except Exception:
+                    parsed = None
+        if not isinstance(parsed, dict):
+            parsed = {}
+
+        sets: Dict[str, Optional[List[str]]] = {}
+        for key, limit in limits.items():
+            values = parsed.get(key)
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                sets[key] = None
+                continue
+            # An explicit empty list is a valid answer (e.g. nothing to decompose)
+            queries = [v.strip() for v in values if v.strip()]
+            sets[key] = queries[:limit]
+        return sets
+
+    def all_query_sets(
+        self,
+        question: str,
+        n_rewrites: int = 3,
+        max_steps: int = 3,
+        max_entities: int = 3,
+    ) -> Dict[str, List[str]]:
+        """
+        Returns {"rewrite": [...], "decomp": [...], "entity": [...]}
+        One LLM call in combined mode (plus a per-type call for any set that
+        failed to parse), otherwise three calls
+        """
+        limits = {"rewrite": n_rewrites, "decomp": max_steps, "entity": max_entities}
+        sets: Dict[str, Optional[List[str]]] = {key: None for key in limits}
+
+        if self.combined:
+            resp = self.llm.complete(self._combined_prompt(question, n_rewrites, max_steps, max_entities))
+            sets = self._parse_combined(resp, limits)
+
+        if sets["rewrite"] is None:
+            sets["rewrite"] = self.simple_rewrites(question, n=n_rewrites)
+        if sets["decomp"] is None:
+            sets["decomp"] = self.semantic_decomposition(question, max_steps=max_steps)
+        if sets["entity"] is None:
+            sets["entity"] = self.entity_focused(question, max_entities=max_entities)
+        return sets
+
+
+class AsyncQuestionRewriter(QuestionRewriter):
+    """
+    asyncio version of QuestionRewriter (same prompts and parsing)
+    """
+
+    def __init__(self, completer: AsyncMistralCompleter | None = None, combined: bool = False):
+        self.llm = completer or AsyncMistralCompleter()
+        self.combined = combined
+
+    async def simple_rewrites(self, question: str, n: int = 2) -> List[str]:
+        resp = await self.llm.complete(self._simple_rewrites_prompt(question, n))
+        return self._parse_lines(resp, n)
+
+    async def semantic_decomposition(self, question: str, max_steps: int = 3) -> List[str]:
+        resp = await self.llm.complete(self._decomposition_prompt(question, max_steps))
+        return self._parse_lines(resp, max_steps)
+
+    async def entity_focused(self, question: str, max_entities: int = 3) -> List[str]:
+        resp = await self.llm.complete(self._entity_prompt(question, max_entities))
+        return self._parse_entity_queries(resp, max_entities)
+
+    async def all_query_sets(
+        self,
+        question: str,
+        n_rewrites: int = 3,
+        max_steps: int = 3,
+        max_entities: int = 3,
+    ) -> Dict[str, List[str]]:
+        """
+        Returns {"rewrite": [...], "decomp": [...], "entity": [...]}
+        One call in combined mode, otherwise the three reformulations run concurrently;
+        any set that failed to parse is re-requested with its own prompt
+        """
+        limits = {"rewrite": n_rewrites, "decomp": max_steps, "entity": max_entities}
+        sets: Dict[str, Optional[List[str]]] = {key: None for key in limits}
+
+        if self.combined:
+            resp = await self.llm.complete(self._combined_prompt(question, n_rewrites, max_steps, max_entities))
+            sets = self._parse_combined(resp, limits)
+
+        fallbacks = {
+            "rewrite": lambda: self.simple_rewrites(question, n=n_rewrites),
+            "decomp": lambda: self.semantic_decomposition(question, max_steps=max_steps),
+            "entity": lambda: self.entity_focused(question, max_entities=max_entities),
+        }
+        missing = [key for key in limits if sets[key] is None]
+        results = await asyncio.gather(*[fallbacks[key]() for key in missing])
+        for key, queries in zip(missing, results):
+            sets[key] = queries
+        return sets
+
 
 # Simple CLI so I can manually test the question reformulating
 if __name__ == "__main__":
@@ -139,31 +304,39 @@ if __name__ == "__main__":
     parser.add_argument("--n-rewrites", type=int, default=3)
     parser.add_argument("--n-decomp", type=int, default=3)
     parser.add_argument("--n-entities", type=int, default=3)
+    parser.add_argument("--combined", action="store_true", help="Request all three query sets in one call")
 
     args = parser.parse_args()
 
-    rewriter = QuestionRewriter()
+    rewriter = QuestionRewriter(combined=args.combined)
 
     print("=" * 80)
     print("Original question:")
     print(args.question)
     print()
 
-    rewrites = rewriter.simple_rewrites(args.question, n=args.n_rewrites)
+    query_sets = rewriter.all_query_sets(
+        args.question,
+        n_rewrites=args.n_rewrites,
+        max_steps=args.n_decomp,
+        max_entities=args.n_entities,
+    )
+
+    rewrites = query_sets["rewrite"]
     print("=" * 80)
     print("Simple rewrites:")
     for i, q in enumerate(rewrites, 1):
         print(f"{i}. {q}")
     print()
 
-    decomps = rewriter.semantic_decomposition(args.question, max_steps=args.n_decomp)
+    decomps = query_sets["decomp"]
     print("=" * 80)
     print("Semantic decompositions:")
     for i, q in enumerate(decomps, 1):
         print(f"{i}. {q}")
     print()
 
-    entities = rewriter.entity_focused(args.question, max_entities=args.n_entities)
+    entities = query_sets["entity"]
     print("=" * 80)
     print("Entity-focused queries:")
     for i, q in enumerate(entities, 1):
@@ -0,0 +1,331 @@
+import time
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Callable
+
+from llm_pipeline import AnswerGenerator
+from llm_query_utils import MistralCompleter
+from question_reformulating import QuestionRewriter
+from multi_BM25_retrieval import MultiTrajectoryBM25Retriever, TRAJECTORY_ORDER
+from cascade import CascadePolicy
+from compression import SentenceCompressor, IDFTable
+from reranking import UnionReranker, make_reranker
+from scheduler import run_ordered
+from supporting_facts import align_to_context, predict_supporting_facts
+from voting import IncrementalVote, select_answer
+
+"""
+The multi-trajectory RAG engine shared by predict_full.py and predict_sample.py
+
+    pipeline = RAGPipeline.from_config(reranker_backend="llm", cascade=CascadePolicy())
+    result = pipeline.run_question(sample)                  # one question
+    for result in pipeline.run_batch(samples, concurrency=16):   # many, in input order
+        print(result.id, result.answer, result.timings)
+
+Per question:
+  retrieve  rewrite -> retrieve chain per trajectory (concurrent)
+  rerank    the union of all candidates, scored once (UnionReranker)
+  select    top-k contexts per trajectory (optionally sentence-compressed)
+  generate  answers until the vote is settled (IncrementalVote)
+  score     answer confidences, only if the vote is not unanimous
+  support   supporting facts: the winning trajectory's chunks aligned to the
+            sample's context paragraphs (local, see supporting_facts.py)
+
+Every stage is a constructor argument, so any of them can be swapped
+(e.g. a cross-encoder reranker, a hybrid retriever, a different voter).
+With a CascadePolicy the original trajectory runs alone first and the other
+trajectories only run when it escalates.
+"""
+
+
+class QuestionResult:
+    """
+    Outcome of one question
+
+      trajectories  {name: {"queries": [...], "contexts": [...], "docs": [...], "answer": str or None}}
+                    (docs: the retrieved chunks behind the contexts)
+                    (answer None: not generated because the vote was settled)
+      candidates    [(trajectory name, answer)] that took part in the vote
+      scores        confidences aligned with candidates ([] if scoring was skipped)
+      chosen        name of the trajectory whose answer won
+      escalation    cascade reason, or None (not escalated / no cascade)
+      sp            supporting facts [[title, sentence index], ...] ([] if not predicted)
+      timings       wall-clock seconds per stage plus "total"
+    """
+
+    def __init__(self, example_id: Optional[str], question: str):
+        self.id = example_id
+        self.question = question
+        self.answer = ""
+        self.trajectories: Dict[str, Dict[str, Any]] = {}
+        self.candidates: List[tuple] = []
+        self.scores: List[float] = []
+        self.chosen: Optional[str] = None
+        self.escalation: Optional[str] = None
+        self.sp: List[list] = []
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[BaseException] = None
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "question": self.question,
+            "answer": self.answer,
+            "chosen": self.chosen,
+            "candidates": [list(c) for c in self.candidates],
+            "scores": self.scores,
+            "escalation": self.escalation,
+            "sp": self.sp,
+            "timings": self.timings,
+            "error": repr(self.error) if self.error is not None else None,
+        }
+
+
+class RAGPipeline:
+    def __init__(
+        self,
+        retriever: MultiTrajectoryBM25Retriever,
+        rewriter: QuestionRewriter,
+        generator: AnswerGenerator,
+        reranker: Optional[UnionReranker] = None,
+        compressor: Optional[SentenceCompressor] = None,
+        cascade: Optional[CascadePolicy] = None,
+        voter: Callable[[int], IncrementalVote] = IncrementalVote,
+        top_k_for_answer: int = 5,
+        top_k_per_query: int = 8,
+    ):
+        self.retriever = retriever
+        self.rewriter = rewriter
+        self.generator = generator
+        self.reranker = reranker
+        self.compressor = compressor
+        self.cascade = cascade
+        self.voter = voter
+        self.top_k_for_answer = top_k_for_answer
+        self.top_k_per_query = top_k_per_query
+
+    @classmethod
+    def from_config(
+        cls,
+        index_path: str = "data/index/bm25s_index",
+        store_path: str = "data/index/bm25_store.pkl",
+        top_k_for_answer: int = 5,
+        combined_rewrites: bool = False,
+        rerank_batch: int = 48,
+        reranker_backend: str = "llm",
+        dense_index_path: Optional[str] = None,
+        compress_contexts: bool = False,
+        cascade: Optional[CascadePolicy] = None,
+    ) -> "RAGPipeline":
+        """
+        Builds the default components (what the drivers' CLI flags select)
+        """
+        retriever = MultiTrajectoryBM25Retriever(
+            index_path=index_path,
+            store_path=store_path,
+            dense_index_path=dense_index_path,
+        )
+        # Sentence scores use the BM25 index's own IDF, so no extra model is loaded
+        compressor = SentenceCompressor(IDFTable.from_bm25(retriever.bm25.retriever)) if compress_contexts else None
+        # Scores each distinct chunk once per question (union of all trajectories)
+        backend = make_reranker(reranker_backend)
+        reranker = UnionReranker(backend, max_batch=rerank_batch) if backend is not None else None
+
+        return cls(
+            retriever=retriever,
+            rewriter=QuestionRewriter(MistralCompleter(), combined=combined_rewrites),
+            generator=AnswerGenerator(),
+            reranker=reranker,
+            compressor=compressor,
+            cascade=cascade,
+            top_k_for_answer=top_k_for_answer,
+        )
+
+    def _run_trajectories(self, question: str, names: List[str], result: QuestionResult) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve -> rerank (union) -> select for the given trajectories
+
+        Returns only trajectories that have contexts: {name: {"queries", "docs", "result": contexts}}
+        """
+        marks = {"start": time.perf_counter()}
+        selected: Dict[str, List[Dict[str, Any]]] = {}
+
+        def rerank_union(trajectories: Dict[str, Dict[str, Any]]) -> None:
+            marks["barrier"] = time.perf_counter()
+            if self.reranker is not None:
+                self.reranker.score_union(question, [info["docs"] for info in trajectories.values()])
+            marks["reranked"] = time.perf_counter()
+
+        def rerank_and_select(name: str, queries: List[str], docs: List[Dict[str, Any]]) -> Optional[List[str]]:
+            if not docs:
+                return None
+
+            # A lookup: the union of all trajectories was scored once
+            ranked_docs = self.reranker.rank(question, docs) if self.reranker is not None else docs
+            selected_docs = ranked_docs[: self.top_k_for_answer]
+            selected[name] = selected_docs
+            contexts = [d["text"] for d in selected_docs]
+
+            # Keeps only the sentences that match the question / sub-queries
+            if self.compressor is not None:
+                contexts = self.compressor.compress(
+                    question,
+                    contexts,
+                    titles=[d["meta"].get("title") for d in selected_docs],
+                    queries=queries,
+                )
+            return contexts
+
+        trajectories = self.retriever.run_trajectories(
+            question=question,
+            rewriter=self.rewriter,
+            top_k_per_query=self.top_k_per_query,
+            process_fn=rerank_and_select,
+            barrier_fn=rerank_union,
+            trajectories=names,
+        )
+        end = time.perf_counter()
+        barrier = marks.get("barrier", end)
+        reranked = marks.get("reranked", end)
+        result.add_time("retrieve", barrier - marks["start"])
+        result.add_time("rerank", reranked - barrier)
+        result.add_time("select", end - reranked)
+
+        for name, info in trajectories.items():
+            result.trajectories[name] = {
+                "queries": info["queries"],
+                "contexts": info["result"],
+                "docs": selected.get(name, []),
+                "answer": None,
+            }
+        return {name: info for name, info in trajectories.items() if info["result"] is not None}
+
+    def _score(self, question: str, contexts: List[str], answers: List[str], result: QuestionResult) -> List[float]:
+        t0 = time.perf_counter()
+        scores = self.generator.score_candidate_answers(question=question, contexts=contexts, answers=answers)
+        result.add_time("score", time.perf_counter() - t0)
+        return scores
+
+    def run_question(self, sample: Dict[str, Any]) -> QuestionResult:
+        """
+        Runs one HotpotQA example (or any dict with a "question")
+        """
+        question = sample.get("question", "")
+        result = QuestionResult(sample.get("_id") or sample.get("id"), question)
+        start = time.perf_counter()
+        try:
+            self._answer(sample, result)
+        finally:
+            result.timings["total"] = time.perf_counter() - start
+        return result
+
+    def _answer(self, sample: Dict[str, Any], result: QuestionResult) -> None:
+        self._vote(result.question, result)
+
+        if result.chosen is not None and sample.get("context"):
+            t0 = time.perf_counter()
+            paragraphs = align_to_context(result.trajectories[result.chosen]["docs"], sample["context"])
+            result.sp = predict_supporting_facts(result.question, result.answer, paragraphs)
+            result.add_time("support", time.perf_counter() - t0)
+
+    def _vote(self, question: str, result: QuestionResult) -> None:
+        # (trajectory name, contexts, answer) for every generated answer
+        answered: List[tuple] = []
+
+        if self.cascade is None:
+            trajectories = self._run_trajectories(question, TRAJECTORY_ORDER, result)
+            vote = self.voter(len(trajectories))
+        else:
+            # Cheap first: the original question alone, escalated only if needed
+            first = self._run_trajectories(question, ["original"], result).get("original")
+            if first is not None:
+                contexts = first["result"]
+                t0 = time.perf_counter()
+                ans = self.generator.generate_answer(question, contexts)
+                result.add_time("generate", time.perf_counter() - t0)
+                result.trajectories["original"]["answer"] = ans
+                result.escalation = self.cascade.escalation_reason(
+                    ans,
+                    first["docs"],
+                    rerank_scores=self.reranker.scores(question, first["docs"]) if self.reranker else None,
+                    answer_conf_fn=lambda: self._score(question, contexts, [ans], result)[0],
+                )
+                if result.escalation is None:
+                    result.answer, result.chosen = ans, "original"
+                    result.candidates = [("original", ans)]
+                    return
+                answered.append(("original", contexts, ans))
+            else:
+                result.escalation = self.cascade.escalation_reason(None, [])
+
+            trajectories = self._run_trajectories(
+                question, [name for name in TRAJECTORY_ORDER if name != "original"], result
+            )
+            vote = self.voter(len(answered) + len(trajectories))
+            for _, _, ans in answered:
+                vote.add(ans)
+
+        # Generates answers until the vote can no longer change (see voting.py)
+        names = list(trajectories)
+        t0 = time.perf_counter()
+        answers = vote.run(
+            [(lambda ctxs=trajectories[name]["result"]: self.generator.generate_answer(question, ctxs)) for name in names]
+        )
+        result.add_time("generate", time.perf_counter() - t0)
+        for name, ans in zip(names, answers):
+            result.trajectories[name]["answer"] = ans
+            if ans is not None:
+                answered.append((name, trajectories[name]["result"], ans))
+
+        result.candidates = [(name, ans) for name, _, ans in answered]
+        if not answered:
+            return
+
+        # Unanimous: scoring could not change the winner
+        if vote.unanimous():
+            winner = vote.leader_answer()
+            result.answer = winner
+            result.chosen = next(name for name, ans in result.candidates if ans == winner)
+            return
+
+        # Merge contexts across trajectories by rank (round-robin, deduplicated)
+        # for scoring, so a score budget cuts every trajectory's weakest passages first
+        ctx_lists = [ctx_list for _, ctx_list, _ in answered]
+        merged_contexts: List[str] = []
+        seen = set()
+        for rank in range(max(len(ctx_list) for ctx_list in ctx_lists)):
+            for ctx_list in ctx_lists:
+                if rank < len(ctx_list) and ctx_list[rank] not in seen:
+                    seen.add(ctx_list[rank])
+                    merged_contexts.append(ctx_list[rank])
+
+        candidate_answers = [ans for _, _, ans in answered]
+        result.scores = self._score(question, merged_contexts, candidate_answers, result)
+
+        # Majority vote, ties broken by confidence
+        best_idx = max(0, select_answer(candidate_answers, result.scores))
+        result.chosen, result.answer = result.candidates[best_idx]
+
+    def run_batch(
+        self,
+        samples: Iterable[Dict[str, Any]],
+        concurrency: int = 8,
+    ) -> Iterator[QuestionResult]:
+        """
+        Runs many questions, up to `concurrency` at once; yields results in input order
+
+        A question that fails yields a QuestionResult with .error set.
+        """
+        for _, sample, result, error in run_ordered(samples, self.run_question, max_in_flight=concurrency):
+            if error is not None:
+                result = QuestionResult(sample.get("_id") or sample.get("id"), sample.get("question", ""))
+                result.error = error
+            yield result
+
+    def close(self) -> None:
+        """
+        Releases the retriever's resources once the pipeline is no longer used
+        """
+        if self.retriever is not None:
+            self.retriever.close()
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Hashable, Optional, Tuple
+
+"""
+Question-level reranking over the union of all trajectories' candidates
+
+Different trajectories often retrieve the same chunk. UnionReranker scores
+each distinct chunk once per question:
+
+    union = UnionReranker(ContextReranker(), max_batch=16)
+    union.score_union(question, [info["docs"] for info in traj_results.values()])
+    ranked = union.rank(question, traj_results["rewrite"]["docs"])   # just lookups
+
+Large unions are split into sub-batches of at most `max_batch` passages, and
+the sub-batches are scored in parallel. Scores are memoised by
+(question, chunk id), so ranking a trajectory afterwards needs no further
+reranker calls.
+
+make_reranker() picks the backend: "llm" (ContextReranker, remote),
+"cross-encoder" (CrossEncoderReranker, local CPU) or "none" (keep the
+retrieval order).
+"""
+
+RERANKER_BACKENDS = ("llm", "cross-encoder", "none")
+
+
+def make_reranker(backend: str = "llm", model: Optional[str] = None) -> Any:
+    """
+    Builds a reranker with the score(question, contexts) / rerank() interface
+
+    Returns None for "none" (no reranking).
+    """
+    if backend == "none":
+        return None
+    if backend == "llm":
+        from llm_pipeline import ContextReranker
+
+        return ContextReranker(model) if model else ContextReranker()
+    if backend == "cross-encoder":
+        from cross_encoder_reranker import CrossEncoderReranker
+
+        return CrossEncoderReranker(model) if model else CrossEncoderReranker()
+    raise ValueError(f"Unknown reranker backend {backend!r}, expected one of {RERANKER_BACKENDS}")
+
+
+def chunk_key(doc: Dict[str, Any]) -> Hashable:
+    """
+    Stable identity of a retrieved chunk: its chunk_id when known, otherwise its index id
+    """
+    meta = doc.get("meta") or {}
+    return meta.get("chunk_id") or doc.get("doc_id")
+
+
+class RerankScoreCache:
+    """
+    Thread-safe LRU map of (question, chunk key) -> reranker score
+    """
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, Hashable], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question: str, key: Hashable) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get((question, key))
+            if score is not None:
+                self._scores.move_to_end((question, key))
+            return score
+
+    def put(self, question: str, key: Hashable, score: float) -> None:
+        with self._lock:
+            self._scores[(question, key)] = score
+            self._scores.move_to_end((question, key))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+
+class UnionReranker:
+    """
+    Wraps any reranker with a score(question, contexts) -> List[float] method
+    """
+
+    def __init__(
+        self,
+        reranker: Any,
+        max_batch: int = 16,
+        max_workers: int = 4,
+        cache: Optional[RerankScoreCache] = None,
+    ):
+        self.reranker = reranker
+        self.max_batch = max(1, max_batch)
+        self.max_workers = max_workers
+        self.cache = cache or RerankScoreCache()
+
+    def score_union(self, question: str, doc_lists: List[List[Dict[str, Any]]]) -> None:
+        """
+        Scores every distinct chunk across `doc_lists` that is not cached yet
+        """
+        todo: Dict[Hashable, str] = {}
+        for docs in doc_lists:
+            for doc in docs:
+                key = chunk_key(doc)
+                if key not in todo and self.cache.get(question, key) is None:
+                    todo[key] = doc["text"]
+
+        if not todo:
+            return
+
+        keys = list(todo)
+        batches = [keys[i : i + self.max_batch] for i in range(0, len(keys), self.max_batch)]
+
+        def score_batch(batch: List[Hashable]) -> None:
+            scores = self.reranker.score(question, [todo[k] for k in batch])
+            for key, score in zip(batch, scores):
+                self.cache.put(question, key, score)
+
+        # Local backends batch internally and are CPU bound, so their
+        # sub-batches run one after another
+        if len(batches) == 1 or not getattr(self.reranker, "parallel_batches", True):
+            for batch in batches:
+                score_batch(batch)
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            list(pool.map(score_batch, batches))
+
+    def scores(self, question: str, docs: List[Dict[str, Any]]) -> List[float]:
+        """
+        Scores for `docs`, scoring any that are not cached yet
+        """
+        self.score_union(question, [docs])
+        return [self.cache.get(question, chunk_key(d)) or 0.0 for d in docs]
+
+    def rank(self, question: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        `docs` sorted by reranker score (ties keep their retrieval order)
+        """
+        scores = self.scores(question, docs)
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [docs[i] for i in order]
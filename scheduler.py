@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, Callable, Dict, Any, Optional, Tuple, TypeVar
+
+"""
+Bounded, order-preserving scheduler used by predict_full.py to keep several
+questions in flight at once.
+
+    for idx, item, result, error in run_ordered(samples, predict_one, max_in_flight=16):
+        ...
+
+- Items are pulled from the input lazily, so the loader never runs ahead by
+  more than the in-flight and reorder limits. This is the backpressure.
+- At most `max_in_flight` items are processed at any time.
+- Results are yielded in input order regardless of completion order. A small
+  reorder buffer (at most `max_buffered` finished items) holds results that
+  finished early. When the buffer is full, no new work is submitted until the
+  slow head-of-line item completes.
+
+LLM calls made inside `fn` still go through the shared LLMClient rate limiter,
+so a high concurrency limit cannot exceed the configured requests/tokens per
+minute.
+"""
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def run_ordered(
+    items: Iterable[T],
+    fn: Callable[[T], R],
+    max_in_flight: int = 8,
+    max_buffered: Optional[int] = None,
+) -> Iterator[Tuple[int, T, Optional[R], Optional[BaseException]]]:
+    """
+    Runs fn(item) for every item on a thread pool
+
+    Yields (index, item, result, error) in input order; exactly one of
+    result / error is meaningful (error is None on success)
+    """
+    max_in_flight = max(1, max_in_flight)
+    max_buffered = max_buffered if max_buffered is not None else 4 * max_in_flight
+
+    source = enumerate(items)
+    exhausted = False
+    pending: Dict[Future, Tuple[int, T]] = {}
+    done: Dict[int, Tuple[T, Any, Optional[BaseException]]] = {}
+    next_idx = 0
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while True:
+            # Fill up to the in-flight limit unless the reorder buffer is full
+            while not exhausted and len(pending) < max_in_flight and len(done) < max_buffered:
+                try:
+                    idx, item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(fn, item)] = (idx, item)
+
+            if not pending and not done:
+                return
+
+            if pending:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    idx, item = pending.pop(fut)
+                    error = fut.exception()
+                    done[idx] = (item, None if error else fut.result(), error)
+
+            # Emits everything that is now contiguous from the head
+            while next_idx in done:
+                item, result, error = done.pop(next_idx)
+                yield next_idx, item, result, error
+                next_idx += 1
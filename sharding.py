@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import json
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+from prediction_log import read_prediction_log, write_json_atomic
+
+"""
+Splits the dev set across workers and merges their predictions
+
+Each worker runs predict_full.py on its own slice, with its own API key and
+cache if wanted:
+
+    MISTRAL_API_KEY=... LLM_CACHE_PATH=cache0.sqlite python predict_full.py --shard 0/4
+    MISTRAL_API_KEY=... LLM_CACHE_PATH=cache1.sqlite python predict_full.py --shard 1/4
+    ...
+
+An example belongs to shard sha1(_id) mod N, so the split does not depend on
+file order, machine or Python's hash seed. Each shard writes
+predictions_dev.shard<i>of<N>.json (and its .jsonl log).
+
+Then, on any machine with all shard outputs:
+
+python sharding.py merge \
+  --dev hotpot_dev_distractor_v1.json \
+  --out predictions_dev.json \
+  --evaluate \
+  predictions_dev.shard*of4.json
+
+Inputs may be shard prediction files or their .jsonl logs. The merge reports
+ids missing from every shard and ids predicted by more than one shard (the
+first input wins), and fails on missing ids unless --allow-missing is given.
+"""
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    "i/N" -> (i, N), with 0 <= i < N
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N (e.g. 0/4), got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in [0, {count}), got {spec!r}")
+    return index, count
+
+
+def shard_of(example_id: str, count: int) -> int:
+    digest = hashlib.sha1(str(example_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def shard_suffix(index: int, count: int) -> str:
+    return f".shard{index}of{count}"
+
+
+def _load_predictions(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    {id: {"answer": ..., "sp": ...}} from a Hotpot prediction file or a prediction log
+    """
+    if path.endswith(".jsonl"):
+        return {
+            example_id: {"answer": r.get("answer", ""), "sp": r.get("sp", [])}
+            for example_id, r in read_prediction_log(path).items()
+        }
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    sp = data.get("sp", {})
+    return {example_id: {"answer": ans, "sp": sp.get(example_id, [])} for example_id, ans in data["answer"].items()}
+
+
+def merge_shards(
+    inputs: List[str],
+    output_path: str,
+    dev_json_path: Optional[str] = None,
+    allow_missing: bool = False,
+) -> Dict[str, Any]:
+    """
+    Merges shard outputs into one Hotpot prediction file
+
+    Returns a report {"predictions", "duplicates", "missing", "unknown"}. If
+    the dev set is given, ids missing from all shards raise ValueError unless
+    allow_missing is set.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    duplicates: List[str] = []
+
+    for path in inputs:
+        shard = _load_predictions(path)
+        print(f"[INFO] {path}: {len(shard)} predictions")
+        for example_id, pred in shard.items():
+            if example_id in merged:
+                duplicates.append(example_id)
+                continue
+            merged[example_id] = pred
+
+    missing: List[str] = []
+    unknown: List[str] = []
+    if dev_json_path:
+        from data_utils import load_hotpot_examples
+
+        dev_ids = [sample.get("_id") or sample.get("id") for sample in load_hotpot_examples(dev_json_path)]
+        dev_set = set(dev_ids)
+        missing = [example_id for example_id in dev_ids if example_id not in merged]
+        unknown = [example_id for example_id in merged if example_id not in dev_set]
+
+    report = {
+        "predictions": len(merged),
+        "duplicates": duplicates,
+        "missing": missing,
+        "unknown": unknown,
+    }
+
+    if duplicates:
+        print(f"[WARNING] {len(duplicates)} ids predicted by more than one shard (kept the first), e.g. {duplicates[:5]}")
+    if unknown:
+        print(f"[WARNING] {len(unknown)} predicted ids are not in the dev set, e.g. {unknown[:5]}")
+    if missing:
+        print(f"[WARNING] {len(missing)} dev ids have no prediction, e.g. {missing[:5]}")
+        if not allow_missing:
+            raise ValueError(f"{len(missing)} dev ids are missing from the shard outputs")
+
+    write_json_atomic(
+        {
+            "answer": {example_id: pred["answer"] for example_id, pred in merged.items()},
+            "sp": {example_id: pred["sp"] for example_id, pred in merged.items()},
+        },
+        output_path,
+    )
+    print(f"Saved {len(merged)} merged predictions to {output_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merges per-shard HotpotQA predictions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_merge = sub.add_parser("merge", help="Combines shard outputs into one prediction file")
+    p_merge.add_argument("inputs", nargs="+", help="Shard prediction files (.json) or logs (.jsonl)")
+    p_merge.add_argument("--out", type=str, default="predictions_dev.json")
+    p_merge.add_argument("--dev", type=str, default=None, help="Dev set, to check for missing ids")
+    p_merge.add_argument("--allow-missing", action="store_true")
+    p_merge.add_argument("--evaluate", action="store_true", help="Run evaluation.py on the merged file (needs --dev)")
+
+    args = parser.parse_args()
+
+    try:
+        merge_shards(args.inputs, args.out, dev_json_path=args.dev, allow_missing=args.allow_missing)
+    except ValueError as exc:
+        print(f"[ERROR] {exc}")
+        sys.exit(1)
+
+    if args.evaluate:
+        if not args.dev:
+            parser.error("--evaluate needs --dev")
+        from evaluation import eval as evaluate
+
+        evaluate(args.out, args.dev)
+
+
+if __name__ == "__main__":
+    main()
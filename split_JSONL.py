@@ -1,6 +1,10 @@
 import argparse
+import hashlib
+import json
 import os
 
+from data_utils import split_manifest_path
+
 """
 To run:
 python split_jsonl.py \
@@ -8,6 +12,12 @@ python split_jsonl.py \
   --out-dir data/processed/splits \
   --max-mb 100 \
   --prefix chunks_part
+
+Writes <prefix>_manifest.json next to the parts with, per part, the line count,
+global starting line number, byte size and sha256 checksum.
+
+To check existing parts against their manifest:
+python split_jsonl.py --verify data/processed/splits --prefix chunks_part
 """
 
 DEFAULT_MAX_MB = 100
@@ -22,6 +32,8 @@ def split_jsonl(
     """
     Splits a large JSONL file into multiple smaller JSONL files
     no bigger than 100MB
+
+    Works on raw bytes so lines are copied and measured without re-encoding
     """
     os.makedirs(out_dir, exist_ok=True)
 
@@ -29,48 +41,123 @@ def split_jsonl(
 
     part_idx = 1
     current_bytes = 0
+    current_lines = 0
+    total_lines = 0
     out_f = None
+    parts = []
 
     def open_new_file(idx: int):
         filename = f"{prefix}_{idx:05d}.jsonl"
         path = os.path.join(out_dir, filename)
         print(f"[INFO] Opening new file: {path}")
-        return open(path, "w", encoding="utf-8"), path
-
-    with open(input_path, "r", encoding="utf-8") as in_f:
+        return open(path, "wb"), path
+
+    def close_part(f, path: str, start_line: int, n_lines: int, n_bytes: int, digest) -> None:
+        f.close()
+        parts.append(
+            {
+                "file": os.path.basename(path),
+                "lines": n_lines,
+                "start_line": start_line,
+                "bytes": n_bytes,
+                "sha256": digest.hexdigest(),
+            }
+        )
+
+    with open(input_path, "rb") as in_f:
         out_f, current_path = open_new_file(part_idx)
+        digest = hashlib.sha256()
+        start_line = 0
 
-        for line_num, line in enumerate(in_f, start=1):
+        for line in in_f:
             # Keeps the line exactly the same as the original
             if not line:
                 continue
 
-            line_bytes = len(line.encode("utf-8"))
+            line_bytes = len(line)
 
             # If this line would push us over the limit it starts a new file
             if current_bytes + line_bytes > max_bytes and current_bytes > 0:
-                out_f.close()
+                close_part(out_f, current_path, start_line, current_lines, current_bytes, digest)
                 part_idx += 1
+                start_line = total_lines
                 current_bytes = 0
+                current_lines = 0
+                digest = hashlib.sha256()
                 out_f, current_path = open_new_file(part_idx)
 
             out_f.write(line)
+            digest.update(line)
             current_bytes += line_bytes
-
-        out_f.close()
+            current_lines += 1
+            total_lines += 1
+
+        close_part(out_f, current_path, start_line, current_lines, current_bytes, digest)
+
+    manifest = {
+        "source": os.path.basename(input_path),
+        "prefix": prefix,
+        "total_lines": total_lines,
+        "total_bytes": sum(p["bytes"] for p in parts),
+        "parts": parts,
+    }
+    manifest_path = split_manifest_path(out_dir, prefix)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
 
     print(f"[DONE] Finished splitting {input_path} into {part_idx} files in '{out_dir}'.")
+    print(f"[DONE] Manifest written to {manifest_path}")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_split(out_dir: str, prefix: str = DEFAULT_PREFIX) -> list:
+    """
+    Checks every part listed in the manifest for size and checksum
+
+    Returns the file names of missing or changed parts (empty list means all good)
+    """
+    with open(split_manifest_path(out_dir, prefix), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    bad = []
+    for part in manifest["parts"]:
+        path = os.path.join(out_dir, part["file"])
+        if not os.path.exists(path):
+            print(f"[ERROR] Missing part: {path}")
+            bad.append(part["file"])
+        elif os.path.getsize(path) != part["bytes"] or file_sha256(path) != part["sha256"]:
+            print(f"[ERROR] Part does not match manifest: {path}")
+            bad.append(part["file"])
+
+    if not bad:
+        print(f"[DONE] All {len(manifest['parts'])} parts in '{out_dir}' match the manifest")
+    return bad
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input", type=str, required=True)
-    parser.add_argument("--out-dir", type=str, required=True)
+    parser.add_argument("--input", type=str)
+    parser.add_argument("--out-dir", type=str)
     parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB)
     parser.add_argument("--prefix", type=str, default=DEFAULT_PREFIX)
+    parser.add_argument("--verify", type=str, default=None, help="Verify the parts in this directory against their manifest")
 
     args = parser.parse_args()
 
+    if args.verify:
+        bad = verify_split(args.verify, prefix=args.prefix)
+        raise SystemExit(1 if bad else 0)
+
+    if not args.input or not args.out_dir:
+        parser.error("--input and --out-dir are required unless --verify is given")
+
     split_jsonl(
         input_path=args.input,
         out_dir=args.out_dir,
@@ -0,0 +1,125 @@
+import re
+from typing import List, Dict, Any, Optional, Pattern, Tuple
+
+from compression import IDFTable, tokenize
+from voting import normalize_answer
+
+"""
+Sentence-level supporting-fact prediction (HotpotQA "sp": [[title, sent_id], ...])
+
+Purely local, no LLM call: given the paragraphs behind the chosen answer, in
+rank order, as (title, [sentences]) pairs,
+
+    sp = predict_supporting_facts(question, answer, paragraphs)
+
+keeps the top `max_paragraphs` paragraphs (a paragraph that contains the
+answer text is always among them), and in each one the sentences whose
+score is within `keep_ratio` of the paragraph's best. A sentence scores the
+IDF-weighted overlap of its terms with the question and the answer, plus a
+bonus when it contains the answer itself (as whole words: "1" is not in
+"1990"). A paragraph where no sentence scores above 0 contributes nothing.
+
+The full pipeline answers from Wikipedia chunks, not from the sample's
+paragraphs, so its contexts are first mapped back onto the sample:
+
+    paragraphs = align_to_context(chosen_docs, sample["context"])
+
+A chunk maps to the paragraph with the same title, or else to the paragraph
+whose sentences it covers best (at least `min_overlap` of a sentence's
+terms). Chunks that match nothing are dropped.
+"""
+
+ANSWER_BONUS = 2.0
+
+
+def _answer_pattern(answer: str) -> Optional[Pattern[str]]:
+    if not answer:
+        return None
+    # Lookarounds rather than \b so answers that start or end with punctuation still match
+    return re.compile(r"(?<!\w)" + re.escape(answer) + r"(?!\w)")
+
+
+def _contains(sentence: str, answer: Optional[Pattern[str]]) -> bool:
+    return answer is not None and answer.search(normalize_answer(sentence)) is not None
+
+
+def align_to_context(
+    docs: List[Dict[str, Any]],
+    context: List[list],
+    min_overlap: float = 0.6,
+) -> List[Tuple[str, List[str]]]:
+    """
+    Sample paragraphs (title, sentences) behind retrieved `docs`, in the docs' order, without repeats
+    """
+    by_title = {title: sentences for title, sentences in context}
+    sentence_terms = [(title, [set(tokenize(s)) for s in sentences]) for title, sentences in context]
+
+    titles: List[str] = []
+    for doc in docs:
+        title = (doc.get("meta") or {}).get("title")
+        if title not in by_title:
+            doc_terms = set(tokenize(doc.get("text", "")))
+            best, title = min_overlap, None
+            for candidate, sentences in sentence_terms:
+                for terms in sentences:
+                    # Very short sentences match too easily
+                    if len(terms) < 3:
+                        continue
+                    overlap = len(terms & doc_terms) / len(terms)
+                    if overlap >= best:
+                        best, title = overlap, candidate
+        if title is not None and title not in titles:
+            titles.append(title)
+    return [(title, by_title[title]) for title in titles]
+
+
+def predict_supporting_facts(
+    question: str,
+    answer: str,
+    paragraphs: List[Tuple[str, List[str]]],
+    max_paragraphs: int = 2,
+    max_sentences_per_paragraph: int = 2,
+    keep_ratio: float = 0.5,
+    idf: Optional[IDFTable] = None,
+) -> List[list]:
+    if not paragraphs:
+        return []
+
+    # yes/no answers say nothing about where the evidence is
+    answer_norm = normalize_answer(answer)
+    if answer_norm in ("yes", "no"):
+        answer_norm = ""
+
+    answer_re = _answer_pattern(answer_norm)
+    chosen = list(range(min(max_paragraphs, len(paragraphs))))
+    if answer_re and not any(any(_contains(s, answer_re) for s in paragraphs[i][1]) for i in chosen):
+        for i in range(len(chosen), len(paragraphs)):
+            if any(_contains(s, answer_re) for s in paragraphs[i][1]):
+                chosen[-1] = i
+                break
+
+    idf = idf or IDFTable.from_texts(s for _, sentences in paragraphs for s in sentences)
+    query_terms = set(tokenize(question)) | set(tokenize(answer_norm))
+    weights = {t: idf.idf(t) for t in query_terms}
+
+    sp: List[list] = []
+    for i in chosen:
+        title, sentences = paragraphs[i]
+        title_terms = set(tokenize(title))
+        scores = []
+        for sentence in sentences:
+            # Title terms are implied by every sentence of the paragraph
+            terms = set(tokenize(sentence)) - title_terms
+            score = sum(weights.get(t, 0.0) for t in terms)
+            if _contains(sentence, answer_re):
+                score += ANSWER_BONUS * max(weights.values(), default=1.0)
+            scores.append(score)
+
+        # Nothing in the paragraph relates to the question or answer
+        best = max(scores, default=0.0)
+        if best <= 0:
+            continue
+        ranked = sorted(range(len(sentences)), key=lambda j: scores[j], reverse=True)
+        keep = [j for j in ranked if scores[j] >= keep_ratio * best][:max_sentences_per_paragraph] or ranked[:1]
+        sp.extend([title, j] for j in sorted(keep))
+    return sp
@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Callable
+
+"""
+Answer voting across trajectories
+
+IncrementalVote takes answers one at a time as trajectories finish, and
+knows when the vote is settled:
+
+    vote = IncrementalVote(n_expected=4)
+    answers = vote.run([lambda: generate(ctxs) for ctxs in trajectory_contexts])
+    if vote.unanimous():
+        final = vote.leader_answer()           # no scoring call needed
+    else:
+        scores = score_candidate_answers(...)
+        final = answers[select_answer(answers, scores)]
+
+run() starts every generation at once and returns as soon as the leading
+normalised answer can no longer be overtaken (its count beats the runner-up
+plus every answer still to come). Answers that arrive after that are
+ignored and their slots are returned as None; the calls themselves still
+complete in the background.
+
+IncrementalVote(n, staged=True) saves LLM calls instead: it starts just
+enough generations for a majority (n // 2 + 1) and only starts the rest if
+those disagree. A contested question then pays a second, serial generation
+round trip, so it is off by default.
+
+Fallback answers ("I cannot answer from the given context.") never lead a
+vote while a real answer exists.
+"""
+
+FALLBACK_ANSWER = "i cannot answer from the given context."
+
+
+def normalize_answer(answer: Optional[str]) -> str:
+    return (answer or "").strip().lower()
+
+
+def is_fallback_answer(answer: Optional[str]) -> bool:
+    ans = normalize_answer(answer)
+    return not ans or ans == FALLBACK_ANSWER
+
+
+def select_answer(answers: List[Optional[str]], scores: Optional[List[float]] = None) -> int:
+    """
+    Index of the winning answer, or -1 if there is none
+
+    Groups answers by normalised text and prefers non-fallback groups, then
+    bigger groups, then the group's best confidence. Within the winning group
+    the most confident answer wins (the first one without scores).
+    """
+    scores = scores or []
+
+    def conf(i: int) -> float:
+        return scores[i] if i < len(scores) else 0.0
+
+    indices = [i for i, ans in enumerate(answers) if ans is not None]
+    non_fallback = [i for i in indices if not is_fallback_answer(answers[i])]
+    pool = non_fallback or indices
+    if not pool:
+        return -1
+
+    groups: Dict[str, List[int]] = {}
+    for i in pool:
+        groups.setdefault(normalize_answer(answers[i]), []).append(i)
+
+    def group_key(item):
+        key, idxs = item
+        fallback_penalty = -1 if is_fallback_answer(key) else 0
+        return (fallback_penalty, len(idxs), max(conf(i) for i in idxs))
+
+    _, best_idxs = max(groups.items(), key=group_key)
+    if scores:
+        return max(best_idxs, key=conf)
+    return best_idxs[0]
+
+
+class IncrementalVote:
+    def __init__(self, n_expected: int, staged: bool = False):
+        self.n_expected = n_expected
+        self.staged = staged
+        self.answers: List[Optional[str]] = []
+        self._counts: Dict[str, int] = {}
+
+    @property
+    def remaining(self) -> int:
+        return self.n_expected - len(self.answers)
+
+    def add(self, answer: Optional[str]) -> None:
+        """
+        Records one trajectory's answer (None if it produced none)
+        """
+        self.answers.append(answer)
+        if answer is not None and not is_fallback_answer(answer):
+            key = normalize_answer(answer)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _top_two(self) -> List[int]:
+        counts = sorted(self._counts.values(), reverse=True)
+        return (counts + [0, 0])[:2]
+
+    def decided(self) -> bool:
+        """
+        True once the leader cannot be overtaken (or tied) by the runner-up
+        even if every remaining answer went against it
+        """
+        leader, runner_up = self._top_two()
+        return leader > 0 and leader > runner_up + self.remaining
+
+    def unanimous(self) -> bool:
+        """
+        Every answer given so far is the same non-fallback answer
+        """
+        given = [a for a in self.answers if a is not None]
+        return bool(given) and len(self._counts) == 1 and sum(self._counts.values()) == len(given)
+
+    def leader_answer(self) -> Optional[str]:
+        """
+        First answer of the leading group (None without a non-fallback answer)
+        """
+        if not self._counts:
+            return None
+        top = max(self._counts.values())
+        for ans in self.answers:
+            if ans is not None and self._counts.get(normalize_answer(ans)) == top:
+                return ans
+        return None
+
+    def run(self, tasks: List[Callable[[], Optional[str]]]) -> List[Optional[str]]:
+        """
+        Runs answer-generation tasks until the vote is decided
+
+        Returns one answer per task, aligned with `tasks`; tasks that had not
+        finished (or, when staged, not started) once the vote was decided give None.
+        """
+        results: List[Optional[str]] = [None] * len(tasks)
+        if not tasks:
+            return results
+
+        first_wave = len(tasks)
+        if self.staged:
+            # Enough for a majority of all expected answers, counting ones already added
+            first_wave = max(1, self.n_expected // 2 + 1 - len(self.answers))
+        pool = ThreadPoolExecutor(max_workers=len(tasks))
+        in_flight: Dict[Future, int] = {}
+        next_task = 0
+
+        def launch(n: int) -> None:
+            nonlocal next_task
+            for _ in range(n):
+                if next_task >= len(tasks):
+                    return
+                in_flight[pool.submit(tasks[next_task])] = next_task
+                next_task += 1
+
+        try:
+            launch(first_wave)
+            while in_flight:
+                finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    i = in_flight.pop(fut)
+                    results[i] = fut.result()
+                    self.add(results[i])
+
+                if self.decided():
+                    break
+
+                # If the rest would be needed even when every running task
+                # agrees with the leader, start them now
+                not_started = len(tasks) - next_task
+                leader, runner_up = self._top_two()
+                if not in_flight or leader + len(in_flight) <= runner_up + not_started:
+                    launch(not_started)
+        finally:
+            # Running generations finish in the background and are ignored;
+            # unstarted ones (staged only) never run
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return results